@@ -28,7 +28,7 @@ ATTACK_SURFACE_PLANNING_AGENT_INSTRUCTIONS = dedent("""\
 **(END)**
 
 **1. 获取并理解核心输入信息 (Mandatory First Steps):**
-    a.  **读取《部署架构报告》**: 使用 `read_report_from_repository` 工具 (默认报告名 `DeploymentArchitectureReport.md` - 注意，文件名已在Team Leader指令中标准化) 读取并仔细分析《部署架构报告》。这份报告提供了组件、网络拓扑、公网暴露面等重要**上下文**，可以帮助你评估代码中发现的漏洞的潜在影响和利用路径，并辅助规划审计的优先级。
+    a.  **读取《部署架构报告》**: 使用 `read_report_from_repository` 工具 (默认报告名 `DeploymentArchitectureReport.md` - 注意，文件名已在Team Leader指令中标准化) 读取并仔细分析《部署架构报告》。这份报告提供了组件、网络拓扑、公网暴露面等重要**上下文**，可以帮助你评估代码中发现的漏洞的潜在影响和利用路径，并辅助规划审计的优先级。默认返回的是该报告的结构化摘要（暴露面表、服务列表、上游映射）；如需原文细节，可使用 `section` 参数读取指定章节，或使用 `full=True` 读取完整报告。
     b.  **理解用户初始上下文**: 你接收到的初始消息中，包含了用户对整个审计任务的原始输入（例如项目路径、关注点等）。你需要理解这些高层需求。
     c.  **初步分析与整合**: 在你的思考过程中，总结从部署架构报告和用户初始上下文中提炼出的关键信息点。这份部署报告帮助理解"哪些代码区域可能因外部可达而风险更高"，但你的计划必须超越这一点。
 
@@ -9,6 +9,8 @@ from agno.tools.shell import ShellTools
 from agno.tools.file import FileTools
 from agno.utils.pprint import pprint_run_response
 
+from core.context_window import with_context_window
+from core.model_registry import get_pooled_model
 from db.session import db_url
 
 # Hardcoded workspace root path, represents the root of the Java project to be audited.
@@ -152,7 +154,8 @@ def get_local_security_auditor_agent(
         agent_id="java_security_auditor_v1",
         user_id=user_id,
         session_id=session_id,
-        model=xAI(id=model_id),
+        # Old shell and file outputs are elided from the history so requests stay under the token budget
+        model=with_context_window(get_pooled_model(xAI, id=model_id)),
         tools=[shell_tools, file_tools],
         storage=PostgresAgentStorage(table_name="local_tool_tester_sessions", db_url=db_url),
         description=agent_description,
@@ -4,6 +4,8 @@ from typing import List, Optional
 from agno.agent import Agent
 from agents.sage import get_sage
 from agents.scholar import get_scholar
+from core.agent_pool import agent_pool
+from core.prompt_cache import current_date, run_context
 # Temporarily comment out the problematic import
 # from agents.local_tool_tester import get_local_security_auditor_agent
 
@@ -29,8 +31,12 @@ def get_agent(
     session_id: Optional[str] = None,
     debug_mode: bool = True,
 ) -> Agent: # Added return type hint based on other get_agent functions
+    """
+    Returns the agent for one request: a clone of a pooled template of the agent type and model (see
+    AgentPool), bound to the user and session, instead of building the agent, its storage and model anew.
+    """
     if agent_id == AgentType.SAGE:
-        return get_sage(model_id=model_id, user_id=user_id, session_id=session_id, debug_mode=debug_mode)
+        factory = get_sage
     # Temporarily comment out this branch
     # elif agent_id == AgentType.LOCAL_TOOL_TESTER:
     #     return get_local_security_auditor_agent(
@@ -38,10 +44,19 @@ def get_agent(
     #     )
     # Ensure there's a default or scholar is always the fallback
     elif agent_id == AgentType.SCHOLAR:
-        return get_scholar(model_id=model_id, user_id=user_id, session_id=session_id, debug_mode=debug_mode)
+        factory = get_scholar
     else:  # Default to scholar or handle unknown types if SCHOLAR is not explicitly passed
         # Or raise an error for unknown agent_id if that's preferred behavior
         # For now, assuming scholar is a safe default if no match or if LOCAL_TOOL_TESTER was intended but now commented out
         # This might need adjustment based on how agent_id is typically passed or if it can be None when LOCAL_TOOL_TESTER was the only other option.
         print(f"Warning: agent_id '{agent_id}' not fully handled or LOCAL_TOOL_TESTER was requested. Defaulting to Scholar.")
-        return get_scholar(model_id=model_id, user_id=user_id, session_id=session_id, debug_mode=debug_mode)
+        factory = get_scholar
+
+    # The template is built without user or session; the per-user context is bound like the factories set it.
+    return agent_pool.get(
+        (factory.__name__, model_id, debug_mode),
+        lambda: factory(model_id=model_id, debug_mode=debug_mode),
+        user_id=user_id,
+        session_id=session_id,
+        additional_context=run_context(user=user_id, current_date=current_date()),
+    )
@@ -6,6 +6,9 @@ from agno.models.openrouter import OpenRouter
 from agno.storage.agent.postgres import PostgresAgentStorage
 from agno.tools.duckduckgo import DuckDuckGoTools
 
+from core.context_window import with_context_window
+from core.model_registry import get_pooled_model
+from core.prompt_cache import current_date, run_context
 from db.session import db_url
 
 
@@ -15,18 +18,16 @@ def get_scholar(
     session_id: Optional[str] = None,
     debug_mode: bool = True,
 ) -> Agent:
-    additional_context = ""
-    if user_id:
-        additional_context += "<context>"
-        additional_context += f"You are interacting with the user: {user_id}"
-        additional_context += "</context>"
+    # Everything per user or per day goes after the static instructions, so the prompt prefix stays cacheable.
+    additional_context = run_context(user=user_id, current_date=current_date())
 
     return Agent(
         name="Scholar",
         agent_id="scholar",
         user_id=user_id,
         session_id=session_id,
-        model=OpenRouter(id=model_id),
+        # Old search results are elided from the history so requests stay under the token budget
+        model=with_context_window(get_pooled_model(OpenRouter, id=model_id)),
         # Tools available to the agent
         tools=[DuckDuckGoTools()],
         # Storage for the agent
@@ -75,8 +76,6 @@ def get_scholar(
         additional_context=additional_context,
         # Format responses using markdown
         markdown=True,
-        # Add the current date and time to the instructions
-        add_datetime_to_instructions=True,
         # Send the last 3 messages from the chat history
         add_history_to_messages=True,
         num_history_responses=3,
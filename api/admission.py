@@ -0,0 +1,297 @@
+import asyncio
+import math
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.websockets import WebSocketClose
+
+from api.settings import api_settings
+from core.run_events import RunEventLog
+from utils.log import logger
+
+# Requests that start agent runs and audits; everything else (health, status, reports, jobs) is not limited.
+# Audit jobs are bounded by their own worker count.
+ADMITTED_PATH_PATTERN = re.compile(r"^/v1/(agents/[^/]+/runs|workflows/run_security_audit)(/ws)?$")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after_s: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    """
+    Concurrency limits for expensive requests: at most `max_concurrent` at once, at most `max_per_tenant`
+    of them (running or waiting) per tenant, and a FIFO queue of at most `max_queue` waiting for a slot,
+    each for at most `queue_timeout_s`.
+
+    A tenant over its own limit gets 429 at once; a full queue or a wait that times out gets 503. Both carry
+    a Retry-After estimated from how long requests hold their slots. Rejecting early rather than queueing
+    without bound keeps the latency of admitted requests predictable: the worst case is the queue timeout
+    plus the run itself.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = api_settings.admission_max_concurrent,
+        max_per_tenant: int = api_settings.admission_max_per_tenant,
+        max_queue: int = api_settings.admission_max_queue,
+        queue_timeout_s: float = api_settings.admission_queue_timeout_s,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_tenant = max_per_tenant
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.in_flight = 0
+        self._tenant_load: Counter = Counter()
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long admitted requests hold a slot, for Retry-After.
+        self._hold_s = 5.0
+        self._waits_ms: Deque[float] = deque(maxlen=1000)
+        self.counts: Counter = Counter()
+
+    def retry_after_s(self) -> int:
+        waiting_rounds = (len(self._waiters) + 1) / max(1, self.max_concurrent)
+        return max(1, math.ceil(self._hold_s * waiting_rounds))
+
+    async def acquire(self, tenant: str) -> float:
+        """Waits for a slot; returns the wait in seconds or raises AdmissionRejected."""
+        if self._tenant_load[tenant] >= self.max_per_tenant:
+            self.counts["rejected_tenant_limit"] += 1
+            raise AdmissionRejected(
+                429, f"Too many concurrent runs for this client (limit {self.max_per_tenant}).", self.retry_after_s()
+            )
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self._tenant_load[tenant] += 1
+            self.counts["admitted"] += 1
+            self._waits_ms.append(0.0)
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.counts["rejected_queue_full"] += 1
+            raise AdmissionRejected(503, "The server is at capacity; try again later.", self.retry_after_s())
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._tenant_load[tenant] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended.
+                if isinstance(e, asyncio.CancelledError):
+                    self.release(tenant)
+                    raise
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self._tenant_load[tenant] -= 1
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.counts["rejected_timeout"] += 1
+                raise AdmissionRejected(
+                    503, f"No capacity within {self.queue_timeout_s:.0f}s; try again later.", self.retry_after_s()
+                )
+        wait_s = time.monotonic() - started
+        self.counts["admitted"] += 1
+        self._waits_ms.append(wait_s * 1000)
+        return wait_s
+
+    def release(self, tenant: str, held_s: Optional[float] = None) -> None:
+        self._tenant_load[tenant] -= 1
+        if self._tenant_load[tenant] <= 0:
+            del self._tenant_load[tenant]
+        if held_s is not None:
+            self._hold_s = 0.9 * self._hold_s + 0.1 * held_s
+        # Hand the slot to the first waiter still waiting, or give it back.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits_ms)
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "tenants": len(self._tenant_load),
+            "limits": {
+                "max_concurrent": self.max_concurrent,
+                "max_per_tenant": self.max_per_tenant,
+                "max_queue": self.max_queue,
+                "queue_timeout_s": self.queue_timeout_s,
+            },
+            "wait_ms": {
+                "p50": round(waits[len(waits) // 2], 1) if waits else None,
+                "p99": round(waits[int(len(waits) * 0.99)], 1) if waits else None,
+                "max": round(waits[-1], 1) if waits else None,
+            },
+            "avg_hold_s": round(self._hold_s, 2),
+            **self.counts,
+        }
+
+
+def tenant_of(scope: Scope) -> str:
+    """
+    The user verified by an authentication middleware, else the client address (behind a proxy, as set by
+    uvicorn's --proxy-headers). Unverified headers such as API keys or user IDs are not used: a client could
+    send a new one with every request and never reach its limit.
+    """
+    user = scope.get("user")
+    if user is not None and getattr(user, "is_authenticated", False):
+        return "user:" + str(user.display_name)
+    client: Optional[Tuple[str, int]] = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionSlot:
+    """The slot of an admitted request; released once, when the response ends or the run it started closes."""
+
+    def __init__(self, controller: AdmissionController, tenant: str):
+        self.controller = controller
+        self.tenant = tenant
+        self.loop = asyncio.get_running_loop()
+        self.started = time.monotonic()
+        self.held_by_run = False
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.controller.release(self.tenant, held_s=time.monotonic() - self.started)
+
+
+_current_slot: ContextVar[Optional[AdmissionSlot]] = ContextVar("admission_slot", default=None)
+
+
+def hold_slot_until_closed(log: RunEventLog) -> None:
+    """
+    Keeps the admission slot of the current request until the streamed run of `log` ends rather than its
+    response: the run goes on after a client disconnects, and the next run of that client must wait for it.
+    """
+    slot = _current_slot.get()
+    if slot is None or slot.held_by_run:
+        return
+    slot.held_by_run = True
+
+    def release() -> None:
+        try:
+            slot.loop.call_soon_threadsafe(slot.release)
+        except RuntimeError:  # The API's loop is closed
+            pass
+
+    log.add_close_callback(release)
+
+
+class AdmissionControlMiddleware:
+    """
+    Applies `admission_controller` to the requests and WebSocket connections that start runs (see
+    ADMITTED_PATH_PATTERN). A slot is held until the response has been sent or, if the request started a
+    streamed run (see `hold_slot_until_closed`), until that run ends. Rejected WebSocket connections are
+    closed with 1013.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] not in ("http", "websocket")
+            or (scope["type"] == "http" and scope["method"] != "POST")
+            or not ADMITTED_PATH_PATTERN.match(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        tenant = tenant_of(scope)
+        try:
+            await self.controller.acquire(tenant)
+        except AdmissionRejected as e:
+            logger.info(f"Rejected {scope['path']} for {tenant}: {e.detail}")
+            if scope["type"] == "websocket":
+                await WebSocketClose(code=1013, reason=e.detail)(scope, receive, send)
+            else:
+                response = JSONResponse(
+                    {"detail": e.detail}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after_s)}
+                )
+                await response(scope, receive, send)
+            return
+
+        slot = AdmissionSlot(self.controller, tenant)
+        token = _current_slot.set(slot)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_slot.reset(token)
+            if not slot.held_by_run:
+                slot.release()
+
+
+if __name__ == "__main__":
+    import random
+
+    import httpx
+    from fastapi import FastAPI
+
+    # Overload: 3 tenants send 120 requests in 2 s to a server whose runs take 0.2-0.4 s and that can run 8
+    # at a time (model quota, DB connections). Latency of every request, with and without admission control.
+    def make_app(controlled: bool) -> FastAPI:
+        app = FastAPI()
+        capacity = asyncio.Semaphore(8)
+
+        @app.post("/v1/agents/{agent_id}/runs")
+        async def run(agent_id: str):
+            async with capacity:
+                await asyncio.sleep(random.uniform(0.2, 0.4))
+            return "ok"
+
+        if controlled:
+            app.add_middleware(
+                AdmissionControlMiddleware,
+                controller=AdmissionController(max_concurrent=8, max_per_tenant=6, max_queue=8, queue_timeout_s=1.0),
+            )
+        return app
+
+    async def overload(controlled: bool) -> None:
+        app = make_app(controlled)
+        results = []
+        # One client address per tenant.
+        clients = [
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(f"10.0.0.{t}", 4000)), base_url="http://test")
+            for t in range(3)
+        ]
+
+        async def request(i: int) -> None:
+            await asyncio.sleep(i * 2 / 120)
+            started = time.perf_counter()
+            response = await clients[i % 3].post("/v1/agents/sage/runs")
+            results.append((response.status_code, (time.perf_counter() - started) * 1000, response.headers.get("retry-after")))
+
+        await asyncio.gather(*(request(i) for i in range(120)))
+        for client in clients:
+            await client.aclose()
+        ok = sorted(ms for status, ms, _ in results if status == 200)
+        rejected = Counter(status for status, _, _ in results if status != 200)
+        print(
+            f"{'with' if controlled else 'without':>7} admission control: {len(ok)} admitted, p50 {ok[len(ok) // 2]:.0f} ms, "
+            f"p99 {ok[int(len(ok) * 0.99)]:.0f} ms, max {ok[-1]:.0f} ms; rejected {dict(rejected)}, "
+            f"Retry-After {sorted({r for _, _, r in results if r})}"
+        )
+
+    asyncio.run(overload(False))
+    asyncio.run(overload(True))
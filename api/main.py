@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from api.admission import AdmissionControlMiddleware
 from api.routes.v1_router import v1_router
 from api.settings import api_settings
 
@@ -21,6 +22,8 @@ def create_app() -> FastAPI:
     app.include_router(v1_router)
 
     # Add Middlewares
+    # Limits concurrent runs; added first so CORS headers are also set on its 429 / 503 responses.
+    app.add_middleware(AdmissionControlMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=api_settings.cors_origin_list,
@@ -1,12 +1,18 @@
+import uuid
 from enum import Enum
 from typing import AsyncGenerator, List, Optional
 
 from agno.agent import Agent
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from agents.operator import AgentType, get_agent, get_available_agents
+from api.admission import hold_slot_until_closed
+from api.run_channel import RunChannel
+from core.model_call_metrics import model_call_scope
+from core.run_events import RunEventLog, parse_last_event_id, run_event_logs, sse_stream, start_streamed_run
+from core.stream_events import dumps, stream_events
 from utils.log import logger
 
 ######################################################
@@ -33,23 +39,23 @@ async def list_agents():
     return get_available_agents()
 
 
-async def chat_response_streamer(agent: Agent, message: str) -> AsyncGenerator:
+async def chat_response_streamer(agent: Agent, message: str, run_id: str) -> AsyncGenerator:
     """
     Stream agent responses chunk by chunk.
 
     Args:
         agent: The agent instance to interact with
         message: User message to process
+        run_id: ID under which the run's model calls are recorded
 
     Yields:
-        Text chunks from the agent response
+        JSON of the typed events of the run (coalesced content deltas, tool calls), one per Server-Sent Event
     """
-    run_response = await agent.arun(message, stream=True)
-    async for chunk in run_response:
-        # chunk.content only contains the text response from the Agent.
-        # For advanced use cases, we should yield the entire chunk
-        # that contains the tool calls and intermediate steps.
-        yield chunk.content
+    with model_call_scope(run_id=run_id, session_id=agent.session_id, stage=agent.agent_id):
+        # Tool call events too, for the tool_start / tool_end events of the API streams.
+        run_response = await agent.arun(message, stream=True, stream_intermediate_steps=True)
+        async for event in stream_events(run_response):
+            yield dumps(event)
 
 
 class RunRequest(BaseModel):
@@ -62,20 +68,8 @@ class RunRequest(BaseModel):
     session_id: Optional[str] = None
 
 
-@agents_router.post("/{agent_id_str}/runs", status_code=status.HTTP_200_OK)
-async def run_agent(agent_id_str: str, body: RunRequest):
-    """
-    Sends a message to a specific agent and returns the response.
-
-    Args:
-        agent_id_str: The string ID of the agent to interact with
-        body: Request parameters including the message
-
-    Returns:
-        Either a streaming response or the complete agent response
-    """
-    logger.debug(f"RunRequest: {body}")
-
+def _get_agent_for_run(agent_id_str: str, body: RunRequest) -> Agent:
+    """The agent for a run request; HTTPException 404 for unknown or disabled agents."""
     # Convert agent_id_str to AgentType enum, handling the case where LOCAL_TOOL_TESTER was commented out
     try:
         # Check if the string matches the value of the (now commented out) LOCAL_TOOL_TESTER
@@ -102,14 +96,83 @@ async def run_agent(agent_id_str: str, body: RunRequest):
         # but provides an extra layer of safety or more specific error for the API layer.
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Could not retrieve agent '{agent_id_str}': {str(e)}")
 
+    return agent
+
+
+def _start_agent_run(agent: Agent, message: str, run_id: str) -> RunEventLog:
+    log = start_streamed_run(run_id, lambda: chat_response_streamer(agent, message, run_id))
+    # The run keeps its admission slot after a disconnect, until it ends.
+    hold_slot_until_closed(log)
+    return log
+
+
+@agents_router.post("/{agent_id_str}/runs", status_code=status.HTTP_200_OK)
+async def run_agent(agent_id_str: str, body: RunRequest):
+    """
+    Sends a message to a specific agent and returns the response.
+
+    Args:
+        agent_id_str: The string ID of the agent to interact with
+        body: Request parameters including the message
+
+    Returns:
+        Either a streaming response or the complete agent response
+    """
+    logger.debug(f"RunRequest: {body}")
+    agent = _get_agent_for_run(agent_id_str, body)
+
+    # Model call metrics of this request are available at /v1/metrics/runs/{run_id}
+    run_id = f"agent_run_{uuid.uuid4()}"
     if body.stream:
-        return StreamingResponse(
-            chat_response_streamer(agent, body.message),
-            media_type="text/event-stream",
-        )
+        # The run continues if the client disconnects; it resumes at /runs/{run_id}/events with Last-Event-ID.
+        log = _start_agent_run(agent, body.message, run_id)
+        return StreamingResponse(sse_stream(log), media_type="text/event-stream", headers={"X-Run-Id": run_id})
     else:
-        response = await agent.arun(body.message, stream=False)
+        with model_call_scope(run_id=run_id, session_id=agent.session_id, stage=agent.agent_id):
+            response = await agent.arun(body.message, stream=False)
         # response.content only contains the text response from the Agent.
         # For advanced use cases, we should yield the entire response
         # that contains the tool calls and intermediate steps.
         return response.content
+
+
+@agents_router.get("/runs/{run_id}/events")
+async def resume_agent_run_events(
+    run_id: str,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id: Optional[str] = Query(None),
+):
+    """
+    Resumes the stream of an agent run after a disconnect.
+
+    Args:
+        run_id: ID from the `X-Run-Id` header of the run's response
+        last_event_id_header: ID of the last event received (the `Last-Event-ID` header)
+        last_event_id: Same, as a query parameter for clients that cannot set headers
+
+    Returns:
+        The events after the last one received, then the live ones, as Server-Sent Events
+    """
+    # The run may be streamed by another worker process; then its events are read from the shared spill file.
+    log = run_event_logs.get_readable(run_id)
+    if log is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No events of run {run_id}; it is unknown or expired.")
+    return StreamingResponse(
+        sse_stream(log, parse_last_event_id(last_event_id_header or last_event_id)), media_type="text/event-stream"
+    )
+
+
+@agents_router.websocket("/{agent_id_str}/runs/ws")
+async def agent_run_channel(websocket: WebSocket, agent_id_str: str):
+    """
+    Runs an agent over a WebSocket, which unlike SSE also carries cancel / pause / resume from the client.
+    The first message is `{"type": "run", "message": ..., "model": ..., "user_id": ..., "session_id": ...}`
+    (the fields of RunRequest) or `{"type": "attach", "run_id": ..., "last_event_id": ...}`. See RunChannel.
+    """
+
+    async def start_run(request: dict) -> RunEventLog:
+        body = RunRequest(**{k: v for k, v in request.items() if k in RunRequest.model_fields})
+        agent = _get_agent_for_run(agent_id_str, body)
+        return _start_agent_run(agent, body.message, f"agent_run_{uuid.uuid4()}")
+
+    await RunChannel(websocket).serve(start_run)
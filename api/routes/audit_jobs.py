@@ -0,0 +1,120 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from core.run_events import parse_last_event_id, sse_stream
+from workflows.audit_jobs import get_audit_job_manager
+
+######################################################
+## Router for background security audit jobs
+######################################################
+
+audit_jobs_router = APIRouter(prefix="/jobs")
+
+
+class AuditJobRequest(BaseModel):
+    """Request body for starting a background audit"""
+
+    project_path: str
+    model_id: Optional[str] = None
+    team_leader_model_id: Optional[str] = None
+
+
+def _get_job(job_id: str) -> Dict[str, Any]:
+    job = get_audit_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Audit job {job_id} not found")
+    return job
+
+
+@audit_jobs_router.post("", status_code=status.HTTP_202_ACCEPTED)
+def create_audit_job(body: AuditJobRequest) -> Dict[str, Any]:
+    """
+    Queues a security audit of `project_path` and returns at once with the job ID.
+
+    Returns:
+        Dict[str, Any]: The job, with status 'queued'
+    """
+    if not body.project_path:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="project_path is required.")
+    return get_audit_job_manager().submit(body.project_path, body.model_id, body.team_leader_model_id)
+
+
+@audit_jobs_router.get("")
+def list_audit_jobs(
+    job_status: Optional[str] = Query(None, alias="status"), limit: int = Query(50, ge=1, le=500)
+) -> List[Dict[str, Any]]:
+    """Returns the most recent audit jobs, optionally only those with the given status."""
+    return get_audit_job_manager().list(status=job_status, limit=limit)
+
+
+@audit_jobs_router.get("/{job_id}")
+def get_audit_job(job_id: str) -> Dict[str, Any]:
+    """
+    Returns the status of an audit job and its progress through the audit plan.
+
+    Args:
+        job_id: ID returned when the job was created
+
+    Returns:
+        Dict[str, Any]: The job and its progress (tasks completed / total, current task, findings)
+    """
+    job = _get_job(job_id)
+    return {**job, "progress": get_audit_job_manager().progress(job)}
+
+
+@audit_jobs_router.get("/{job_id}/results")
+def get_audit_job_results(job_id: str) -> Dict[str, Any]:
+    """
+    Returns every task of the job's audit plan with its status and findings, plus the final answer once done.
+    Available while the job runs; model usage of the job is at /v1/metrics/runs/{session_id}.
+    """
+    job = _get_job(job_id)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "session_id": job["session_id"],
+        "tasks": get_audit_job_manager().results(job),
+        "result": job["result"],
+    }
+
+
+@audit_jobs_router.post("/{job_id}/cancel")
+def cancel_audit_job(job_id: str) -> Dict[str, Any]:
+    """Cancels a queued or running audit job."""
+    _get_job(job_id)
+    return get_audit_job_manager().cancel(job_id)
+
+
+@audit_jobs_router.post("/{job_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+def resume_audit_job(job_id: str) -> Dict[str, Any]:
+    """Queues an interrupted or failed audit job again; it continues from its saved session state."""
+    job = _get_job(job_id)
+    if job["status"] not in ("interrupted", "failed"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=f"Only interrupted or failed jobs can be resumed, not {job['status']} ones."
+        )
+    return get_audit_job_manager().resume(job_id)
+
+
+@audit_jobs_router.get("/{job_id}/events")
+async def attach_audit_job(
+    job_id: str,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id: Optional[str] = Query(None),
+):
+    """
+    Attaches to the event stream of an audit job as Server-Sent Events: streamed content, tool calls and
+    status changes, numbered, ending with a final status event. Disconnecting does not affect the job;
+    reconnect with the `Last-Event-ID` header (or `last_event_id` query parameter) to receive exactly the
+    events missed in between.
+    """
+    job = _get_job(job_id)
+    log = get_audit_job_manager().event_log(job_id)
+    if log is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Audit job {job_id} is {job['status']}.")
+    return StreamingResponse(
+        sse_stream(log, parse_last_event_id(last_event_id_header or last_event_id)), media_type="text/event-stream"
+    )
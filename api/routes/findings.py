@@ -0,0 +1,53 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, status
+
+from tools.findings_tools import SEVERITY_ORDER, Finding, findings_store
+
+######################################################
+## Router for structured audit findings
+######################################################
+
+findings_router = APIRouter(prefix="/findings", tags=["Findings"])
+
+
+@findings_router.get("", response_model=List[Finding])
+def list_findings(
+    severity: Optional[str] = None,
+    component: Optional[str] = None,
+    run_id: Optional[str] = None,
+):
+    """
+    Returns structured findings across runs, filtered by severity, component and/or run.
+
+    Args:
+        severity: One of Critical, High, Medium, Low, Info
+        component: Affected service or module (case-insensitive)
+        run_id: Audit run (team session) ID
+
+    Returns:
+        List[Finding]: Matching findings ordered by severity
+    """
+    if severity is not None and severity not in SEVERITY_ORDER:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown severity '{severity}'. Valid values: {', '.join(SEVERITY_ORDER)}.",
+        )
+    return findings_store.query(severity=severity, component=component, run_id=run_id)
+
+
+@findings_router.get("/{run_id}/sarif")
+def export_findings_sarif(run_id: str):
+    """
+    Exports the findings of one audit run as a SARIF 2.1.0 log.
+
+    Args:
+        run_id: Audit run (team session) ID
+
+    Returns:
+        dict: The SARIF log
+    """
+    sarif = findings_store.export_sarif(run_id)
+    if not sarif["runs"][0]["results"]:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No findings recorded for run '{run_id}'.")
+    return sarif
@@ -0,0 +1,47 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException, status
+
+from db.model_call_store import get_model_call_store
+
+######################################################
+## Router for per-run model call metrics
+######################################################
+
+metrics_router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@metrics_router.get("/runs/{run_id}")
+def get_run_metrics(run_id: str, calls: bool = False) -> Dict[str, Any]:
+    """
+    Tokens, latency and tool calls of every model call of a run, rolled up per stage, task and model.
+
+    Args:
+        run_id: Audit run (team session) ID, or the X-Run-Id of an agent run
+        calls: Also return the individual calls
+
+    Returns:
+        Dict[str, Any]: Run totals and rollups
+    """
+    store = get_model_call_store()
+    if store is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Model call metrics are disabled")
+
+    by_stage = store.rollup(run_id, by="stage")
+    if not by_stage:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No model calls recorded for run {run_id}")
+
+    totals = {
+        name: sum(row[name] or 0 for row in by_stage)
+        for name in ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "tool_calls", "total_latency_ms", "errors")
+    }
+    result: Dict[str, Any] = {
+        "run_id": run_id,
+        "totals": totals,
+        "by_stage": by_stage,
+        "by_task": store.rollup(run_id, by="task"),
+        "by_model": store.rollup(run_id, by="model_id"),
+    }
+    if calls:
+        result["calls"] = store.calls(run_id)
+    return result
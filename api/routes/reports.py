@@ -0,0 +1,44 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
+
+from tools.report_search_tools import SearchHit, report_search_index
+
+######################################################
+## Router for searching historical audit reports
+######################################################
+
+reports_router = APIRouter(prefix="/reports", tags=["Reports"])
+
+
+@reports_router.get("/search", response_model=List[SearchHit])
+def search_reports(
+    q: str = Query(..., min_length=1),
+    kind: Optional[str] = None,
+    run_id: Optional[str] = None,
+    project: Optional[str] = None,
+    stage: Optional[str] = None,
+    task_id: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+):
+    """
+    Full-text search over all saved audit reports and recorded findings.
+
+    Args:
+        q: Search terms; all terms must match
+        kind: 'report' or 'finding'
+        run_id: Audit run (team session) ID
+        project: Audited project
+        stage: 'environment', 'planning', 'deep_dive' or 'aggregation'
+        task_id: Plan item ID, e.g. CODE-REVIEW-ITEM-003
+        limit: Maximum number of results
+
+    Returns:
+        List[SearchHit]: Matches ranked by BM25, with highlighted snippets
+    """
+    try:
+        return report_search_index.search(
+            q, kind=kind, run_id=run_id, project=project, stage=stage, task_id=task_id, limit=limit
+        )
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Search failed: {str(e)}")
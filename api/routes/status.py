@@ -1,5 +1,11 @@
 from fastapi import APIRouter
 
+from api.admission import admission_controller
+from core.agent_pool import agent_pool
+from core.model_rate_limiter import get_rate_limiter
+from core.model_router import provider_health
+from core.prompt_cache import prompt_cache_stats
+from db.model_call_store import get_model_call_store
 from utils.dttm import current_utc_str
 
 ######################################################
@@ -19,3 +25,35 @@ def get_health():
         "path": "/health",
         "utc": current_utc_str(),
     }
+
+
+@status_router.get("/health/models")
+def get_model_health():
+    """Rolling latency, time-to-first-token and error rate per model endpoint, rate limiter waits and 429s, prompt cache hits, the model call metrics writer and the pool of prepared agents"""
+
+    model_call_store = get_model_call_store()
+
+    return {
+        "status": "success",
+        "router": "status",
+        "path": "/health/models",
+        "utc": current_utc_str(),
+        "endpoints": provider_health.snapshot(),
+        "rate_limiter": get_rate_limiter().stats(),
+        "prompt_cache": prompt_cache_stats.snapshot(),
+        "model_calls": model_call_store.stats() if model_call_store else None,
+        "agent_pool": agent_pool.stats(),
+    }
+
+
+@status_router.get("/health/admission")
+def get_admission_health():
+    """Admission control of agent runs and audits: runs in flight, queue depth, wait times and rejections"""
+
+    return {
+        "status": "success",
+        "router": "status",
+        "path": "/health/admission",
+        "utc": current_utc_str(),
+        "admission": admission_controller.stats(),
+    }
@@ -1,10 +1,18 @@
 from fastapi import APIRouter
 
 from api.routes.agents import agents_router
+from api.routes.audit_jobs import audit_jobs_router
+from api.routes.findings import findings_router
+from api.routes.metrics import metrics_router
+from api.routes.reports import reports_router
 from api.routes.status import status_router
 from api.routes.workflows import workflows_router
 
 v1_router = APIRouter(prefix="/v1")
 v1_router.include_router(status_router)
 v1_router.include_router(agents_router)
+v1_router.include_router(findings_router)
+v1_router.include_router(reports_router)
+v1_router.include_router(metrics_router)
 v1_router.include_router(workflows_router, prefix="/workflows", tags=["Workflows"])
+v1_router.include_router(audit_jobs_router, prefix="/workflows", tags=["Workflows"])
@@ -0,0 +1,275 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from core.run_events import RunEventLog, SpilledRunEventLog, parse_last_event_id, run_event_logs
+from core.stream_events import dumps, loads
+from utils.log import logger
+
+# Events queued for one WebSocket client before the slow-client policy applies.
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# "merge": merge queued content deltas, then wait for the client (nothing is lost).
+# "drop": drop the oldest content / tool / progress events and send a `gap` event instead.
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "merge")
+
+SLOW_CLIENT_POLICIES = ("merge", "drop")
+# Events a client must see even when it falls behind.
+_KEPT_EVENT_TYPES = {"stage", "status", "end", "error"}
+
+_END = object()
+
+
+class _Queued:
+    def __init__(self, first_id: int, last_id: int, event: Dict[str, Any]):
+        self.first_id = first_id
+        self.last_id = last_id
+        self.event = event
+
+
+class SendQueue:
+    """
+    The bounded queue between a run's event log and one WebSocket client. When it is full, `put` applies
+    the slow-client policy instead of growing: merging consecutive content deltas into one event, or
+    dropping the oldest droppable events. Kept events (status, stage, end, error) are never dropped.
+    An entry covers the event IDs first_id..last_id, so the sender can report what was dropped.
+    """
+
+    def __init__(self, maxsize: int = WS_SEND_QUEUE_SIZE, policy: str = WS_SLOW_CLIENT_POLICY):
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items: Deque[Any] = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self.merged = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def _mergeable(a: Any, b_first_id: int, b_event: Dict[str, Any]) -> bool:
+        return (
+            isinstance(a, _Queued)
+            and a.event.get("type") == b_event.get("type") == "content"
+            and a.last_id + 1 == b_first_id
+        )
+
+    def _merge(self, a: _Queued, b_last_id: int, b_event: Dict[str, Any]) -> None:
+        a.event = {**a.event, "delta": a.event["delta"] + b_event["delta"]}
+        a.last_id = b_last_id
+        self.merged += 1
+
+    def _make_room(self) -> bool:
+        # Under either policy, queued content deltas are merged first...
+        for i in range(len(self._items) - 1):
+            a, b = self._items[i], self._items[i + 1]
+            if isinstance(b, _Queued) and self._mergeable(a, b.first_id, b.event):
+                self._merge(a, b.last_id, b.event)
+                del self._items[i + 1]
+                return True
+        # ...then the "drop" policy drops the oldest event a client can do without.
+        if self.policy == "drop":
+            for i, item in enumerate(self._items):
+                if isinstance(item, _Queued) and item.event.get("type") not in _KEPT_EVENT_TYPES:
+                    del self._items[i]
+                    self.dropped += 1
+                    return True
+        return False
+
+    async def put(self, event_id: int, event: Dict[str, Any]) -> None:
+        """Queues an event; when the queue is full and no room can be made, waits for the client."""
+        if len(self._items) >= self.maxsize:
+            if self._items and self._mergeable(self._items[-1], event_id, event):
+                self._merge(self._items[-1], event_id, event)
+                return
+            while len(self._items) >= self.maxsize and not self._make_room():
+                self._not_full.clear()
+                await self._not_full.wait()
+        self._items.append(_Queued(event_id, event_id, event))
+        self._not_empty.set()
+
+    def put_end(self) -> None:
+        self._items.append(_END)
+        self._not_empty.set()
+
+    async def get(self) -> Any:
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self._items.popleft()
+        if len(self._items) < self.maxsize:
+            self._not_full.set()
+        return item
+
+
+class RunChannel:
+    """
+    A WebSocket connection to a streamed run (see `start_streamed_run`), with client-to-server control.
+
+    Client messages (JSON):
+    - first: `{"type": "run", ...}` to start a run (the endpoint's parameters, and optionally
+      `"policy": "merge" | "drop"`), or `{"type": "attach", "run_id": ..., "last_event_id": n}` to follow a
+      running or recent one from after event n
+    - then: `{"type": "cancel"}` cancels the run (its model request and async tools stop at once),
+      `{"type": "pause"}` / `{"type": "resume"}` suspend and continue both the run and the stream. Only the
+      API process running the run can control it: a client attached to a run of another process follows
+      its spilled events and gets an `error` message for these.
+
+    Server messages are the run's events with their ID, `{"id": n, "type": ..., ...}`, preceded by
+    `{"type": "run", "run_id": ...}`. Events dropped for a slow client are reported as
+    `{"type": "gap", "from_id": a, "to_id": b}`; they can be fetched from the run's SSE resume endpoint.
+    Disconnecting without `cancel` leaves the run running, as with SSE.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.log: Optional[Union[RunEventLog, SpilledRunEventLog]] = None
+        self.queue: Optional[SendQueue] = None
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        # Whether this client paused the run (and has not resumed it).
+        self._paused = False
+
+    async def _error(self, detail: str) -> None:
+        await self.websocket.send_text(dumps({"type": "error", "detail": detail}))
+        await self.websocket.close(code=1008)
+
+    async def serve(self, start_run: Callable[[Dict[str, Any]], Awaitable[RunEventLog]]) -> None:
+        await self.websocket.accept()
+        try:
+            first = loads(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            return
+        except ValueError:
+            first = None
+        if not isinstance(first, dict):
+            await self._error("The first message must be a JSON object.")
+            return
+        policy = first.get("policy", WS_SLOW_CLIENT_POLICY)
+        if policy not in SLOW_CLIENT_POLICIES:
+            await self._error(f"Unknown policy {policy!r}, expected one of {SLOW_CLIENT_POLICIES}.")
+            return
+
+        after_id = 0
+        if first.get("type") == "run":
+            try:
+                self.log = await start_run(first)
+            except Exception as e:
+                await self._error(getattr(e, "detail", None) or str(e))
+                return
+        elif first.get("type") == "attach":
+            self.log = run_event_logs.get_readable(str(first.get("run_id")))
+            if self.log is None:
+                await self._error(f"No events of run {first.get('run_id')}; it is unknown or expired.")
+                return
+            after_id = parse_last_event_id(first.get("last_event_id"))
+        else:
+            await self._error('The first message must be {"type": "run", ...} or {"type": "attach", ...}.')
+            return
+
+        self.queue = SendQueue(policy=policy)
+        await self.websocket.send_text(dumps({"type": "run", "run_id": self.log.run_id}))
+        self.log.attach()
+        tasks = [
+            asyncio.create_task(self._read_log(after_id)),
+            asyncio.create_task(self._send()),
+            asyncio.create_task(self._receive()),
+        ]
+        try:
+            # Done when everything was sent or the client went away.
+            await asyncio.wait(tasks[1:], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # A client that goes away while paused would otherwise leave the run suspended.
+            if self._paused:
+                self.log.resume()
+            self.log.detach()
+        if tasks[1].done() and not tasks[1].cancelled() and tasks[1].exception() is None:
+            await self.websocket.close()
+
+    async def _read_log(self, after_id: int) -> None:
+        async for event_id, data in self.log.follow(after_id):
+            await self._resumed.wait()
+            await self.queue.put(event_id, loads(data))
+        self.queue.put_end()
+
+    async def _send(self) -> None:
+        last_sent = None
+        while True:
+            item = await self.queue.get()
+            if item is _END:
+                return
+            if last_sent is not None and item.first_id > last_sent + 1:
+                await self.websocket.send_text(dumps({"type": "gap", "from_id": last_sent + 1, "to_id": item.first_id - 1}))
+            await self.websocket.send_text(dumps({"id": item.last_id, **item.event}))
+            last_sent = item.last_id
+
+    async def _receive(self) -> None:
+        while True:
+            try:
+                message = loads(await self.websocket.receive_text())
+            except WebSocketDisconnect:
+                return
+            except ValueError:
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind in ("cancel", "pause", "resume") and not isinstance(self.log, RunEventLog):
+                detail = f"Run {self.log.run_id} runs in another API process; it can only be followed from here."
+                await self.websocket.send_text(dumps({"type": "error", "detail": detail}))
+            elif kind == "cancel":
+                logger.info(f"Run {self.log.run_id} cancelled by its client.")
+                self.log.resume()
+                self.log.cancel()
+                self._paused = False
+                self._resumed.set()
+            elif kind == "pause":
+                self.log.pause()
+                self._paused = True
+                self._resumed.clear()
+            elif kind == "resume":
+                self.log.resume()
+                self._paused = False
+                self._resumed.set()
+
+
+if __name__ == "__main__":
+    import time
+
+    # A client that reads one event per 10 ms from a run producing 1000 content deltas per second for 2 s,
+    # each followed by a tool event (so deltas are not adjacent and cannot always merge): queue length,
+    # duration and what reached the client under each policy.
+    async def slow_client(policy: str) -> None:
+        queue = SendQueue(maxsize=64, policy=policy)
+        received: List[Dict[str, Any]] = []
+        max_len = 0
+
+        async def produce() -> None:
+            nonlocal max_len
+            for i in range(2000):
+                await queue.put(2 * i + 1, {"type": "content", "delta": "x"})
+                await queue.put(2 * i + 2, {"type": "tool_end", "tool_name": "read_file"})
+                max_len = max(max_len, len(queue))
+                await asyncio.sleep(0.001)
+            queue.put_end()
+
+        async def consume() -> None:
+            while (item := await queue.get()) is not _END:
+                received.append(item.event)
+                await asyncio.sleep(0.01)
+
+        started = time.perf_counter()
+        await asyncio.gather(produce(), consume())
+        text = "".join(e["delta"] for e in received if e["type"] == "content")
+        print(
+            f"{policy:>5}: max queue {max_len}, {len(received)} messages in {time.perf_counter() - started:.2f}s, "
+            f"{len(text)}/2000 chars, {sum(e['type'] == 'tool_end' for e in received)}/2000 tool events, "
+            f"{queue.merged} merges, {queue.dropped} dropped"
+        )
+
+    for policy in SLOW_CLIENT_POLICIES:
+        asyncio.run(slow_client(policy))
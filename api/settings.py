@@ -22,6 +22,17 @@ class ApiSettings(BaseSettings):
     # Set to False to disable docs at /docs and /redoc
     docs_enabled: bool = True
 
+    # Set to True to log full prompts and responses of workflow runs.
+    # agno's debug logging renders on the event loop and stalls other requests while a workflow streams.
+    workflow_debug_mode: bool = False
+
+    # Admission control of requests that start agent runs and audits (see api/admission.py):
+    # runs at once, runs per API key / user / client address, and requests waiting for a slot (seconds).
+    admission_max_concurrent: int = 16
+    admission_max_per_tenant: int = 4
+    admission_max_queue: int = 32
+    admission_queue_timeout_s: float = 10.0
+
     # Cors origin list to allow requests from.
     # This list is set using the set_cors_origin_list validator
     # which uses the runtime_env variable to set the
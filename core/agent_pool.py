@@ -0,0 +1,174 @@
+import copy
+import dataclasses
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from agno.agent import Agent
+from agno.tools.toolkit import Toolkit
+
+from utils.log import logger
+
+# Prepared agents kept, one per (agent type, model, ...) key; the least recently used is evicted.
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "16"))
+
+# Not carried over to a clone (as in agno's Agent.deep_copy): the loaded session belongs to one request.
+_NOT_CLONED_FIELDS = {"agent_session", "session_name"}
+
+
+def _clone_tool(tool: Any) -> Any:
+    # agno sets `_agent` on a toolkit's functions when an agent prepares its tools: each clone needs its own
+    # Function objects. The toolkit's other state (clients, config) is shared.
+    if isinstance(tool, Toolkit):
+        clone = copy.copy(tool)
+        clone.functions = {name: copy.copy(function) for name, function in tool.functions.items()}
+        return clone
+    if callable(tool) or isinstance(tool, dict):
+        return tool
+    return copy.copy(tool)
+
+
+def clone_agent(template: Agent, **update: Any) -> Agent:
+    """
+    A new Agent for one request from a prepared `template`, with `update` applied (user_id, session_id, ...).
+
+    Copy-on-write: the expensive, stateless parts — storage (and its engine / connection pool), knowledge
+    and its vector DB, toolkits' clients, instructions — are shared with the template. What a run mutates is
+    copied: the model (per-run tool state; its HTTP client is pooled anyway), memory, the toolkits'
+    Function objects and top-level lists and dicts such as session_state.
+    """
+    values: Dict[str, Any] = {}
+    for field in dataclasses.fields(template):
+        if not field.init or field.name in _NOT_CLONED_FIELDS:
+            continue
+        value = getattr(template, field.name)
+        if value is None:
+            continue
+        if field.name == "model":
+            value = copy.deepcopy(value)
+        elif field.name == "memory":
+            value = value.deep_copy()
+        elif field.name == "tools":
+            value = [_clone_tool(tool) for tool in value]
+        elif isinstance(value, (list, dict, set)):
+            value = copy.copy(value)
+        values[field.name] = value
+    values.update(update)
+    return template.__class__(**values)
+
+
+class AgentPool:
+    """
+    An LRU of prepared agent templates, e.g. Sage with gpt-4o, from which each request gets a cheap clone.
+
+    Building Sage or Scholar from scratch creates a storage object with its own SQLAlchemy engine (so every
+    request opened new database connections), a vector DB object and a model. A template is built once per
+    key by its factory; `get` then binds the per-request fields to a `clone_agent` copy.
+    """
+
+    def __init__(self, size: int = AGENT_POOL_SIZE):
+        self.size = size
+        self._templates: "OrderedDict[Hashable, Agent]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _template(self, key: Hashable, factory: Callable[[], Agent]) -> Agent:
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+            # Built under the lock: concurrent first requests for a key wait for one build instead of each
+            # building their own. Builds are rare, one per key until it is evicted.
+            self.misses += 1
+            template = factory()
+            self._templates[key] = template
+            if len(self._templates) > self.size:
+                evicted, _ = self._templates.popitem(last=False)
+                self.evictions += 1
+                logger.debug(f"Agent pool evicted {evicted}")
+            return template
+
+    def get(self, key: Hashable, factory: Callable[[], Agent], **bind: Any) -> Agent:
+        """A clone of the template for `key` (built by `factory()` if not pooled) with `bind` applied."""
+        return clone_agent(self._template(key, factory), **bind)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "templates": len(self._templates),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+agent_pool = AgentPool()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from agno.storage.sqlite import SqliteStorage
+    from agno.tools.file import FileTools
+
+    from core.context_window import with_context_window
+    from core.mock_model import MockChat
+    from core.model_registry import get_pooled_model
+    from core.prompt_cache import current_date, run_context
+
+    # Per-request agent overhead of a Sage-shaped agent (model with context window, toolkit, storage),
+    # built from scratch vs. cloned from the pool, with 8 concurrent request threads. SQLite storage stands
+    # in for Postgres; the real agents also build a pgvector knowledge base, so they save more.
+    tmp = tempfile.mkdtemp()
+
+    def build(user_id: Any = None, session_id: Any = None) -> Agent:
+        return Agent(
+            name="Sage",
+            agent_id="sage",
+            user_id=user_id,
+            session_id=session_id,
+            model=with_context_window(get_pooled_model(MockChat, id="mock/echo")),
+            tools=[FileTools()],
+            storage=SqliteStorage(table_name="sage_sessions", db_file=f"{tmp}/agents.db"),
+            instructions=["Search your knowledge base first."] * 20,
+            additional_context=run_context(user=user_id, current_date=current_date()),
+            add_history_to_messages=True,
+        )
+
+    def pooled(user_id: str, session_id: str) -> Agent:
+        return agent_pool.get(
+            ("sage", "mock/echo"),
+            build,
+            user_id=user_id,
+            session_id=session_id,
+            additional_context=run_context(user=user_id, current_date=current_date()),
+        )
+
+    def measure(get: Callable[[str, str], Agent], requests: int = 400) -> str:
+        def timed(i: int) -> float:
+            started = time.perf_counter()
+            agent = get(f"user{i % 10}", f"session{i}")
+            assert agent.session_id == f"session{i}"
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            latencies = sorted(executor.map(timed, range(requests)))
+        return f"p50 {latencies[len(latencies) // 2]:.2f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms"
+
+    print("from scratch:", measure(build))
+    print("pooled:      ", measure(pooled), agent_pool.stats())
+    agent = pooled("alice", "s1")
+    template = agent_pool._templates[("sage", "mock/echo")]
+    print(f"clone answers {agent.run('hello').content!r}; template unchanged: {template.session_id is None and template.run_response is None}")
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from agno.models.base import Model
+from agno.models.message import Message
+
+from utils.log import logger
+
+# Token budget of the messages of one request, unless an agent sets its own.
+CONTEXT_WINDOW_MAX_TOKENS = int(os.getenv("CONTEXT_WINDOW_MAX_TOKENS", "32000"))
+# tiktoken encoding used for counting. Non-OpenAI models tokenize differently, but close enough for a budget.
+CONTEXT_WINDOW_ENCODING = os.getenv("CONTEXT_WINDOW_ENCODING", "o200k_base")
+
+# Per-message overhead of the chat format (role, separators).
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding: Any = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding() -> Any:
+    """The tiktoken encoding, or None if it cannot be loaded (e.g. offline without a cached encoding file)."""
+    global _encoding, _encoding_failed
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                import tiktoken
+
+                _encoding = tiktoken.get_encoding(CONTEXT_WINDOW_ENCODING)
+            except Exception as e:
+                _encoding_failed = True
+                logger.warning(f"tiktoken encoding {CONTEXT_WINDOW_ENCODING} unavailable, estimating tokens: {e}")
+        return _encoding
+
+
+# Token counts of recently seen texts, keyed by a digest: keying on the text itself would pin every large
+# tool output in memory for as long as it stays cached.
+_TOKEN_COUNT_CACHE_SIZE = 8192
+_token_counts: "OrderedDict[bytes, int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+def _encode_count(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    with _token_counts_lock:
+        tokens = _token_counts.get(key)
+        if tokens is not None:
+            _token_counts.move_to_end(key)
+            return tokens
+    tokens = _encode_count(text)
+    with _token_counts_lock:
+        _token_counts[key] = tokens
+        if len(_token_counts) > _TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return tokens
+
+
+def message_tokens(message: Message) -> int:
+    tokens = _MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get_content_string())
+    if message.tool_calls:
+        tokens += count_tokens(json.dumps(message.tool_calls, sort_keys=True))
+    return tokens
+
+
+class ContextWindowManager:
+    """
+    Keeps every request of an agent under a token budget.
+
+    History of tool-heavy agents is mostly old shell and file outputs that the model has already acted on.
+    When the messages of a request exceed `max_tokens`, they are compacted in this order until they fit:
+
+    1. Tool outputs of older exchanges are elided, oldest first, down to a short preview of their start.
+    2. Older exchanges (a user message and everything up to the next one) are dropped, oldest first.
+    3. Tool outputs of the recent exchanges are elided too, except those the model has not seen yet.
+
+    System messages and the last `keep_recent_exchanges` exchanges are otherwise sent verbatim. Compaction
+    works on copies: the agent's run messages and stored history keep the full outputs.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONTEXT_WINDOW_MAX_TOKENS,
+        keep_recent_exchanges: int = 2,
+        preview_chars: int = 300,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent_exchanges = keep_recent_exchanges
+        self.preview_chars = preview_chars
+
+    def _elide(self, message: Message, tokens: int) -> Message:
+        content = message.get_content_string()
+        preview = content[: self.preview_chars].rstrip()
+        return message.model_copy(
+            update={
+                "content": (
+                    f"[Output of {message.tool_name or 'tool'} elided to fit the context window "
+                    f"({tokens} tokens, {content.count(chr(10)) + 1} lines). Call the tool again if you need it. "
+                    f"It began with:]\n{preview}\n[...]"
+                )
+            }
+        )
+
+    def compact(self, messages: List[Message]) -> List[Message]:
+        """Returns `messages` itself if it fits the budget, otherwise a compacted copy."""
+        tokens = [message_tokens(m) for m in messages]
+        total = sum(tokens)
+        if total <= self.max_tokens:
+            return messages
+
+        # Exchanges: the non-system messages grouped from one user message up to the next.
+        exchanges: List[List[int]] = []
+        for i, message in enumerate(messages):
+            if message.role in ("system", "developer"):
+                continue
+            if message.role == "user" or not exchanges:
+                exchanges.append([])
+            exchanges[-1].append(i)
+        older = exchanges[: -self.keep_recent_exchanges] if self.keep_recent_exchanges else exchanges
+        recent = exchanges[len(older) :]
+
+        compacted = list(messages)
+        dropped = set()
+        before = total
+
+        def elide_tool_outputs(indexes: List[int]) -> None:
+            nonlocal total
+            for i in indexes:
+                if total <= self.max_tokens:
+                    return
+                message = compacted[i]
+                if message.role != "tool" or not isinstance(message.content, str):
+                    continue
+                elided = self._elide(message, tokens[i])
+                elided_tokens = message_tokens(elided)
+                if elided_tokens < tokens[i]:
+                    compacted[i] = elided
+                    total -= tokens[i] - elided_tokens
+                    tokens[i] = elided_tokens
+
+        elide_tool_outputs([i for exchange in older for i in exchange])
+        for exchange in older:
+            if total <= self.max_tokens:
+                break
+            dropped.update(exchange)
+            total -= sum(tokens[i] for i in exchange)
+        if total > self.max_tokens:
+            # Tool results after the last assistant message are what the model is about to read; keep them.
+            last_assistant = max((i for i, m in enumerate(messages) if m.role == "assistant"), default=-1)
+            elide_tool_outputs([i for exchange in recent for i in exchange if i < last_assistant])
+
+        result = [m for i, m in enumerate(compacted) if i not in dropped]
+        if total > self.max_tokens:
+            logger.warning(
+                f"Messages still use {total} tokens after compaction (budget {self.max_tokens}); "
+                f"the most recent exchange alone exceeds the budget."
+            )
+        logger.debug(
+            f"Context window compacted from {before} to {total} tokens "
+            f"({len(messages) - len(result)} messages dropped, budget {self.max_tokens})."
+        )
+        return result
+
+
+class ContextWindowMixin:
+    """Compacts the messages of every call with the model's `context_window` manager before sending them."""
+
+    context_window: Optional[ContextWindowManager] = None
+
+    def _fit(self, messages: List[Message]) -> List[Message]:
+        return self.context_window.compact(messages) if self.context_window is not None else messages
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        return super().invoke(self._fit(messages), response_format=response_format, tools=tools, tool_choice=tool_choice)
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        return await super().ainvoke(
+            self._fit(messages), response_format=response_format, tools=tools, tool_choice=tool_choice
+        )
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[Any]:
+        yield from super().invoke_stream(
+            self._fit(messages), response_format=response_format, tools=tools, tool_choice=tool_choice
+        )
+
+    async def ainvoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> AsyncIterator[Any]:
+        async for chunk in super().ainvoke_stream(
+            self._fit(messages), response_format=response_format, tools=tools, tool_choice=tool_choice
+        ):
+            yield chunk
+
+
+def with_context_window(model: Model, max_tokens: int = CONTEXT_WINDOW_MAX_TOKENS, **options: Any) -> Model:
+    """Returns `model` with a context window manager, e.g. `with_context_window(get_pooled_model(...), 48000)`."""
+    from core.model_registry import apply_model_mixins
+
+    model = apply_model_mixins(model, ContextWindowMixin)
+    model.context_window = ContextWindowManager(max_tokens=max_tokens, **options)
+    return model
+
+
+if __name__ == "__main__":
+    import time
+
+    from agno.agent import Agent
+    from agno.tools import tool
+
+    from core.mock_model import MockChat
+
+    # Eight turns of an agent that reads a ~12 KB file per turn, with the last 10 runs in its history
+    # (as the JavaSecurityAuditor). Compares the prompt tokens of each turn with and without a 12k budget.
+    @tool
+    def read_file(file_name: str) -> str:
+        """Reads a file."""
+        return f"// {file_name}\n" + "public class Controller { void handle(String input) { run(input); } }\n" * 180
+
+    script = {
+        "turns": [
+            {"content": "", "tool_calls": [{"name": "read_file", "arguments": {"file_name": "Controller.java"}}], "when": "^Audit", "repeat": True},
+            {"content": "Controller.handle passes user input to run().", "when": "Controller.java", "repeat": True},
+        ]
+    }
+
+    def run_turns(model: Model) -> List[int]:
+        agent = Agent(model=model, tools=[read_file], add_history_to_messages=True, num_history_responses=10)
+        prompt_tokens = []
+        for turn in range(8):
+            agent.run(f"Audit step {turn}")
+            prompt_tokens.append(agent.run_response.metrics["prompt_tokens"][-1])
+        return prompt_tokens
+
+    print("without manager:", run_turns(MockChat(id="mock/demo", script=script)))
+    print("12k budget:     ", run_turns(with_context_window(MockChat(id="mock/demo", script=script), 12000)))
+
+    history = [Message(role="system", content="You are an auditor.")]
+    for i in range(40):
+        history += [
+            Message(role="user", content=f"Step {i}"),
+            Message(role="assistant", tool_calls=[{"id": f"c{i}", "type": "function", "function": {"name": "read_file", "arguments": "{}"}}]),
+            Message(role="tool", tool_call_id=f"c{i}", tool_name="read_file", content=f"step {i}\n" + "x = y + z;\n" * 1500),
+            Message(role="assistant", content=f"Step {i} done."),
+        ]
+    manager = ContextWindowManager(max_tokens=32000)
+    started = time.perf_counter()
+    compacted = manager.compact(history)
+    print(
+        f"{len(history)} messages, {sum(map(message_tokens, history))} tokens -> {len(compacted)} messages, "
+        f"{sum(map(message_tokens, compacted))} tokens in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from agno.models.message import Message
+from agno.models.openai import OpenAIChat
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ParsedChatCompletion
+from pydantic import BaseModel
+
+# Scripts for `mock/<name>` model IDs are read from <MOCK_MODEL_SCRIPTS_DIR>/<name>.json.
+MOCK_MODEL_SCRIPTS_DIR = os.getenv(
+    "MOCK_MODEL_SCRIPTS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mock_scripts")
+)
+# Defaults for scripts that do not set their own timing.
+MOCK_MODEL_TTFT_MS = float(os.getenv("MOCK_MODEL_TTFT_MS", "0"))
+MOCK_MODEL_TOKEN_DELAY_MS = float(os.getenv("MOCK_MODEL_TOKEN_DELAY_MS", "0"))
+
+_TOKEN_RE = re.compile(r"\s*\S+|\s+")
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+def load_mock_script(name: str) -> Dict[str, Any]:
+    """Loads the script of `mock/<name>`; `name` may also be a path to a .json file."""
+    path = name if name.endswith(".json") else os.path.join(MOCK_MODEL_SCRIPTS_DIR, f"{name}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def script_from_messages(messages: List[Message], **options: Any) -> Dict[str, Any]:
+    """
+    Builds a script that replays the assistant turns of a recorded conversation, e.g. `run_response.messages`
+    of a live run, so the same run can be repeated offline.
+    """
+    turns = []
+    for message in messages:
+        if message.role != "assistant":
+            continue
+        turn: Dict[str, Any] = {"content": message.content or ""}
+        if message.tool_calls:
+            turn["tool_calls"] = [
+                {"name": c["function"]["name"], "arguments": json.loads(c["function"].get("arguments") or "{}")}
+                for c in message.tool_calls
+            ]
+        turns.append(turn)
+    return {**options, "turns": turns}
+
+
+@dataclass
+class MockChat(OpenAIChat):
+    """
+    An offline model that answers from a script instead of a provider, for benchmarks and load tests of the
+    agents, the team, the workflow and the API without live LLM calls.
+
+    A script is a dict (or `mock_scripts/<name>.json` for the model ID `mock/<name>`):
+
+        {
+          "ttft_ms": 200, "token_delay_ms": 15,
+          "turns": [
+            {"when": "deployment report", "content": "Reading the plan.",
+             "tool_calls": [{"name": "read_file", "arguments": {"file_name": "plan.md"}}]},
+            {"content": "Done. CASCADE-CONFIDENCE: high", "repeat": true}
+          ],
+          "default": "Nothing scripted for this turn."
+        }
+
+    Each call answers with the first unused turn whose `when` regex (if any) matches the last message;
+    `repeat` turns can be used again. Responses are real OpenAI completion objects, and streams are sent token
+    by token with the configured delays, so everything downstream of the model behaves as with a provider.
+    `mock/echo` needs no script and echoes the last message.
+    """
+
+    id: str = "mock/echo"
+    name: str = "MockChat"
+    provider: str = "Mock"
+    script: Optional[Dict[str, Any]] = None
+    used_turns: List[int] = field(default_factory=list)
+
+    @classmethod
+    def from_id(cls, model_id: str) -> "MockChat":
+        name = model_id.split("mock/", 1)[1]
+        return cls(id=model_id, script=None if name == "echo" else load_mock_script(name))
+
+    def _delays(self) -> Tuple[float, float]:
+        script = self.script or {}
+        return script.get("ttft_ms", MOCK_MODEL_TTFT_MS) / 1000, script.get("token_delay_ms", MOCK_MODEL_TOKEN_DELAY_MS) / 1000
+
+    def _next_turn(self, messages: List[Message]) -> Dict[str, Any]:
+        last = str(messages[-1].content or "") if messages else ""
+        if self.script is None:
+            return {"content": f"Echo: {last}"}
+        for index, turn in enumerate(self.script.get("turns", [])):
+            if index in self.used_turns and not turn.get("repeat"):
+                continue
+            if turn.get("when") and not re.search(turn["when"], last, re.IGNORECASE | re.DOTALL):
+                continue
+            self.used_turns.append(index)
+            return turn
+        return {"content": self.script.get("default", "")}
+
+    def _usage(self, messages: List[Message], content: str) -> Dict[str, int]:
+        prompt_tokens = sum(_estimate_tokens(str(m.content or "")) for m in messages)
+        completion_tokens = _estimate_tokens(content)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    @staticmethod
+    def _tool_name(name: str, tools: Optional[List[Dict[str, Any]]]) -> str:
+        # agno names the async variants of some built-in tools differently (e.g. atransfer_task_to_member)
+        available = {t.get("function", {}).get("name") for t in tools or []}
+        if name not in available and f"a{name}" in available:
+            return f"a{name}"
+        if name not in available and name.startswith("a") and name[1:] in available:
+            return name[1:]
+        return name
+
+    def _tool_calls(self, turn: Dict[str, Any], tools: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": f"call_mock_{int(time.time() * 1e6)}_{i}",
+                "type": "function",
+                "function": {"name": self._tool_name(call["name"], tools), "arguments": json.dumps(call.get("arguments", {}))},
+            }
+            for i, call in enumerate(turn.get("tool_calls", []))
+        ]
+
+    def _completion(self, messages: List[Message], response_format: Any, tools: Optional[List[Dict]]) -> ChatCompletion:
+        turn = self._next_turn(messages)
+        content = turn.get("content", "")
+        tool_calls = self._tool_calls(turn, tools)
+        message: Dict[str, Any] = {"role": "assistant", "content": content, "tool_calls": tool_calls or None}
+        payload = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.id,
+            "choices": [{"index": 0, "finish_reason": "tool_calls" if tool_calls else "stop", "message": message}],
+            "usage": self._usage(messages, content),
+        }
+        if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+            message["parsed"] = response_format.model_validate_json(content) if content else None
+            return ParsedChatCompletion[response_format].model_validate(payload)
+        return ChatCompletion.model_validate(payload)
+
+    def _chunks(self, messages: List[Message], tools: Optional[List[Dict]]) -> Iterator[ChatCompletionChunk]:
+        turn = self._next_turn(messages)
+        content = turn.get("content", "")
+        tool_calls = self._tool_calls(turn, tools)
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage: Optional[Dict] = None):
+            return ChatCompletionChunk.model_validate(
+                {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": self.id,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    "usage": usage,
+                }
+            )
+
+        for token in _TOKEN_RE.findall(content):
+            yield chunk({"role": "assistant", "content": token})
+        for index, call in enumerate(tool_calls):
+            yield chunk({"role": "assistant", "tool_calls": [{"index": index, **call}]})
+        yield chunk({}, finish_reason="tool_calls" if tool_calls else "stop")
+        usage_chunk = chunk({}, usage=self._usage(messages, content))
+        usage_chunk.choices = []
+        yield usage_chunk
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None) -> ChatCompletion:
+        ttft_s, token_delay_s = self._delays()
+        response = self._completion(messages, response_format, tools)
+        time.sleep(ttft_s + token_delay_s * response.usage.completion_tokens)
+        return response
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None) -> ChatCompletion:
+        ttft_s, token_delay_s = self._delays()
+        response = self._completion(messages, response_format, tools)
+        await asyncio.sleep(ttft_s + token_delay_s * response.usage.completion_tokens)
+        return response
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[ChatCompletionChunk]:
+        ttft_s, token_delay_s = self._delays()
+        time.sleep(ttft_s)
+        for i, chunk in enumerate(self._chunks(messages, tools)):
+            if i and token_delay_s:
+                time.sleep(token_delay_s)
+            yield chunk
+
+    async def ainvoke_stream(
+        self, messages, response_format=None, tools=None, tool_choice=None
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        ttft_s, token_delay_s = self._delays()
+        await asyncio.sleep(ttft_s)
+        for i, chunk in enumerate(self._chunks(messages, tools)):
+            if i and token_delay_s:
+                await asyncio.sleep(token_delay_s)
+            yield chunk
+
+
+if __name__ == "__main__":
+    from agno.agent import Agent
+    from agno.tools import tool
+
+    # An agent turn with a tool call and a streamed final answer, entirely offline.
+    @tool
+    def read_file(file_name: str) -> str:
+        """Reads a file."""
+        return f"contents of {file_name}"
+
+    model = MockChat(
+        id="mock/demo",
+        script={
+            "ttft_ms": 100,
+            "token_delay_ms": 10,
+            "turns": [
+                {"content": "", "tool_calls": [{"name": "read_file", "arguments": {"file_name": "pom.xml"}}]},
+                {"when": "contents of pom.xml", "content": "The pom.xml declares no vulnerable dependencies."},
+            ],
+        },
+    )
+    agent = Agent(model=model, tools=[read_file])
+    started = time.perf_counter()
+    chunks = 0
+    for response in agent.run("Audit pom.xml", stream=True):
+        chunks += 1
+    print(f"{chunks} chunks in {time.perf_counter() - started:.2f}s: {agent.run_response.content}")
+    print(f"Tool calls: {[t['tool_name'] for t in agent.run_response.tools or []]}")
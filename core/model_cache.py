@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Type, Union
+
+from agno.models.message import Message
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ParsedChatCompletion
+from pydantic import BaseModel
+
+from utils.log import logger
+
+# Opt-in: set MODEL_RESPONSE_CACHE=1 (or pass cache=True to get_model_instance) to cache model responses.
+MODEL_RESPONSE_CACHE_ENABLED = os.getenv("MODEL_RESPONSE_CACHE", "").lower() in ("1", "true", "yes")
+MODEL_RESPONSE_CACHE_PATH = os.getenv("MODEL_RESPONSE_CACHE_PATH", "/app/shared_reports/.model_cache/responses.db")
+MODEL_RESPONSE_CACHE_TTL_S = float(os.getenv("MODEL_RESPONSE_CACHE_TTL_S", str(7 * 24 * 3600)))
+MODEL_RESPONSE_CACHE_MAX_MB = float(os.getenv("MODEL_RESPONSE_CACHE_MAX_MB", "512"))
+# 'read_write': serve hits, call and store misses. 'replay': serve hits, fail on misses (exact reproduction).
+# 'record': always call the model and overwrite the cached response.
+MODEL_RESPONSE_CACHE_MODE = os.getenv("MODEL_RESPONSE_CACHE_MODE", "read_write")
+
+
+class ResponseCacheMiss(Exception):
+    """Raised in 'replay' mode when a model call has no cached response."""
+
+
+class ResponseCache:
+    """
+    SQLite store of raw provider responses (completions and complete streams), with TTL and LRU size eviction.
+    """
+
+    def __init__(
+        self,
+        db_path: str = MODEL_RESPONSE_CACHE_PATH,
+        ttl_s: float = MODEL_RESPONSE_CACHE_TTL_S,
+        max_bytes: int = int(MODEL_RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+        mode: str = MODEL_RESPONSE_CACHE_MODE,
+    ):
+        if mode not in ("read_write", "replay", "record"):
+            raise ValueError(f"Unknown response cache mode '{mode}'. Valid modes: read_write, replay, record.")
+        self.db_path = db_path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if not self._schema_ready:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        cache_key TEXT PRIMARY KEY,
+                        model_id TEXT NOT NULL,
+                        kind TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)")
+                self._schema_ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, cache_key: str) -> Optional[Any]:
+        if self.mode == "record":
+            return None
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT payload, created_at FROM responses WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_s:
+                conn.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, cache_key: str, model_id: str, kind: str, payload: Any) -> None:
+        data = json.dumps(payload, ensure_ascii=False)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, model_id, kind, payload, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, model_id, kind, data, len(data), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_s,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Least recently used first, until the cache is back under its size limit
+        freed = 0
+        victims = []
+        for cache_key, size in conn.execute("SELECT cache_key, size FROM responses ORDER BY last_access ASC"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((cache_key,))
+            freed += size
+        conn.executemany("DELETE FROM responses WHERE cache_key = ?", victims)
+        logger.debug(f"Model response cache evicted {len(victims)} entries ({freed} bytes).")
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Returns the process-wide response cache configured by the MODEL_RESPONSE_CACHE_* variables."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+
+def _normalize_response_format(response_format: Any) -> Any:
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return {"pydantic": response_format.__name__, "schema": response_format.model_json_schema()}
+    return response_format
+
+
+class ResponseCacheMixin:
+    """
+    Serves identical model calls from `get_response_cache()`.
+
+    The key covers the provider and model ID, the formatted messages, tool schemas, tool choice, response
+    format and all sampling parameters, so any change to the prompt or configuration is a miss. Streams are
+    cached once complete and replayed chunk by chunk, so streaming consumers see the same events.
+    """
+
+    response_cache: Optional[ResponseCache] = None  # None -> the process-wide cache
+
+    def _response_cache(self) -> ResponseCache:
+        return self.response_cache or get_response_cache()
+
+    def _response_cache_key(
+        self,
+        messages: List[Message],
+        response_format: Optional[Union[Dict, Type[BaseModel]]],
+        tools: Optional[List[Dict[str, Any]]],
+        tool_choice: Optional[Union[str, Dict[str, Any]]],
+        stream: bool,
+    ) -> str:
+        request = self.get_request_kwargs(response_format=response_format, tools=tools, tool_choice=tool_choice)
+        request["response_format"] = _normalize_response_format(request.get("response_format"))
+        material = {
+            "provider": self.provider,
+            "base_url": str(getattr(self, "base_url", None) or ""),
+            "model": self.id,
+            "messages": [self._format_message(m) for m in messages],
+            "request": request,
+            "stream": stream,
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _on_cache_miss(self, cache_key: str) -> None:
+        if self._response_cache().mode == "replay":
+            raise ResponseCacheMiss(f"No cached response for {self.id} (key {cache_key[:12]}) in replay mode.")
+
+    @staticmethod
+    def _load_completion(payload: Dict[str, Any], response_format: Any) -> ChatCompletion:
+        if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+            return ParsedChatCompletion[response_format].model_validate(payload)
+        return ChatCompletion.model_validate(payload)
+
+    def _store(self, cache_key: str, kind: str, payload: Any) -> None:
+        try:
+            self._response_cache().put(cache_key, self.id, kind, payload)
+        except Exception as e:
+            logger.warning(f"Could not store model response in the cache: {e}")
+
+    def _lookup(self, cache_key: str) -> Optional[Any]:
+        try:
+            return self._response_cache().get(cache_key)
+        except Exception as e:
+            logger.warning(f"Model response cache lookup failed: {e}")
+            return None
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        cache_key = self._response_cache_key(messages, response_format, tools, tool_choice, stream=False)
+        cached = self._lookup(cache_key)
+        if cached is not None:
+            return self._load_completion(cached, response_format)
+        self._on_cache_miss(cache_key)
+        response = super().invoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        self._store(cache_key, "completion", response.model_dump(mode="json"))
+        return response
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        cache_key = self._response_cache_key(messages, response_format, tools, tool_choice, stream=False)
+        cached = await asyncio.to_thread(self._lookup, cache_key)
+        if cached is not None:
+            return self._load_completion(cached, response_format)
+        self._on_cache_miss(cache_key)
+        response = await super().ainvoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        await asyncio.to_thread(self._store, cache_key, "completion", response.model_dump(mode="json"))
+        return response
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[ChatCompletionChunk]:
+        cache_key = self._response_cache_key(messages, response_format, tools, tool_choice, stream=True)
+        cached = self._lookup(cache_key)
+        if cached is not None:
+            for chunk in cached:
+                yield ChatCompletionChunk.model_validate(chunk)
+            return
+        self._on_cache_miss(cache_key)
+        chunks = []
+        for chunk in super().invoke_stream(messages, response_format=response_format, tools=tools, tool_choice=tool_choice):
+            chunks.append(chunk.model_dump(mode="json"))
+            yield chunk
+        # Only complete streams are cached
+        self._store(cache_key, "stream", chunks)
+
+    async def ainvoke_stream(
+        self, messages, response_format=None, tools=None, tool_choice=None
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        cache_key = self._response_cache_key(messages, response_format, tools, tool_choice, stream=True)
+        cached = await asyncio.to_thread(self._lookup, cache_key)
+        if cached is not None:
+            for chunk in cached:
+                yield ChatCompletionChunk.model_validate(chunk)
+            return
+        self._on_cache_miss(cache_key)
+        chunks = []
+        async for chunk in super().ainvoke_stream(
+            messages, response_format=response_format, tools=tools, tool_choice=tool_choice
+        ):
+            chunks.append(chunk.model_dump(mode="json"))
+            yield chunk
+        await asyncio.to_thread(self._store, cache_key, "stream", chunks)
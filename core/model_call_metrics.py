@@ -0,0 +1,151 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from core.prompt_cache import cached_prompt_tokens
+from utils.log import logger
+
+# Attribution of the model calls made in the current context: run_id, session_id, stage and task. None
+# outside any `model_call_scope`.
+model_call_context: contextvars.ContextVar[Optional[Dict[str, Optional[str]]]] = contextvars.ContextVar(
+    "model_call_context", default=None
+)
+
+
+@contextmanager
+def model_call_scope(**fields: Optional[str]) -> Iterator[None]:
+    """
+    Attributes the model calls made inside the block to the given run/session/stage/task. Scopes nest:
+    an inner scope overrides only the fields it sets (e.g. a member agent's stage within a team run).
+    """
+    outer = model_call_context.get() or {}
+    token = model_call_context.set({**outer, **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        try:
+            model_call_context.reset(token)
+        except ValueError:  # A stream closed from another context; the context it ran in is gone anyway
+            pass
+
+
+class _CallRecord:
+    """Measures one model call and hands the result to the model call store."""
+
+    def __init__(self, model: Any, stream: bool):
+        self.model = model
+        self.stream = stream
+        self.context = model_call_context.get() or {}
+        self.started = time.perf_counter()
+        self.ttft_ms: Optional[float] = None
+        self.usage: Any = None
+        self.tool_call_indexes: set = set()
+
+    def on_chunk(self, chunk: Any) -> None:
+        self.usage = getattr(chunk, "usage", None) or self.usage
+        for choice in getattr(chunk, "choices", None) or []:
+            delta = choice.delta
+            if self.ttft_ms is None and (delta.content or delta.tool_calls):
+                self.ttft_ms = (time.perf_counter() - self.started) * 1000
+            for tool_call in delta.tool_calls or []:
+                self.tool_call_indexes.add(tool_call.index)
+
+    def on_response(self, response: Any) -> None:
+        self.usage = getattr(response, "usage", None)
+        for choice in getattr(response, "choices", None) or []:
+            for i, _ in enumerate(choice.message.tool_calls or []):
+                self.tool_call_indexes.add(i)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        from db.model_call_store import get_model_call_store
+
+        store = get_model_call_store()
+        if store is None:
+            return
+        usage = self.usage
+        try:
+            store.record(
+                {
+                    "run_id": self.context.get("run_id"),
+                    "session_id": self.context.get("session_id"),
+                    "stage": self.context.get("stage"),
+                    "task": self.context.get("task"),
+                    "model_id": self.model.id,
+                    "provider": self.model.provider,
+                    "stream": self.stream,
+                    "prompt_tokens": (getattr(usage, "prompt_tokens", None) or 0) if usage else 0,
+                    "completion_tokens": (getattr(usage, "completion_tokens", None) or 0) if usage else 0,
+                    "cached_tokens": cached_prompt_tokens(usage) if usage else 0,
+                    "tool_calls": len(self.tool_call_indexes),
+                    "ttft_ms": self.ttft_ms,
+                    "latency_ms": (time.perf_counter() - self.started) * 1000,
+                    "error": f"{type(error).__name__}: {error}"[:2000] if error is not None else None,
+                }
+            )
+        except Exception as e:
+            logger.debug(f"Could not record model call metrics: {e}")
+
+
+class ModelCallMetricsMixin:
+    """
+    Records prompt, completion and cached tokens, time-to-first-token, latency, tool-call count and model ID of
+    every call, attributed to the run, stage and task of the surrounding `model_call_scope`.
+    """
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        record = _CallRecord(self, stream=False)
+        try:
+            response = super().invoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        except BaseException as e:
+            record.finish(e)
+            raise
+        record.on_response(response)
+        record.finish()
+        return response
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        record = _CallRecord(self, stream=False)
+        try:
+            response = await super().ainvoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        except BaseException as e:
+            record.finish(e)
+            raise
+        record.on_response(response)
+        record.finish()
+        return response
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[Any]:
+        record = _CallRecord(self, stream=True)
+        try:
+            for chunk in super().invoke_stream(
+                messages, response_format=response_format, tools=tools, tool_choice=tool_choice
+            ):
+                record.on_chunk(chunk)
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped reading early; the call itself did not fail.
+            record.finish()
+            raise
+        except BaseException as e:
+            record.finish(e)
+            raise
+        record.finish()
+
+    async def ainvoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> AsyncIterator[Any]:
+        record = _CallRecord(self, stream=True)
+        try:
+            async for chunk in super().ainvoke_stream(
+                messages, response_format=response_format, tools=tools, tool_choice=tool_choice
+            ):
+                record.on_chunk(chunk)
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped reading early; the call itself did not fail.
+            record.finish()
+            raise
+        except BaseException as e:
+            record.finish(e)
+            raise
+        record.finish()
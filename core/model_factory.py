@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, List, Optional
 import os # Import os to access environment variables
 
 DEFAULT_MODEL_ID = "openrouter/google/gemini-2.5-flash-preview-05-20"
@@ -6,15 +6,60 @@ DEFAULT_MODEL_ID = "openrouter/google/gemini-2.5-flash-preview-05-20"
 from agno.models.xai import xAI
 from agno.models.openai import OpenAIChat
 from agno.models.openai.like import OpenAILike # Import OpenAILike
+
+from core.mock_model import MockChat
+from core.model_cache import MODEL_RESPONSE_CACHE_ENABLED, ResponseCacheMixin
+from core.model_rate_limiter import RateLimitedMixin
+from core.model_registry import model_registry
+from core.model_router import MODEL_ROUTES, ModelRouterMixin
 # Add other necessary model imports here if expanding
 # from agno.models.google import Gemini # Example if re-added
 # from agno.models.openrouter import OpenRouter # Example - Agno might not have a dedicated OpenRouter class
 
-def get_model_instance(model_id_str: str) -> Any:
+def get_model_instance(model_id_str: str, cache: Optional[bool] = None, route: bool = True) -> Any:
     """
     Returns an initialized Agno model instance based on the model_id string.
+
+    Instances come from the model registry: each call gets its own copy, but all copies of a provider share
+    pooled, keep-alive HTTP clients (see core/model_registry.py for pool sizing).
+    With `cache=True` (default: the MODEL_RESPONSE_CACHE environment variable) identical calls are served
+    from the persistent response cache in core/model_cache.py.
+    If MODEL_ROUTES lists equivalent endpoints for the ID (and `route` is True), the model routes each call to
+    the healthiest of them, with fallback and hedging (core/model_router.py).
+    IDs like `mock/<script>` return an offline scripted model (core/mock_model.py) for benchmarks.
+    Every call acquires from the process-wide per provider/model rate limiter first (core/model_rate_limiter.py).
+    """
+    use_cache = MODEL_RESPONSE_CACHE_ENABLED if cache is None else cache
+    endpoints = MODEL_ROUTES.get(model_id_str, []) if route else []
+    if len(endpoints) > 1:
+        return model_registry.get(
+            ("routed_model_id", model_id_str, use_cache),
+            lambda: _create_routed_model_instance(endpoints, use_cache),
+            mixins=(ModelRouterMixin,),
+        )
+    return model_registry.get(
+        ("model_id", model_id_str),
+        lambda: _create_model_instance(model_id_str),
+        # Cache hits are answered before the rate limiter, so they do not use up the provider's limits.
+        mixins=(ResponseCacheMixin, RateLimitedMixin) if use_cache else (RateLimitedMixin,),
+    )
+
+
+def _create_routed_model_instance(endpoint_ids: List[str], use_cache: bool) -> Any:
+    """The first endpoint provides the model's identity and response parsing; calls go to all of them."""
+    router = _create_model_instance(endpoint_ids[0])
+    router.route_candidates = [get_model_instance(e, cache=use_cache, route=False) for e in endpoint_ids]
+    return router
+
+
+def _create_model_instance(model_id_str: str) -> Any:
+    """
+    Builds the Agno model instance for a model_id string.
     Handles OpenRouter models by using OpenAILike with custom base_url and api_key.
     """
+    if model_id_str.startswith("mock/"):
+        # Offline scripted model for benchmarks and load tests (core/mock_model.py)
+        return MockChat.from_id(model_id_str)
     if model_id_str.startswith("openrouter/"):
         openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
         # Extract the actual model ID for OpenRouter, e.g., "google/gemini-2.5-flash-preview-05-20"
@@ -48,6 +93,5 @@ def get_model_instance(model_id_str: str) -> Any:
     #         print("Warning: GOOGLE_API_KEY environment variable not set for direct Gemini usage.")
     #     return Gemini(id=actual_model_id, api_key=google_api_key) # actual_model_id would need to be just the gemini part
     else:
-        # Default fallback if no specific model is matched
-        print(f"Warning: Model ID '{model_id_str}' not explicitly recognized. Falling back to Grok.")
-        return xAI(id="grok-3-beta") 
\ No newline at end of file
+        # No silent fallback: a mistyped ID (e.g. a MODEL_ROUTES endpoint) would otherwise route to another provider.
+        raise ValueError(f"Unknown model id {model_id_str!r}") 
\ No newline at end of file
@@ -0,0 +1,455 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from agno.exceptions import ModelProviderError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from db.engine import create_engine_for_url, create_local_tables
+from db.tables import ModelRateLimitBucket
+from utils.log import logger
+
+# Requests and tokens per minute per provider/model, keyed "<provider>:<model id>" with "<provider>:*" and "*"
+# as fallbacks, e.g. '{"OpenAI:google/gemini-2.5-flash-preview-05-20": {"rpm": 300, "tpm": 1000000}}'.
+# Keys without a limit are not throttled (429 backoff still applies).
+MODEL_RATE_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.getenv("MODEL_RATE_LIMITS", "{}"))
+# Postgres URL to share bucket state across processes (API workers, queue workers). Empty: in-process buckets.
+MODEL_RATE_LIMIT_DB_URL = os.getenv("MODEL_RATE_LIMIT_DB_URL", "")
+MODEL_RATE_LIMIT_MAX_RETRIES = int(os.getenv("MODEL_RATE_LIMIT_MAX_RETRIES", "5"))
+MODEL_RATE_LIMIT_BACKOFF_BASE_S = float(os.getenv("MODEL_RATE_LIMIT_BACKOFF_BASE_S", "2"))
+MODEL_RATE_LIMIT_BACKOFF_MAX_S = float(os.getenv("MODEL_RATE_LIMIT_BACKOFF_MAX_S", "60"))
+# Completion tokens reserved for a call without max_tokens; corrected from the reported usage afterwards.
+MODEL_RATE_LIMIT_DEFAULT_COMPLETION_TOKENS = int(os.getenv("MODEL_RATE_LIMIT_DEFAULT_COMPLETION_TOKENS", "1024"))
+
+_POLL_INTERVAL_S = 0.05
+
+# The run a model call belongs to; waiting calls are served round-robin across runs.
+rate_limit_owner: contextvars.ContextVar[str] = contextvars.ContextVar("rate_limit_owner", default="default")
+
+
+@contextmanager
+def rate_limit_scope(owner: str) -> Iterator[None]:
+    """Attributes the model calls made inside the block (and tasks/threads started from it) to `owner`."""
+    token = rate_limit_owner.set(owner)
+    try:
+        yield
+    finally:
+        try:
+            rate_limit_owner.reset(token)
+        except ValueError:  # A stream closed from another context; the context it ran in is gone anyway
+            pass
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+
+
+def get_rate_limit(key: str) -> Optional[RateLimit]:
+    provider = key.split(":", 1)[0]
+    config = MODEL_RATE_LIMITS.get(key) or MODEL_RATE_LIMITS.get(f"{provider}:*") or MODEL_RATE_LIMITS.get("*")
+    if not config:
+        return None
+    return RateLimit(rpm=config.get("rpm"), tpm=config.get("tpm"))
+
+
+def _refill(level: float, capacity: Optional[float], elapsed_s: float) -> float:
+    if capacity is None:
+        return 0.0
+    return min(capacity, level + elapsed_s * capacity / 60.0)
+
+
+def _take(
+    state: Dict[str, float], limit: RateLimit, tokens: float, now: float
+) -> float:
+    """Refills `state` to `now` and takes one request and `tokens`. Returns 0, or the seconds to wait (no change)."""
+    elapsed = max(0.0, now - state["updated_at"])
+    state["request_tokens"] = _refill(state["request_tokens"], limit.rpm, elapsed)
+    state["token_tokens"] = _refill(state["token_tokens"], limit.tpm, elapsed)
+    state["updated_at"] = now
+    if state["blocked_until"] > now:
+        return state["blocked_until"] - now
+    # A single call larger than the whole bucket would never fit; it waits for a full bucket instead.
+    tokens = min(tokens, limit.tpm) if limit.tpm else 0.0
+    wait_s = 0.0
+    if limit.rpm and state["request_tokens"] < 1:
+        wait_s = max(wait_s, (1 - state["request_tokens"]) * 60.0 / limit.rpm)
+    if limit.tpm and state["token_tokens"] < tokens:
+        wait_s = max(wait_s, (tokens - state["token_tokens"]) * 60.0 / limit.tpm)
+    if wait_s > 0:
+        return wait_s
+    if limit.rpm:
+        state["request_tokens"] -= 1
+    if limit.tpm:
+        state["token_tokens"] -= tokens
+    return 0.0
+
+
+class LocalBucketStore:
+    """In-process token buckets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, float]] = {}
+
+    def _state(self, key: str, limit: RateLimit, now: float) -> Dict[str, float]:
+        state = self._states.get(key)
+        if state is None:
+            state = {"request_tokens": limit.rpm or 0.0, "token_tokens": limit.tpm or 0.0, "updated_at": now, "blocked_until": 0.0}
+            self._states[key] = state
+        return state
+
+    def take(self, key: str, limit: RateLimit, tokens: float) -> float:
+        now = time.time()
+        with self._lock:
+            return _take(self._state(key, limit, now), limit, tokens, now)
+
+    def adjust_tokens(self, key: str, limit: RateLimit, delta: float) -> None:
+        with self._lock:
+            state = self._state(key, limit, time.time())
+            state["token_tokens"] = min(limit.tpm or 0.0, state["token_tokens"] + delta)
+
+    def block_until(self, key: str, limit: RateLimit, until: float) -> None:
+        with self._lock:
+            state = self._state(key, limit, time.time())
+            state["blocked_until"] = max(state["blocked_until"], until)
+
+
+class DatabaseBucketStore:
+    """
+    Token buckets in the `model_rate_limit_buckets` table, updated under a row lock (SELECT ... FOR UPDATE), so
+    every process connected to the same Postgres database draws from the same budget.
+    """
+
+    def __init__(self, db_url: str):
+        self.engine: Engine = create_engine_for_url(db_url)
+        create_local_tables(self.engine, [ModelRateLimitBucket.__table__])
+
+    def _locked_row(self, db: Session, key: str, limit: RateLimit, now: float) -> ModelRateLimitBucket:
+        dialect_insert = postgresql_insert if self.engine.dialect.name == "postgresql" else sqlite_insert
+        # Concurrent first uses of a key race to create its row; the losers' inserts are no-ops.
+        db.execute(
+            dialect_insert(ModelRateLimitBucket)
+            .values(key=key, request_tokens=limit.rpm or 0.0, token_tokens=limit.tpm or 0.0, updated_at=now, blocked_until=0.0)
+            .on_conflict_do_nothing(index_elements=["key"])
+        )
+        return db.scalars(select(ModelRateLimitBucket).where(ModelRateLimitBucket.key == key).with_for_update()).one()
+
+    @contextmanager
+    def _state(self, key: str, limit: RateLimit) -> Iterator[Tuple[Dict[str, float], float]]:
+        now = time.time()
+        with Session(self.engine) as db, db.begin():
+            row = self._locked_row(db, key, limit, now)
+            state = {c: getattr(row, c) for c in ("request_tokens", "token_tokens", "updated_at", "blocked_until")}
+            yield state, now
+            for column, value in state.items():
+                setattr(row, column, value)
+
+    def take(self, key: str, limit: RateLimit, tokens: float) -> float:
+        with self._state(key, limit) as (state, now):
+            return _take(state, limit, tokens, now)
+
+    def adjust_tokens(self, key: str, limit: RateLimit, delta: float) -> None:
+        with self._state(key, limit) as (state, _):
+            state["token_tokens"] = min(limit.tpm or 0.0, state["token_tokens"] + delta)
+
+    def block_until(self, key: str, limit: RateLimit, until: float) -> None:
+        with self._state(key, limit) as (state, _):
+            state["blocked_until"] = max(state["blocked_until"], until)
+
+
+class _FairQueue:
+    """Per-key waiting line that serves runs round-robin, so one busy run cannot starve the others."""
+
+    def __init__(self):
+        self.runs: "OrderedDict[str, Deque[int]]" = OrderedDict()
+
+    def join(self, owner: str, ticket: int) -> None:
+        self.runs.setdefault(owner, deque()).append(ticket)
+
+    def head(self) -> Optional[int]:
+        return next(iter(self.runs.values()))[0] if self.runs else None
+
+    def leave(self, owner: str, ticket: int, served: bool) -> None:
+        tickets = self.runs.get(owner)
+        if tickets is None or ticket not in tickets:
+            return
+        tickets.remove(ticket)
+        if not tickets:
+            del self.runs[owner]
+        elif served:
+            self.runs.move_to_end(owner)  # The run's next call queues behind the other runs
+
+
+class ModelRateLimiter:
+    """
+    Process-wide token-bucket limiter for requests and tokens per minute, keyed by provider and model.
+
+    Waiting calls line up in a per-key fair queue (round-robin across runs, see `rate_limit_scope`); only the
+    head of the line draws from the bucket. A 429 blocks the whole key for a jittered, exponentially growing
+    delay (or the provider's Retry-After), so concurrent callers back off together instead of retrying in sync.
+    """
+
+    def __init__(self, db_url: str = MODEL_RATE_LIMIT_DB_URL):
+        self.store = DatabaseBucketStore(db_url) if db_url else LocalBucketStore()
+        self._lock = threading.Lock()
+        self._queues: Dict[str, _FairQueue] = {}
+        self._tickets = itertools.count()
+        self.waits = 0
+        self.wait_s = 0.0
+        self.throttled = 0
+
+    def _try(self, key: str, limit: RateLimit, tokens: float, owner: str, ticket: int) -> float:
+        with self._lock:
+            if self._queues[key].head() != ticket:
+                return _POLL_INTERVAL_S
+        try:
+            wait_s = self.store.take(key, limit, tokens)
+        except Exception as e:  # A broken shared store must not stop model calls
+            logger.warning(f"Rate limit store unavailable for {key}, not throttling: {e}")
+            wait_s = 0.0
+        if wait_s == 0.0:
+            with self._lock:
+                self._queues[key].leave(owner, ticket, served=True)
+        return wait_s
+
+    def _enter(self, key: str) -> Tuple[str, int]:
+        owner, ticket = rate_limit_owner.get(), next(self._tickets)
+        with self._lock:
+            self._queues.setdefault(key, _FairQueue()).join(owner, ticket)
+        return owner, ticket
+
+    def _leave(self, key: str, owner: str, ticket: int, waited_s: float) -> None:
+        with self._lock:
+            self._queues[key].leave(owner, ticket, served=False)
+            if waited_s >= _POLL_INTERVAL_S:
+                self.waits += 1
+                self.wait_s += waited_s
+
+    def acquire(self, key: str, tokens: float) -> None:
+        limit = get_rate_limit(key)
+        if limit is None:
+            return
+        owner, ticket = self._enter(key)
+        started = time.perf_counter()
+        try:
+            while (wait_s := self._try(key, limit, tokens, owner, ticket)) > 0:
+                time.sleep(min(wait_s, 1.0) + random.uniform(0, _POLL_INTERVAL_S))
+        finally:
+            self._leave(key, owner, ticket, time.perf_counter() - started)
+
+    async def aacquire(self, key: str, tokens: float) -> None:
+        limit = get_rate_limit(key)
+        if limit is None:
+            return
+        owner, ticket = self._enter(key)
+        started = time.perf_counter()
+        try:
+            while True:
+                if isinstance(self.store, DatabaseBucketStore):
+                    wait_s = await asyncio.to_thread(self._try, key, limit, tokens, owner, ticket)
+                else:
+                    wait_s = self._try(key, limit, tokens, owner, ticket)
+                if wait_s == 0:
+                    break
+                await asyncio.sleep(min(wait_s, 1.0) + random.uniform(0, _POLL_INTERVAL_S))
+        finally:
+            self._leave(key, owner, ticket, time.perf_counter() - started)
+
+    def settle(self, key: str, reserved: float, used: Optional[int]) -> None:
+        """Returns (or charges) the difference between the reserved estimate and the reported usage."""
+        limit = get_rate_limit(key)
+        if limit is None or not limit.tpm or used is None:
+            return
+        try:
+            self.store.adjust_tokens(key, limit, min(reserved, limit.tpm) - used)
+        except Exception as e:
+            logger.debug(f"Could not settle token usage for {key}: {e}")
+
+    def on_throttled(self, key: str, attempt: int, retry_after_s: Optional[float]) -> float:
+        """Blocks `key` after a 429 and returns the delay."""
+        backoff = min(MODEL_RATE_LIMIT_BACKOFF_MAX_S, MODEL_RATE_LIMIT_BACKOFF_BASE_S * 2**attempt)
+        delay = retry_after_s if retry_after_s is not None else random.uniform(backoff / 2, backoff)
+        with self._lock:
+            self.throttled += 1
+        try:
+            self.store.block_until(key, get_rate_limit(key) or RateLimit(), time.time() + delay)
+        except Exception as e:
+            logger.debug(f"Could not record 429 backoff for {key}: {e}")
+        logger.warning(f"{key} rate limited (429); backing off {delay:.1f}s (attempt {attempt + 1}).")
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "waits": self.waits,
+                "wait_s": round(self.wait_s, 3),
+                "throttled": self.throttled,
+                "queued": {k: sum(len(t) for t in q.runs.values()) for k, q in self._queues.items() if q.runs},
+            }
+
+
+_rate_limiter: Optional[ModelRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> ModelRateLimiter:
+    """Returns the process-wide limiter configured by the MODEL_RATE_LIMIT* variables."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = ModelRateLimiter()
+        return _rate_limiter
+
+
+def _retry_after_s(error: Exception) -> Optional[float]:
+    response = getattr(error.__cause__, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _is_throttled(error: Exception) -> bool:
+    return isinstance(error, ModelProviderError) and getattr(error, "status_code", None) == 429
+
+
+class RateLimitedMixin:
+    """
+    Makes every call of an OpenAI-compatible agno model acquire from `get_rate_limiter()` before it is sent,
+    and retries 429 responses with the limiter's shared, jittered backoff.
+
+    Tokens are reserved from an estimate (prompt characters / 4 plus max_tokens) and corrected from the
+    reported usage. The SDK's own retries are disabled for limited models so they cannot bypass the limiter.
+    """
+
+    def _rate_limit_key(self) -> str:
+        return f"{self.provider}:{self.id}"
+
+    def _get_client_params(self) -> Dict[str, Any]:
+        params = super()._get_client_params()
+        if get_rate_limit(self._rate_limit_key()) is not None and self.max_retries is None:
+            params["max_retries"] = 0
+        return params
+
+    def _estimate_tokens(self, messages, tools) -> int:
+        prompt_chars = sum(len(str(m.content or "")) for m in messages) + len(json.dumps(tools or [], default=str))
+        completion = self.max_completion_tokens or self.max_tokens or MODEL_RATE_LIMIT_DEFAULT_COMPLETION_TOKENS
+        return prompt_chars // 4 + completion
+
+    @staticmethod
+    def _used_tokens(response: Any) -> Optional[int]:
+        usage = getattr(response, "usage", None)
+        return getattr(usage, "total_tokens", None) if usage is not None else None
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        limiter, key, tokens = get_rate_limiter(), self._rate_limit_key(), self._estimate_tokens(messages, tools)
+        for attempt in itertools.count():
+            limiter.acquire(key, tokens)
+            try:
+                response = super().invoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+            except ModelProviderError as e:
+                if not _is_throttled(e) or attempt >= MODEL_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                limiter.on_throttled(key, attempt, _retry_after_s(e))
+                continue
+            limiter.settle(key, tokens, self._used_tokens(response))
+            return response
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        limiter, key, tokens = get_rate_limiter(), self._rate_limit_key(), self._estimate_tokens(messages, tools)
+        for attempt in itertools.count():
+            await limiter.aacquire(key, tokens)
+            try:
+                response = await super().ainvoke(
+                    messages, response_format=response_format, tools=tools, tool_choice=tool_choice
+                )
+            except ModelProviderError as e:
+                if not _is_throttled(e) or attempt >= MODEL_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                limiter.on_throttled(key, attempt, _retry_after_s(e))
+                continue
+            limiter.settle(key, tokens, self._used_tokens(response))
+            return response
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[Any]:
+        limiter, key, tokens = get_rate_limiter(), self._rate_limit_key(), self._estimate_tokens(messages, tools)
+        for attempt in itertools.count():
+            limiter.acquire(key, tokens)
+            used, started = None, False
+            try:
+                for chunk in super().invoke_stream(
+                    messages, response_format=response_format, tools=tools, tool_choice=tool_choice
+                ):
+                    started = True
+                    used = self._used_tokens(chunk) or used
+                    yield chunk
+            except ModelProviderError as e:
+                # A stream can only be retried before it has produced output
+                if started or not _is_throttled(e) or attempt >= MODEL_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                limiter.on_throttled(key, attempt, _retry_after_s(e))
+                continue
+            limiter.settle(key, tokens, used)
+            return
+
+    async def ainvoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> AsyncIterator[Any]:
+        limiter, key, tokens = get_rate_limiter(), self._rate_limit_key(), self._estimate_tokens(messages, tools)
+        for attempt in itertools.count():
+            await limiter.aacquire(key, tokens)
+            used, started = None, False
+            try:
+                async for chunk in super().ainvoke_stream(
+                    messages, response_format=response_format, tools=tools, tool_choice=tool_choice
+                ):
+                    started = True
+                    used = self._used_tokens(chunk) or used
+                    yield chunk
+            except ModelProviderError as e:
+                if started or not _is_throttled(e) or attempt >= MODEL_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                limiter.on_throttled(key, attempt, _retry_after_s(e))
+                continue
+            limiter.settle(key, tokens, used)
+            return
+
+
+if __name__ == "__main__":
+    # Three runs share a 120 RPM limit: one floods the queue with 30 calls, two make 5 calls each.
+    # With the fair queue the small runs finish early instead of waiting behind the flood.
+    MODEL_RATE_LIMITS["Demo:demo"] = {"rpm": 120}
+    limiter = ModelRateLimiter(db_url="")
+    done: Dict[str, float] = {}
+    t0 = time.perf_counter()
+
+    async def _run(owner: str, calls: int) -> None:
+        with rate_limit_scope(owner):
+            await asyncio.gather(*(limiter.aacquire("Demo:demo", 0) for _ in range(calls)))
+        done[owner] = time.perf_counter() - t0
+
+    async def _main() -> None:
+        # Drain the initial burst capacity so the demo shows steady-state behaviour.
+        await asyncio.gather(*(limiter.aacquire("Demo:demo", 0) for _ in range(120)))
+        global t0
+        t0 = time.perf_counter()
+        await asyncio.gather(_run("flood", 30), _run("small-1", 5), _run("small-2", 5))
+
+    asyncio.run(_main())
+    for owner, elapsed in sorted(done.items(), key=lambda x: x[1]):
+        print(f"{owner:8s} finished after {elapsed:5.1f}s")
+    print(limiter.stats())
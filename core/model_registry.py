@@ -0,0 +1,275 @@
+import asyncio
+import copy
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Tuple, Type
+
+import httpx
+from agno.models.base import Model
+from openai import AsyncOpenAI, OpenAI
+
+from core.model_call_metrics import ModelCallMetricsMixin
+from core.prompt_cache import PromptCacheStatsMixin
+from core.tool_execution import ConcurrentToolCallsMixin
+
+# Connection pool sizing, shared by all models that talk to the same provider base URL.
+MODEL_HTTP_MAX_CONNECTIONS = int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS", "100"))
+MODEL_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MODEL_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+MODEL_HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("MODEL_HTTP_KEEPALIVE_EXPIRY_S", "120"))
+MODEL_HTTP_CONNECT_TIMEOUT_S = float(os.getenv("MODEL_HTTP_CONNECT_TIMEOUT_S", "10"))
+MODEL_HTTP_READ_TIMEOUT_S = float(os.getenv("MODEL_HTTP_READ_TIMEOUT_S", "600"))
+
+_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MODEL_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=MODEL_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=MODEL_HTTP_KEEPALIVE_EXPIRY_S,
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(MODEL_HTTP_READ_TIMEOUT_S, connect=MODEL_HTTP_CONNECT_TIMEOUT_S)
+
+
+class _LoopClients:
+    """The async HTTP clients (per base URL) and SDK clients (per client params) of one event loop."""
+
+    def __init__(self):
+        self.http: Dict[str, httpx.AsyncClient] = {}
+        self.sdk: Dict[Hashable, Tuple[httpx.AsyncClient, AsyncOpenAI]] = {}
+
+
+class HttpClientPool:
+    """
+    Keep-alive HTTP clients shared per provider base URL.
+
+    Sync clients are process-wide. Async clients are per event loop, because httpx connections cannot be
+    shared across loops (the API runs one loop, Streamlit and scripts may create several); they and the
+    SDK clients built on them are dropped with their loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_clients: Dict[str, httpx.Client] = {}
+        # SDK clients only hold configuration, but building one per request is measurable; reuse them too.
+        self._sync_sdk_clients: Dict[Hashable, Tuple[httpx.Client, OpenAI]] = {}
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get_http_client(self, base_url: str) -> httpx.Client:
+        with self._lock:
+            client = self._sync_clients.get(base_url)
+            if client is None or client.is_closed:
+                client = httpx.Client(limits=_http_limits(), timeout=_http_timeout())
+                self._sync_clients[base_url] = client
+            return client
+
+    def get_async_http_client(self, base_url: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, _LoopClients()).http
+            client = clients.get(base_url)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
+                clients[base_url] = client
+            return client
+
+    def get_sdk_client(self, client_params: Dict[str, Any], use_async: bool) -> Any:
+        base_url = str(client_params.get("base_url") or _DEFAULT_BASE_URL)
+        key = tuple(sorted((k, repr(v)) for k, v in client_params.items()))
+        http_client: Any
+        if use_async:
+            http_client = self.get_async_http_client(base_url)
+            with self._lock:
+                sdk_clients: Dict[Hashable, Any] = self._async_clients[asyncio.get_running_loop()].sdk
+        else:
+            http_client = self.get_http_client(base_url)
+            sdk_clients = self._sync_sdk_clients
+        with self._lock:
+            cached = sdk_clients.get(key)
+            # An SDK client is bound to its HTTP client: a closed and replaced pool needs a new one.
+            if cached is not None and cached[0] is http_client:
+                return cached[1]
+            sdk_class = AsyncOpenAI if use_async else OpenAI
+            sdk_client = sdk_class(**client_params, http_client=http_client)
+            sdk_clients[key] = (http_client, sdk_client)
+            return sdk_client
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            loops = list(self._async_clients.values())
+            return {
+                "sync_pools": len(self._sync_clients),
+                "async_pools": sum(len(c.http) for c in loops),
+                "sdk_clients": len(self._sync_sdk_clients) + sum(len(c.sdk) for c in loops),
+            }
+
+    def close(self) -> None:
+        """Closes the sync pools. Async pools are closed by `aclose` on their own loop."""
+        with self._lock:
+            clients, self._sync_clients = list(self._sync_clients.values()), {}
+            self._sync_sdk_clients = {}
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Closes the async pools of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            loop_clients = self._async_clients.pop(loop, None)
+        for client in loop_clients.http.values() if loop_clients is not None else []:
+            await client.aclose()
+
+
+http_client_pool = HttpClientPool()
+
+
+class PooledClientMixin:
+    """
+    Makes an OpenAI-compatible agno model (OpenAIChat, OpenAILike, xAI, OpenRouter) reuse pooled clients
+    instead of building a new client, and for async calls a new connection pool, on every request.
+    """
+
+    def get_client(self) -> OpenAI:
+        if self.http_client is not None:  # An explicitly configured client wins
+            return super().get_client()
+        return http_client_pool.get_sdk_client(self._get_client_params(), use_async=False)
+
+    def get_async_client(self) -> AsyncOpenAI:
+        if self.http_client is not None:
+            return super().get_async_client()
+        return http_client_pool.get_sdk_client(self._get_client_params(), use_async=True)
+
+
+_mixin_classes: Dict[Tuple[type, Tuple[type, ...]], type] = {}
+_mixin_classes_lock = threading.Lock()
+
+
+def apply_model_mixins(model: Model, *mixins: type) -> Model:
+    """
+    Returns a copy of `model` whose class is a (cached) subclass of its class with the given mixins in front.
+    Mixins the class already has are skipped, so applying the same mixin twice is a no-op.
+    """
+    cls = type(model)
+    missing = tuple(m for m in mixins if not issubclass(cls, m))
+    if not missing:
+        return model
+    with _mixin_classes_lock:
+        key = (cls, missing)
+        mixed = _mixin_classes.get(key)
+        if mixed is None:
+            base_name = getattr(cls, "_base_model_name", cls.__name__)
+            mixed = type(cls.__name__, missing + (cls,), {"_base_model_name": base_name, "__module__": cls.__module__})
+            _mixin_classes[key] = mixed
+    # Instances cannot be re-classed (agno models define __dict__ on the base), so copy the fields over.
+    mixed_model = mixed.__new__(mixed)
+    mixed_model.__dict__.update(model.__dict__)
+    return mixed_model
+
+
+class ModelRegistry:
+    """
+    Caches one configured template per model and hands out copies that share pooled HTTP clients.
+
+    Agents mutate their model (tools, response format, tool choice), so every caller gets its own cheap copy;
+    the expensive parts — SDK clients, TLS sessions and keep-alive connections — live in `http_client_pool`.
+    Every model also records each call's tokens and latency (core/model_call_metrics.py) and reports its
+    provider-side prompt cache hits to `prompt_cache_stats`, and runs the independent tool calls of a turn
+    concurrently (core/tool_execution.py).
+    """
+
+    def __init__(self):
+        # Reentrant: a routed model's factory gets its endpoint models from the registry.
+        self._lock = threading.RLock()
+        self._templates: Dict[Hashable, Model] = {}
+
+    def get(self, key: Hashable, factory: Callable[[], Model], mixins: Tuple[type, ...] = ()) -> Model:
+        """Returns a copy of the template for `key`, building it with `factory` and `mixins` on first use."""
+        with self._lock:
+            template = self._templates.get((key, mixins))
+            if template is None:
+                template = apply_model_mixins(
+                    factory(),
+                    *mixins,
+                    ModelCallMetricsMixin,
+                    PromptCacheStatsMixin,
+                    ConcurrentToolCallsMixin,
+                    PooledClientMixin,
+                )
+                self._templates[(key, mixins)] = template
+        return copy.deepcopy(template)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+
+model_registry = ModelRegistry()
+
+
+def get_pooled_model(model_class: Type[Model], **params: Any) -> Model:
+    """Returns `model_class(**params)` from the registry, e.g. `get_pooled_model(OpenAIChat, id="gpt-4o")`."""
+    key = (model_class, tuple(sorted((k, repr(v)) for k, v in params.items())))
+    return model_registry.get(key, lambda: model_class(**params))
+
+
+if __name__ == "__main__":
+    import json
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from agno.models.message import Message
+    from agno.models.openai.like import OpenAILike
+
+    # A local OpenAI-compatible endpoint that counts TCP connections; compares fresh vs. pooled clients.
+    connections = {"count": 0}
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            connections["count"] += 1
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            body = json.dumps(
+                {
+                    "id": "x", "object": "chat.completion", "created": 0, "model": "demo",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    messages = [Message(role="user", content="hi")]
+
+    async def _run(make_model: Callable[[], Model], n: int = 50) -> Tuple[float, int]:
+        connections["count"] = 0
+        started = time.perf_counter()
+        for _ in range(n):
+            await make_model().ainvoke(messages=messages)
+        return (time.perf_counter() - started) / n * 1000, connections["count"]
+
+    fresh_ms, fresh_conns = asyncio.run(_run(lambda: OpenAILike(id="demo", base_url=base_url, api_key="x")))
+    pooled_ms, pooled_conns = asyncio.run(_run(lambda: get_pooled_model(OpenAILike, id="demo", base_url=base_url, api_key="x")))
+    print(f"fresh model per call:  {fresh_ms:.2f} ms/call, {fresh_conns} TCP connections for 50 calls")
+    print(f"registry (pooled):     {pooled_ms:.2f} ms/call, {pooled_conns} TCP connections for 50 calls")
+    print(http_client_pool.stats())
+    server.shutdown()
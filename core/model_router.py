@@ -0,0 +1,356 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+from agno.exceptions import ModelProviderError
+from agno.models.base import Model
+
+from utils.log import logger
+
+# Equivalent endpoints per model ID, tried in order of health. Override with MODEL_ROUTES (JSON object), e.g.
+# {"openrouter/google/gemini-2.5-flash-preview-05-20": ["openrouter/google/gemini-2.5-flash-preview-05-20",
+#                                                      "openrouter/google/gemini-2.5-flash"]}
+MODEL_ROUTES: Dict[str, List[str]] = json.loads(os.getenv("MODEL_ROUTES", "{}"))
+
+ROUTER_WINDOW_SIZE = int(os.getenv("MODEL_ROUTER_WINDOW_SIZE", "100"))
+# Hedge a call on a second endpoint when it has not finished (streams: produced a first chunk) after the
+# endpoint's p95, clamped to [MIN, MAX]. Set MODEL_ROUTER_HEDGING=0 to only fall back on errors.
+ROUTER_HEDGING_ENABLED = os.getenv("MODEL_ROUTER_HEDGING", "1").lower() in ("1", "true", "yes")
+ROUTER_HEDGE_MIN_S = float(os.getenv("MODEL_ROUTER_HEDGE_MIN_S", "5"))
+ROUTER_HEDGE_MAX_S = float(os.getenv("MODEL_ROUTER_HEDGE_MAX_S", "90"))
+ROUTER_MIN_SAMPLES = 10
+# Consecutive failures that take an endpoint out of rotation, and for how long.
+ROUTER_BREAKER_FAILURES = int(os.getenv("MODEL_ROUTER_BREAKER_FAILURES", "3"))
+ROUTER_BREAKER_COOLDOWN_S = float(os.getenv("MODEL_ROUTER_BREAKER_COOLDOWN_S", "30"))
+# Threads that run sync routed calls and their hedges (up to two per call; a losing hedge runs to completion).
+ROUTER_THREAD_POOL_SIZE = int(os.getenv("MODEL_ROUTER_THREAD_POOL_SIZE", "32"))
+
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=ROUTER_THREAD_POOL_SIZE, thread_name_prefix="model-hedge"
+)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class EndpointStats:
+    """Rolling latency, time-to-first-token and error statistics of one provider endpoint."""
+
+    def __init__(self, window_size: int = ROUTER_WINDOW_SIZE):
+        self._lock = threading.Lock()
+        self.latencies_s: Deque[float] = deque(maxlen=window_size)
+        self.ttfts_s: Deque[float] = deque(maxlen=window_size)
+        self.outcomes: Deque[bool] = deque(maxlen=window_size)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_success(self, latency_s: float, ttft_s: Optional[float] = None) -> None:
+        with self._lock:
+            self.latencies_s.append(latency_s)
+            if ttft_s is not None:
+                self.ttfts_s.append(ttft_s)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+
+    def record_abandoned(self, elapsed_s: float, stream: bool = False) -> None:
+        """A call cancelled after losing a hedge: its elapsed time is a lower bound of its latency."""
+        with self._lock:
+            (self.ttfts_s if stream else self.latencies_s).append(elapsed_s)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= ROUTER_BREAKER_FAILURES:
+                self.open_until = time.monotonic() + ROUTER_BREAKER_COOLDOWN_S
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def latency_p(self, q: float, stream: bool = False) -> Optional[float]:
+        with self._lock:
+            values = list(self.ttfts_s if stream else self.latencies_s)
+        return _percentile(values, q) if len(values) >= ROUTER_MIN_SAMPLES else None
+
+    def score(self, stream: bool) -> float:
+        """Lower is better. Endpoints without enough latency samples count as fast, so they get explored."""
+        p95 = self.latency_p(0.95, stream) or 0.0
+        error_rate = self.error_rate
+        return p95 * (1 + 5 * error_rate) + 10 * error_rate
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies, ttfts, calls = list(self.latencies_s), list(self.ttfts_s), len(self.outcomes)
+        return {
+            "calls": calls,
+            "error_rate": round(self.error_rate, 3),
+            "latency_p50_s": _percentile(latencies, 0.5),
+            "latency_p95_s": _percentile(latencies, 0.95),
+            "ttft_p50_s": _percentile(ttfts, 0.5),
+            "ttft_p95_s": _percentile(ttfts, 0.95),
+            "available": self.available,
+        }
+
+
+class ProviderHealth:
+    """Process-wide statistics per endpoint ('<provider>:<model id>'), shared by all routed models."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EndpointStats] = {}
+
+    def get(self, endpoint: str) -> EndpointStats:
+        with self._lock:
+            if endpoint not in self._stats:
+                self._stats[endpoint] = EndpointStats()
+            return self._stats[endpoint]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            items = list(self._stats.items())
+        return {endpoint: stats.snapshot() for endpoint, stats in items}
+
+
+provider_health = ProviderHealth()
+
+
+def endpoint_name(model: Model) -> str:
+    return f"{model.provider}:{model.id}"
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Client errors (bad request, context too long, auth) would fail on every endpoint, so they are not retried."""
+    status_code = getattr(error, "status_code", None)
+    if isinstance(error, ModelProviderError) and isinstance(status_code, int) and 400 <= status_code < 500:
+        return status_code in (408, 409, 429)
+    return True
+
+
+class ModelRouterMixin:
+    """
+    Routes each call of a model to the healthiest of several equivalent endpoints (`route_candidates`).
+
+    Endpoints are ranked by rolling p95 latency (time-to-first-token for streams) weighted by error rate;
+    endpoints with repeated failures are skipped for a cooldown. Failed calls fall back to the next endpoint,
+    and slow calls are hedged: after the endpoint's p95 a second endpoint is started and the first to answer
+    wins. Streams can only fall back or be hedged before their first chunk.
+    """
+
+    route_candidates: List[Model]
+
+    def _ranked_candidates(self, stream: bool) -> List[Model]:
+        candidates = list(self.route_candidates)
+        available = [m for m in candidates if provider_health.get(endpoint_name(m)).available]
+        # With every endpoint in cooldown, still try them all rather than failing outright
+        ranked = available or candidates
+        return sorted(ranked, key=lambda m: provider_health.get(endpoint_name(m)).score(stream))
+
+    @staticmethod
+    def _hedge_after_s(model: Model, stream: bool) -> Optional[float]:
+        if not ROUTER_HEDGING_ENABLED:
+            return None
+        p95 = provider_health.get(endpoint_name(model)).latency_p(0.95, stream)
+        return min(max(p95 if p95 is not None else ROUTER_HEDGE_MAX_S, ROUTER_HEDGE_MIN_S), ROUTER_HEDGE_MAX_S)
+
+    @staticmethod
+    def _log_fallback(model: Model, error: Exception) -> None:
+        logger.warning(f"Model endpoint {endpoint_name(model)} failed ({type(error).__name__}: {error}); trying the next one.")
+
+    # --- non-streaming ---
+
+    def _timed_invoke(self, model: Model, kwargs: Dict[str, Any]) -> Any:
+        stats = provider_health.get(endpoint_name(model))
+        started = time.perf_counter()
+        try:
+            response = model.invoke(**kwargs)
+        except Exception:
+            stats.record_failure()
+            raise
+        stats.record_success(time.perf_counter() - started)
+        return response
+
+    async def _atimed_invoke(self, model: Model, kwargs: Dict[str, Any]) -> Any:
+        stats = provider_health.get(endpoint_name(model))
+        started = time.perf_counter()
+        try:
+            response = await model.ainvoke(**kwargs)
+        except asyncio.CancelledError:
+            stats.record_abandoned(time.perf_counter() - started)
+            raise
+        except Exception:
+            stats.record_failure()
+            raise
+        stats.record_success(time.perf_counter() - started)
+        return response
+
+    def _submit(self, model: Model, kwargs: Dict[str, Any]) -> concurrent.futures.Future:
+        # In a copy of the caller's context, so the call keeps its model call scope and rate limit owner.
+        return _hedge_executor.submit(contextvars.copy_context().run, self._timed_invoke, model, kwargs)
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        kwargs = {"messages": messages, "response_format": response_format, "tools": tools, "tool_choice": tool_choice}
+        queue = self._ranked_candidates(stream=False)
+        last_error: Optional[Exception] = None
+        pending: Dict[concurrent.futures.Future, Model] = {}
+        while queue or pending:
+            if not pending:
+                model = queue.pop(0)
+                pending[self._submit(model, kwargs)] = model
+            hedge_after = self._hedge_after_s(next(iter(pending.values())), stream=False) if queue else None
+            done, _ = concurrent.futures.wait(
+                pending, timeout=hedge_after, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                backup = queue.pop(0)
+                logger.info(f"Hedging slow call to {self.id} on {endpoint_name(backup)}.")
+                pending[self._submit(backup, kwargs)] = backup
+                continue
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    if not _is_retryable(e):
+                        raise
+                    last_error = e
+                    self._log_fallback(model, e)
+        # A losing hedge keeps running to completion in the background; its result is discarded.
+        raise last_error or RuntimeError(f"No endpoint available for {self.id}.")
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        kwargs = {"messages": messages, "response_format": response_format, "tools": tools, "tool_choice": tool_choice}
+        queue = self._ranked_candidates(stream=False)
+        last_error: Optional[Exception] = None
+        pending: Dict[asyncio.Task, Model] = {}
+        try:
+            while queue or pending:
+                if not pending:
+                    model = queue.pop(0)
+                    pending[asyncio.ensure_future(self._atimed_invoke(model, kwargs))] = model
+                hedge_after = self._hedge_after_s(next(iter(pending.values())), stream=False) if queue else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    backup = queue.pop(0)
+                    logger.info(f"Hedging slow call to {self.id} on {endpoint_name(backup)}.")
+                    pending[asyncio.ensure_future(self._atimed_invoke(backup, kwargs))] = backup
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        if not _is_retryable(e):
+                            raise
+                        last_error = e
+                        self._log_fallback(model, e)
+            raise last_error or RuntimeError(f"No endpoint available for {self.id}.")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # --- streaming ---
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[Any]:
+        kwargs = {"messages": messages, "response_format": response_format, "tools": tools, "tool_choice": tool_choice}
+        last_error: Optional[Exception] = None
+        for model in self._ranked_candidates(stream=True):
+            stats = provider_health.get(endpoint_name(model))
+            started = time.perf_counter()
+            ttft: Optional[float] = None
+            try:
+                for chunk in model.invoke_stream(**kwargs):
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    yield chunk
+            except Exception as e:
+                stats.record_failure()
+                if ttft is not None or not _is_retryable(e):
+                    raise  # Chunks were already delivered; a retry would duplicate them
+                last_error = e
+                self._log_fallback(model, e)
+                continue
+            stats.record_success(time.perf_counter() - started, ttft)
+            return
+        raise last_error or RuntimeError(f"No endpoint available for {self.id}.")
+
+    async def _afirst_chunk(self, model: Model, kwargs: Dict[str, Any]) -> Tuple[Any, Any, float, float]:
+        """Opens a stream and waits for its first chunk. Returns (stream, first chunk, start time, TTFT)."""
+        started = time.perf_counter()
+        stream = model.ainvoke_stream(**kwargs).__aiter__()
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except asyncio.CancelledError:
+            provider_health.get(endpoint_name(model)).record_abandoned(time.perf_counter() - started, stream=True)
+            raise
+        except Exception:
+            provider_health.get(endpoint_name(model)).record_failure()
+            raise
+        return stream, first, started, time.perf_counter() - started
+
+    async def ainvoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> AsyncIterator[Any]:
+        kwargs = {"messages": messages, "response_format": response_format, "tools": tools, "tool_choice": tool_choice}
+        queue = self._ranked_candidates(stream=True)
+        last_error: Optional[Exception] = None
+        pending: Dict[asyncio.Task, Model] = {}
+        winner: Optional[Tuple[Model, Any, Any, float, float]] = None
+        try:
+            while (queue or pending) and winner is None:
+                if not pending:
+                    model = queue.pop(0)
+                    pending[asyncio.ensure_future(self._afirst_chunk(model, kwargs))] = model
+                hedge_after = self._hedge_after_s(next(iter(pending.values())), stream=True) if queue else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    backup = queue.pop(0)
+                    logger.info(f"Hedging slow stream from {self.id} on {endpoint_name(backup)}.")
+                    pending[asyncio.ensure_future(self._afirst_chunk(backup, kwargs))] = backup
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    try:
+                        stream, first, started, ttft = task.result()
+                    except Exception as e:
+                        if not _is_retryable(e):
+                            raise
+                        last_error = e
+                        self._log_fallback(model, e)
+                        continue
+                    if winner is None:
+                        winner = (model, stream, first, started, ttft)
+                    else:
+                        await stream.aclose()
+        finally:
+            for task in pending:
+                task.cancel()
+        if winner is None:
+            raise last_error or RuntimeError(f"No endpoint available for {self.id}.")
+
+        model, stream, first, started, ttft = winner
+        stats = provider_health.get(endpoint_name(model))
+        try:
+            if first is not None:
+                yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception:
+            stats.record_failure()
+            raise
+        stats.record_success(time.perf_counter() - started, ttft)
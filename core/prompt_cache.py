@@ -0,0 +1,157 @@
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from agno.models.message import Message
+
+from utils.log import logger
+
+# Distinct system prompts remembered per model, to spot prompts that change between calls.
+_MAX_TRACKED_PROMPTS = 1000
+
+
+def run_context(**items: Optional[str]) -> str:
+    """
+    Per-run / per-user context for an agent's `additional_context`.
+
+    agno places `additional_context` after the description, instructions and tool instructions, so keeping
+    everything that varies by run, user or day in here leaves the large static part of the system prompt
+    byte-identical across turns and runs, which is what provider-side prompt caching matches on.
+    """
+    lines = [f"{name.replace('_', ' ').capitalize()}: {value}" for name, value in items.items() if value]
+    return "<run_context>\n" + "\n".join(lines) + "\n</run_context>" if lines else ""
+
+
+def current_date() -> str:
+    # The date rather than the time: a timestamp would change the system prompt, and with it invalidate the
+    # cached conversation history, on every turn.
+    return date.today().isoformat()
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+
+class PromptCacheStats:
+    """Provider-reported prompt and cached-prompt tokens per model, plus how many distinct system prompts it saw."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        )
+        self._system_prompts: Dict[str, set] = defaultdict(set)
+
+    def record(self, model_id: str, system_prompt_hash: Optional[str], usage: Any) -> None:
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        cached_tokens = cached_prompt_tokens(usage)
+        with self._lock:
+            stats = self._models[model_id]
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+            prompts = self._system_prompts[model_id]
+            if system_prompt_hash and len(prompts) < _MAX_TRACKED_PROMPTS:
+                prompts.add(system_prompt_hash)
+        logger.debug(
+            f"{model_id}: {cached_tokens}/{prompt_tokens} prompt tokens served from the provider cache "
+            f"(system prompt {system_prompt_hash})."
+        )
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                model_id: {
+                    **stats,
+                    "cached_ratio": round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0,
+                    "distinct_system_prompts": len(self._system_prompts[model_id]),
+                }
+                for model_id, stats in self._models.items()
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
+
+
+def system_prompt_hash(messages: List[Message]) -> Optional[str]:
+    for message in messages:
+        if message.role in ("system", "developer") and isinstance(message.content, str):
+            return hashlib.sha256(message.content.encode("utf-8")).hexdigest()[:12]
+    return None
+
+
+class PromptCacheStatsMixin:
+    """Records the provider-reported cached prompt tokens of every call in `prompt_cache_stats`."""
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        response = super().invoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        prompt_cache_stats.record(self.id, system_prompt_hash(messages), getattr(response, "usage", None))
+        return response
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None):
+        response = await super().ainvoke(messages, response_format=response_format, tools=tools, tool_choice=tool_choice)
+        prompt_cache_stats.record(self.id, system_prompt_hash(messages), getattr(response, "usage", None))
+        return response
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> Iterator[Any]:
+        usage = None
+        for chunk in super().invoke_stream(messages, response_format=response_format, tools=tools, tool_choice=tool_choice):
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        prompt_cache_stats.record(self.id, system_prompt_hash(messages), usage)
+
+    async def ainvoke_stream(self, messages, response_format=None, tools=None, tool_choice=None) -> AsyncIterator[Any]:
+        usage = None
+        async for chunk in super().ainvoke_stream(
+            messages, response_format=response_format, tools=tools, tool_choice=tool_choice
+        ):
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        prompt_cache_stats.record(self.id, system_prompt_hash(messages), usage)
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+if __name__ == "__main__":
+    import time
+
+    from agno.agent import Agent
+    from agno.models.openai import OpenAIChat
+
+    from agents.deep_dive_security_auditor_agent import DEEP_DIVE_SECURITY_AUDITOR_AGENT_CONFIG
+
+    # Turn 2 of a conversation resends the system prompt plus turn 1 (here ~40k characters of tool output).
+    # Compares how much of it is a byte-identical prefix of what turn 1 sent, i.e. cacheable by the provider,
+    # with agno's datetime in the system prompt vs. the date in the trailing run context.
+    def system_prompt(**agent_kwargs: Any) -> str:
+        agent = Agent(
+            model=OpenAIChat(id="gpt-4o", api_key="x"),
+            description=DEEP_DIVE_SECURITY_AUDITOR_AGENT_CONFIG.description,
+            instructions=DEEP_DIVE_SECURITY_AUDITOR_AGENT_CONFIG.instructions_template,
+            markdown=True,
+            **agent_kwargs,
+        )
+        return agent.get_system_message(session_id="s").content
+
+    turn_1 = "\n[user] Audit task 1\n[assistant] read_file(...)\n[tool] " + "x" * 40000
+    for label, kwargs in (
+        ("datetime in instructions", {"add_datetime_to_instructions": True, "additional_context": "User: alice"}),
+        ("run context at the end", {"additional_context": run_context(user="alice", date=current_date())}),
+    ):
+        first = system_prompt(**kwargs) + turn_1
+        time.sleep(0.01)
+        second = system_prompt(**kwargs) + turn_1 + "\n[user] Continue with task 2"
+        shared = common_prefix_length(first, second)
+        print(f"{label:26s}: {shared}/{len(second)} characters of turn 2 cacheable ({shared / len(second):.1%})")
@@ -0,0 +1,474 @@
+import asyncio
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from core.stream_events import dumps
+from utils.log import logger
+
+# Events of a run kept in memory; all events are also written to a file under RUN_EVENT_SPILL_DIR, which must
+# be shared by the API's worker processes so that a client reconnecting to another worker can resume.
+RUN_EVENT_BUFFER_SIZE = int(os.getenv("RUN_EVENT_BUFFER_SIZE", "1000"))
+RUN_EVENT_SPILL_DIR = os.getenv("RUN_EVENT_SPILL_DIR", "/app/shared_reports/.state/run_events")
+# How often a reader on another worker checks the spill file for new events.
+RUN_EVENT_POLL_S = float(os.getenv("RUN_EVENT_POLL_S", "0.5"))
+# How long the events of a finished run stay available to reconnecting clients.
+RUN_EVENT_RETENTION_S = float(os.getenv("RUN_EVENT_RETENTION_S", "3600"))
+# A streamed run nobody is reading any more is cancelled after this long (longer than proxy reconnects take).
+RUN_EVENT_DETACH_TIMEOUT_S = float(os.getenv("RUN_EVENT_DETACH_TIMEOUT_S", "300"))
+# SSE comment sent when a stream is idle, so proxies and load balancers do not close it.
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", "15"))
+
+# Byte offset of every n-th spilled event, so a replay seeks close to the requested event.
+_SPILL_INDEX_EVERY = 256
+# The last line of the spill file of a closed log.
+_SPILL_END = b"null\n"
+# Run IDs are used in file names.
+_RUN_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def _touch(path: str) -> None:
+    try:
+        with open(path, "ab"):
+            pass
+        os.utime(path)
+    except OSError as e:
+        logger.debug(f"Could not touch {path}: {e}")
+
+
+class RunEventLog:
+    """
+    The numbered events of one streamed run, for SSE clients that reconnect with `Last-Event-ID`.
+
+    Event IDs start at 1 and have no gaps. The latest `buffer_size` events are kept in memory; every event is
+    also appended to a JSON-lines spill file, so a replay from any ID returns exactly the events after it,
+    however long the run, and other worker processes can follow the run (see `SpilledRunEventLog`). Writers
+    may be on any thread; readers follow the log on their own event loop.
+    """
+
+    def __init__(self, run_id: str, buffer_size: int = RUN_EVENT_BUFFER_SIZE, spill_dir: str = RUN_EVENT_SPILL_DIR):
+        self.run_id = run_id
+        self.buffer_size = buffer_size
+        self.spill_path = os.path.join(spill_dir, f"{run_id}.jsonl")
+        self.readers_path = os.path.join(spill_dir, f"{run_id}.readers")
+        self._lock = threading.Lock()
+        self._buffer: Deque[Tuple[int, str]] = deque()
+        self._last_id = 0
+        # Events up to this ID are only in the spill file.
+        self._spilled_until = 0
+        self._spill_started = False
+        self._spill_offsets: List[int] = []
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.closed = False
+        self.closed_at: Optional[float] = None
+        self.readers = 0
+        self.detached_since: Optional[float] = time.monotonic()
+        self.paused = False
+        self._cancel: Optional[Callable[[], Any]] = None
+        self._close_callbacks: List[Callable[[], Any]] = []
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def append(self, data: str) -> int:
+        with self._lock:
+            if self.closed:
+                raise RuntimeError(f"Event log of run {self.run_id} is closed")
+            self._last_id += 1
+            self._spill(self._last_id, data)
+            self._buffer.append((self._last_id, data))
+            if len(self._buffer) > self.buffer_size:
+                self._spilled_until = self._buffer.popleft()[0]
+            waiters, self._waiters = self._waiters, set()
+        self._wake(waiters)
+        return self._last_id
+
+    def close(self) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.closed_at = time.monotonic()
+            if self._spill_started:
+                with open(self.spill_path, "ab") as f:
+                    f.write(_SPILL_END)
+            waiters, self._waiters = self._waiters, set()
+            callbacks, self._close_callbacks = self._close_callbacks, []
+        self._wake(waiters)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Close callback of run {self.run_id} failed: {e}")
+
+    def add_close_callback(self, callback: Callable[[], Any]) -> None:
+        """Calls `callback` (on the closing thread) when the log is closed, at once if it already is."""
+        with self._lock:
+            if not self.closed:
+                self._close_callbacks.append(callback)
+                return
+        callback()
+
+    @staticmethod
+    def _wake(waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]) -> None:
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # The reader's loop is closed
+                pass
+
+    def _spill(self, event_id: int, data: str) -> None:
+        if not self._spill_started:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+        # The first event replaces the file of an earlier log of the run ID, possibly of another process (a
+        # job's last attempt). Every event is written through at once: readers on other workers follow the file.
+        with open(self.spill_path, "ab" if self._spill_started else "wb") as f:
+            if (event_id - 1) % _SPILL_INDEX_EVERY == 0:
+                self._spill_offsets.append(f.tell())
+            f.write(json.dumps([event_id, data]).encode("utf-8") + b"\n")
+        self._spill_started = True
+
+    def _snapshot(self, after_id: int) -> Tuple[List[Tuple[int, str]], int, int]:
+        """The buffered events after `after_id`, and the range of the spill file to read for the older ones."""
+        with self._lock:
+            buffered = [e for e in self._buffer if e[0] > after_id]
+            spilled_until = self._spilled_until
+            offset = self._spill_offsets[after_id // _SPILL_INDEX_EVERY] if after_id < spilled_until else 0
+        return buffered, spilled_until, offset
+
+    def _read_spilled(self, after_id: int, until_id: int, offset: int) -> List[Tuple[int, str]]:
+        # Needs no lock: the file only grows, and the events up to `until_id` were completely written before
+        # they left the buffer.
+        events: List[Tuple[int, str]] = []
+        with open(self.spill_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                record = json.loads(line)
+                if record is None:
+                    break
+                event_id, data = record
+                if event_id > until_id:
+                    break
+                if event_id > after_id:
+                    events.append((event_id, data))
+        return events
+
+    def read(self, after_id: int = 0) -> List[Tuple[int, str]]:
+        """The events with IDs greater than `after_id`."""
+        buffered, spilled_until, offset = self._snapshot(after_id)
+        spilled = self._read_spilled(after_id, spilled_until, offset) if after_id < spilled_until else []
+        return spilled + buffered
+
+    async def follow(self, after_id: int = 0, heartbeat_s: Optional[float] = None) -> AsyncIterator[Optional[Tuple[int, str]]]:
+        """
+        Yields the events after `after_id`, then each new one until the log is closed. With `heartbeat_s`,
+        yields None whenever that long passes without an event.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            wakeup = asyncio.Event()
+            with self._lock:
+                closed = self.closed
+                if not closed and self._last_id <= after_id:
+                    self._waiters.add((loop, wakeup))
+            buffered, spilled_until, offset = self._snapshot(after_id)
+            events = buffered
+            if after_id < spilled_until:
+                # A replay from far back reads the spill file, off the event loop.
+                events = await asyncio.to_thread(self._read_spilled, after_id, spilled_until, offset) + buffered
+            for event in events:
+                yield event
+            if events:
+                after_id = events[-1][0]
+                continue
+            if closed:
+                return
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=heartbeat_s)
+            except asyncio.TimeoutError:
+                yield None
+            finally:
+                with self._lock:
+                    self._waiters.discard((loop, wakeup))
+
+    def attach(self) -> None:
+        with self._lock:
+            self.readers += 1
+            self.detached_since = None
+
+    def detach(self) -> None:
+        with self._lock:
+            self.readers -= 1
+            if self.readers == 0:
+                self.detached_since = time.monotonic()
+
+    def detached_for(self) -> Optional[float]:
+        """Seconds since the last reader left, or None while one is attached. Readers on other workers count too."""
+        detached_since = self.detached_since
+        if detached_since is None:
+            return None
+        detached = time.monotonic() - detached_since
+        try:
+            detached = min(detached, time.time() - os.path.getmtime(self.readers_path))
+        except OSError:
+            pass
+        return detached
+
+    def pause(self) -> None:
+        """Suspends the run at its next event until `resume()`; model and tool calls in flight complete."""
+        self.paused = True
+
+    def resume(self) -> None:
+        self.paused = False
+
+    def cancel(self) -> bool:
+        """Cancels the run's task, which cancels its model request and async tools. False if it has ended."""
+        if self.closed or self._cancel is None:
+            return False
+        self._cancel()
+        return True
+
+    def discard(self) -> None:
+        for path in (self.spill_path, self.readers_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class SpilledRunEventLog:
+    """
+    A run streamed by another worker process, read from its spill file: a client's reconnect may reach any
+    worker. Only supports following the events; while it does, the run counts as attached (the reader
+    touches the run's `.readers` file), so it is not cancelled as abandoned.
+    """
+
+    def __init__(self, run_id: str, spill_dir: str = RUN_EVENT_SPILL_DIR, poll_s: float = RUN_EVENT_POLL_S):
+        self.run_id = run_id
+        self.poll_s = poll_s
+        self.spill_path = os.path.join(spill_dir, f"{run_id}.jsonl")
+        self.readers_path = os.path.join(spill_dir, f"{run_id}.readers")
+
+    def attach(self) -> None:
+        _touch(self.readers_path)
+
+    def detach(self) -> None:
+        pass
+
+    async def follow(self, after_id: int = 0, heartbeat_s: Optional[float] = None) -> AsyncIterator[Optional[Tuple[int, str]]]:
+        """Like `RunEventLog.follow`; ends when the run's log is closed, or its file is gone or stops growing."""
+        offset = 0
+        partial = b""
+        last_event = last_touch = last_growth = time.monotonic()
+        while True:
+            touch = time.monotonic() - last_touch >= 1.0
+            try:
+                chunk = await asyncio.to_thread(self._read_from, offset, touch)
+            except FileNotFoundError:  # Expired
+                return
+            now = time.monotonic()
+            if touch:
+                last_touch = now
+            if chunk:
+                offset += len(chunk)
+                last_growth = now
+                # The writer may be in the middle of a line; it is completed by a later read.
+                *lines, partial = (partial + chunk).split(b"\n")
+                for line in lines:
+                    record = json.loads(line)
+                    if record is None:
+                        return
+                    event_id, data = record
+                    if event_id > after_id:
+                        after_id = event_id
+                        last_event = now
+                        yield event_id, data
+            elif now - last_growth > RUN_EVENT_RETENTION_S:  # Its worker went away without closing the log
+                return
+            if heartbeat_s is not None and now - last_event >= heartbeat_s:
+                last_event = now
+                yield None
+            await asyncio.sleep(self.poll_s)
+
+    def _read_from(self, offset: int, touch: bool) -> bytes:
+        if touch:
+            _touch(self.readers_path)
+        with open(self.spill_path, "rb") as f:
+            f.seek(offset)
+            return f.read()
+
+
+class RunEventLogs:
+    """The event logs of the runs of this process; logs of finished runs expire after RUN_EVENT_RETENTION_S."""
+
+    def __init__(self, retention_s: float = RUN_EVENT_RETENTION_S):
+        self.retention_s = retention_s
+        self._lock = threading.Lock()
+        self._logs: Dict[str, RunEventLog] = {}
+
+    def create(self, run_id: str) -> RunEventLog:
+        self.expire()
+        log = RunEventLog(run_id)
+        with self._lock:
+            previous = self._logs.get(run_id)
+            self._logs[run_id] = log
+        if previous is not None:
+            previous.close()
+            previous.discard()
+        return log
+
+    def get(self, run_id: str) -> Optional[RunEventLog]:
+        with self._lock:
+            return self._logs.get(run_id)
+
+    def get_readable(self, run_id: str) -> Optional[Union[RunEventLog, SpilledRunEventLog]]:
+        """The log of `run_id` in this process, else that of a run of another worker; None if unknown or expired."""
+        log = self.get(run_id)
+        if log is not None or not _RUN_ID_RE.fullmatch(run_id):
+            return log
+        spilled = SpilledRunEventLog(run_id)
+        try:
+            if time.time() - os.path.getmtime(spilled.spill_path) <= self.retention_s:
+                return spilled
+        except OSError:
+            pass
+        return None
+
+    def expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                log for log in self._logs.values() if log.closed_at is not None and now - log.closed_at > self.retention_s
+            ]
+            for log in expired:
+                del self._logs[log.run_id]
+        for log in expired:
+            log.discard()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            logs = list(self._logs.values())
+        return {
+            "runs": len(logs),
+            "open": sum(not log.closed for log in logs),
+            "readers": sum(log.readers for log in logs),
+            "events": sum(log.last_id for log in logs),
+        }
+
+
+run_event_logs = RunEventLogs()
+
+
+def parse_last_event_id(value: Any) -> int:
+    try:
+        return max(0, int(value)) if value else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def format_sse(event_id: int, data: str) -> str:
+    # Multi-line data is sent as one `data:` field per line; clients join them with newlines.
+    return f"id: {event_id}\n" + "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+
+
+async def sse_stream(log: Union[RunEventLog, SpilledRunEventLog], last_event_id: int = 0) -> AsyncIterator[str]:
+    """Streams a run's events as SSE from after `last_event_id`, with heartbeats while the run is quiet."""
+    log.attach()
+    try:
+        async for event in log.follow(last_event_id, heartbeat_s=SSE_HEARTBEAT_S):
+            yield format_sse(*event) if event is not None else ": keep-alive\n\n"
+    finally:
+        log.detach()
+
+
+def start_streamed_run(
+    run_id: str,
+    agen_factory: Callable[[], AsyncIterator[Any]],
+    to_data: Optional[Callable[[Any], Optional[str]]] = None,
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+    detach_timeout_s: Optional[float] = RUN_EVENT_DETACH_TIMEOUT_S,
+) -> RunEventLog:
+    """
+    Runs `agen_factory()` as a task of its own (on `loop`, default the running loop) and appends every item,
+    converted by `to_data` if given (None skips the item), to a new event log of `run_id`. The run outlives the request that started it, so
+    a client can reconnect and resume; if nobody reads it for `detach_timeout_s`, it is cancelled. Clients
+    control the run through the log: `pause()`, `resume()`, `cancel()`.
+    """
+    log = run_event_logs.create(run_id)
+
+    async def run() -> None:
+        task = asyncio.current_task()
+
+        async def cancel_when_abandoned() -> None:
+            while True:
+                await asyncio.sleep(min(5.0, detach_timeout_s))
+                detached_for = log.detached_for()
+                if detached_for is not None and detached_for > detach_timeout_s:
+                    logger.info(f"Cancelling run {run_id}: no client for {detach_timeout_s:.0f}s.")
+                    task.cancel()
+                    return
+
+        watchdog = asyncio.create_task(cancel_when_abandoned()) if detach_timeout_s else None
+        try:
+            async for item in agen_factory():
+                data = to_data(item) if to_data is not None else item
+                if data is not None:
+                    log.append(data)
+                while log.paused:
+                    await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            log.append(dumps({"type": "status", "status": "cancelled"}))
+        except Exception as e:
+            logger.error(f"Streamed run {run_id} failed: {e}")
+            log.append(dumps({"type": "error", "detail": str(e)}))
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            log.close()
+
+    tasks: List[asyncio.Task] = []
+
+    def create_task() -> None:
+        task = loop.create_task(run())
+        # A run cancelled before it started never reaches its `finally`.
+        task.add_done_callback(lambda _: log.close())
+        tasks.append(task)
+
+    if loop is None:
+        loop = asyncio.get_running_loop()
+        create_task()
+    else:
+        loop.call_soon_threadsafe(create_task)
+    # Callbacks run in order, so the task exists by the time a cancel runs.
+    log._cancel = lambda: loop.call_soon_threadsafe(lambda: tasks[0].cancel())
+    return log
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    # A reader that drops after event 1200 of a 5000-event run and reconnects with Last-Event-ID:
+    # the replay (partly from the spill file) must contain exactly the missed events.
+    async def demo() -> None:
+        log = RunEventLog("demo", buffer_size=1000, spill_dir=tempfile.mkdtemp())
+        for i in range(5000):
+            log.append(f"chunk {i + 1}")
+        log.close()
+        first = []
+        async for event_id, data in log.follow(0):
+            first.append(event_id)
+            if event_id == 1200:
+                break
+        started = time.perf_counter()
+        resumed = [event_id async for event_id, _ in log.follow(first[-1])]
+        print(
+            f"received 1..{first[-1]}, resumed {resumed[0]}..{resumed[-1]} ({len(resumed)} events, "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms); gap-free: {first + resumed == list(range(1, 5001))}"
+        )
+        shutil.rmtree(os.path.dirname(log.spill_path))
+
+    asyncio.run(demo())
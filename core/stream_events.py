@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Content deltas are merged into one event for at most this long after the first one...
+STREAM_COALESCE_WINDOW_MS = float(os.getenv("STREAM_COALESCE_WINDOW_MS", "50"))
+# ...or until they reach this many characters.
+STREAM_COALESCE_MAX_CHARS = int(os.getenv("STREAM_COALESCE_MAX_CHARS", "4096"))
+
+_DONE = object()
+
+
+class _Raised:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def dumps(event: Any) -> str:
+    """Compact JSON of an event, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(event, default=str).decode("utf-8")
+    return json.dumps(event, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class StreamEventEncoder:
+    """
+    Turns the RunResponse / TeamRunResponse chunks of a streamed run into typed events for clients:
+
+    - `{"type": "content", "delta": str}`: text of the answer as it is generated
+    - `{"type": "tool_start", "tool_call_id", "tool_name", "tool_args"}`
+    - `{"type": "tool_end", "tool_call_id", "tool_name", "error": bool}`
+    - `{"type": "stage", "stage": str}`: another agent (workflow stage) or team took over
+    - `{"type": "task_progress", ...}`: whatever `progress()` returns, sent when it changes after a tool call
+
+    agno repeats every tool call of the run on each tool event; each call is sent once when it starts and
+    once when it ends. Tool outputs are not streamed, they can be large and are in the reports.
+    """
+
+    def __init__(self, progress: Optional[Callable[[], Dict[str, Any]]] = None):
+        self.progress = progress
+        self._stage: Optional[str] = None
+        self._started: Set[str] = set()
+        self._ended: Set[str] = set()
+        self._last_progress: Optional[Dict[str, Any]] = None
+
+    def encode(self, chunk: Any) -> List[Dict[str, Any]]:
+        events: List[Dict[str, Any]] = []
+        stage = getattr(chunk, "agent_id", None) or getattr(chunk, "team_id", None)
+        if stage and stage != self._stage:
+            self._stage = stage
+            events.append({"type": "stage", "stage": stage})
+
+        event = getattr(chunk, "event", None)
+        if event in ("ToolCallStarted", "ToolCallCompleted"):
+            for tool in getattr(chunk, "tools", None) or []:
+                call_id = tool.get("tool_call_id")
+                if call_id is None:
+                    continue
+                if call_id not in self._started:
+                    self._started.add(call_id)
+                    events.append(
+                        {
+                            "type": "tool_start",
+                            "tool_call_id": call_id,
+                            "tool_name": tool.get("tool_name"),
+                            "tool_args": tool.get("tool_args"),
+                        }
+                    )
+                if call_id not in self._ended and ("content" in tool or tool.get("tool_call_error")):
+                    self._ended.add(call_id)
+                    events.append(
+                        {
+                            "type": "tool_end",
+                            "tool_call_id": call_id,
+                            "tool_name": tool.get("tool_name"),
+                            "error": bool(tool.get("tool_call_error")),
+                        }
+                    )
+            if event == "ToolCallCompleted" and self.progress is not None:
+                progress = self.progress()
+                if progress != self._last_progress:
+                    self._last_progress = progress
+                    events.append({"type": "task_progress", **progress})
+        elif event in (None, "RunResponse"):
+            # RunStarted / RunCompleted repeat text the client has (the full answer), or carry none.
+            content = getattr(chunk, "content", None)
+            if content:
+                events.append({"type": "content", "delta": content if isinstance(content, str) else str(content)})
+        return events
+
+
+async def coalesce_events(
+    events: AsyncIterator[Dict[str, Any]],
+    window_ms: float = STREAM_COALESCE_WINDOW_MS,
+    max_chars: int = STREAM_COALESCE_MAX_CHARS,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Merges consecutive content deltas of `events` into one event per time window or size limit. Other
+    events pass through at once, in order, after the content before them. A model streaming 50 tokens per
+    second becomes about 20 events per second at the 50 ms default, without a visible delay.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+    async def pump() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(_Raised(e))
+        else:
+            await queue.put(_DONE)
+
+    producer = asyncio.create_task(pump())
+    pending: List[str] = []
+    pending_chars = 0
+    deadline = 0.0
+    try:
+        while True:
+            if pending:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    item = None
+            else:
+                item = await queue.get()
+
+            if item is not None and not isinstance(item, _Raised) and item is not _DONE and item.get("type") == "content":
+                if not pending:
+                    deadline = time.monotonic() + window_ms / 1000
+                pending.append(item["delta"])
+                pending_chars += len(item["delta"])
+                if pending_chars < max_chars and time.monotonic() < deadline:
+                    continue
+                item = None
+            if pending:
+                yield {"type": "content", "delta": "".join(pending)}
+                pending, pending_chars = [], 0
+            if item is _DONE:
+                return
+            if isinstance(item, _Raised):
+                raise item.error
+            if item is not None:
+                yield item
+    finally:
+        producer.cancel()
+
+
+async def stream_events(
+    chunks: AsyncIterator[Any],
+    progress: Optional[Callable[[], Dict[str, Any]]] = None,
+    window_ms: float = STREAM_COALESCE_WINDOW_MS,
+) -> AsyncIterator[Dict[str, Any]]:
+    """The typed, coalesced events of a stream of agno response chunks."""
+    encoder = StreamEventEncoder(progress=progress)
+
+    async def encoded() -> AsyncIterator[Dict[str, Any]]:
+        async for chunk in chunks:
+            for event in encoder.encode(chunk):
+                yield event
+
+    if window_ms <= 0:
+        async for event in encoded():
+            yield event
+        return
+    async for event in coalesce_events(encoded(), window_ms=window_ms):
+        yield event
+
+
+if __name__ == "__main__":
+    from agno.run.response import RunResponse
+
+    # 2000 tokens streamed at ~1 ms intervals with two tool calls in between: events and serialization
+    # time per chunk vs. coalesced, with the stdlib encoder vs. orjson.
+    async def chunks() -> AsyncIterator[Any]:
+        tool = {"tool_call_id": "c1", "tool_name": "read_file", "tool_args": {"file_name": "Controller.java"}}
+        for i in range(2000):
+            if i == 1000:
+                yield RunResponse(event="ToolCallStarted", agent_id="auditor", tools=[tool])
+                yield RunResponse(event="ToolCallCompleted", agent_id="auditor", tools=[{**tool, "content": "x"}])
+            yield RunResponse(event="RunResponse", agent_id="auditor", content=f"tok{i} ")
+            await asyncio.sleep(0.001)
+
+    async def demo(window_ms: float) -> None:
+        started = time.perf_counter()
+        events = [event async for event in stream_events(chunks(), window_ms=window_ms)]
+        elapsed = time.perf_counter() - started
+        payload = [dumps(e) for e in events]
+        text = "".join(e["delta"] for e in events if e["type"] == "content")
+        print(
+            f"window {window_ms:>3.0f} ms: {len(events):>4} events in {elapsed:.2f}s "
+            f"({len(events) / elapsed:.0f}/s), {sum(map(len, payload))} bytes, "
+            f"types {sorted({e['type'] for e in events})}, text intact: {text == ''.join(f'tok{i} ' for i in range(2000))}"
+        )
+
+    asyncio.run(demo(0))
+    asyncio.run(demo(STREAM_COALESCE_WINDOW_MS))
+
+    sample = {"type": "content", "delta": "The handler passes `input` to Runtime.exec() " * 4}
+    for name, encode in (("json", lambda e: json.dumps(e)), ("dumps", dumps)):
+        started = time.perf_counter()
+        for _ in range(100_000):
+            encode(sample)
+        print(f"{name:>5}: {(time.perf_counter() - started) * 10:.2f} us per event (orjson installed: {orjson is not None})")
@@ -0,0 +1,212 @@
+import asyncio
+import collections.abc
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from inspect import isasyncgenfunction, iscoroutine, iscoroutinefunction
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple, Union
+
+from agno.exceptions import AgentRunException
+from agno.models.response import ModelResponse, ModelResponseEvent
+from agno.tools.function import FunctionCall
+from agno.utils.timer import Timer
+
+# Threads that run the synchronous tools (file reads, report reads, ...) of all agents.
+TOOL_THREAD_POOL_SIZE = int(os.getenv("TOOL_THREAD_POOL_SIZE", "16"))
+# Tools that change files or shared state run alone, in order, and split a turn's calls into concurrent batches.
+SERIAL_TOOL_NAMES = {
+    "save_file",
+    "save_report_to_repository",
+    "update_session_state",
+    "load_audit_plan",
+    "complete_audit_task",
+    "transfer_task_to_member",
+    "atransfer_task_to_member",
+    "set_team_context",
+} | {name.strip() for name in os.getenv("SERIAL_TOOL_NAMES", "").split(",") if name.strip()}
+
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_THREAD_POOL_SIZE, thread_name_prefix="tool")
+
+
+def tool_call_batches(function_calls: List[FunctionCall]) -> List[List[FunctionCall]]:
+    """
+    Splits the calls of one model turn into batches that can run concurrently: consecutive independent calls
+    share a batch, every serial tool gets a batch of its own.
+    """
+    batches: List[List[FunctionCall]] = []
+    for fc in function_calls:
+        if fc.function.name in SERIAL_TOOL_NAMES or not batches or batches[-1][0].function.name in SERIAL_TOOL_NAMES:
+            batches.append([fc])
+        else:
+            batches[-1].append(fc)
+    return batches
+
+
+def _is_async_call(fc: FunctionCall) -> bool:
+    entrypoint = fc.function.entrypoint
+    return (
+        iscoroutinefunction(entrypoint)
+        or isasyncgenfunction(entrypoint)
+        or iscoroutine(entrypoint)
+        or (fc.function.tool_hooks is not None and any(iscoroutinefunction(f) for f in fc.function.tool_hooks))
+    )
+
+
+def _execute(fc: FunctionCall) -> Tuple[Union[bool, AgentRunException], Timer]:
+    timer = Timer()
+    timer.start()
+    try:
+        success: Union[bool, AgentRunException] = fc.execute()
+    except AgentRunException as e:
+        success = e
+    timer.stop()
+    return success, timer
+
+
+class ConcurrentToolCallsMixin:
+    """
+    Runs the independent tool calls of one model turn concurrently instead of one after another, so a turn
+    that reads five files takes about as long as the slowest read. Synchronous tools run in `tool_executor`,
+    async tools (e.g. `AsyncShellTools`, which uses async subprocesses) on the event loop. Results are
+    returned to the model in the order it made the calls; tools in SERIAL_TOOL_NAMES never overlap with others.
+    """
+
+    def run_function_calls(
+        self,
+        function_calls: List[FunctionCall],
+        function_call_results: List[Any],
+        tool_call_limit: Optional[int] = None,
+    ) -> Iterator[Any]:
+        if self._function_call_stack is None:
+            self._function_call_stack = []
+        for batch in tool_call_batches(function_calls):
+            if tool_call_limit:
+                remaining = tool_call_limit - len(self._function_call_stack)
+                if remaining <= 0:
+                    break
+                batch = batch[:remaining]
+            if len(batch) == 1:
+                yield from super().run_function_calls(batch, function_call_results, tool_call_limit=tool_call_limit)
+            else:
+                yield from self._run_batch(batch, function_call_results, tool_call_limit)
+
+    def _run_batch(self, batch: List[FunctionCall], function_call_results: List[Any], tool_call_limit: Optional[int]):
+        for fc in batch:
+            yield ModelResponse(
+                content=fc.get_call_str(),
+                tool_calls=[
+                    {
+                        "role": self.tool_message_role,
+                        "tool_call_id": fc.call_id,
+                        "tool_name": fc.function.name,
+                        "tool_args": fc.arguments,
+                    }
+                ],
+                event=ModelResponseEvent.tool_call_started.value,
+            )
+        # Each call runs in a copy of this context, so tools see the run's rate limit and metrics scopes.
+        futures = [tool_executor.submit(contextvars.copy_context().run, _execute, fc) for fc in batch]
+
+        additional_messages: List[Any] = []
+        for fc, future in zip(batch, futures):
+            success, timer = future.result()
+            if isinstance(success, AgentRunException):
+                self._handle_agent_exception(success, additional_messages)
+                success = False
+
+            output = ""
+            if isinstance(fc.result, collections.abc.Iterator):
+                for item in fc.result:
+                    output += str(item)
+                    if fc.function.show_result:
+                        yield ModelResponse(content=str(item))
+            else:
+                output = str(fc.result)
+                if fc.function.show_result:
+                    yield ModelResponse(content=output)
+
+            result = self._create_function_call_result(fc, success=success, output=output, timer=timer)
+            yield ModelResponse(
+                content=f"{fc.get_call_str()} completed in {timer.elapsed:.4f}s.",
+                tool_calls=[result.to_function_call_dict()],
+                event=ModelResponseEvent.tool_call_completed.value,
+            )
+            function_call_results.append(result)
+            self._function_call_stack.append(fc)
+            if tool_call_limit and len(self._function_call_stack) >= tool_call_limit:
+                self._tool_choice = "none"
+                break
+        if additional_messages:
+            function_call_results.extend(additional_messages)
+
+    async def arun_function_calls(
+        self,
+        function_calls: List[FunctionCall],
+        function_call_results: List[Any],
+        tool_call_limit: Optional[int] = None,
+    ) -> AsyncIterator[Any]:
+        # agno runs all calls of a turn at once; serial tools must not overlap with the others.
+        if self._function_call_stack is None:
+            self._function_call_stack = []
+        for batch in tool_call_batches(function_calls):
+            if tool_call_limit and len(self._function_call_stack) >= tool_call_limit:
+                break
+            async for response in super().arun_function_calls(batch, function_call_results, tool_call_limit=tool_call_limit):
+                yield response
+
+    async def _arun_function_call(self, function_call: FunctionCall):
+        if _is_async_call(function_call):
+            return await super()._arun_function_call(function_call)
+        # Sync tools run in the bounded tool pool rather than asyncio's default executor, which is shared with
+        # everything else in the process that uses `asyncio.to_thread`.
+        loop = asyncio.get_running_loop()
+        success, timer = await loop.run_in_executor(
+            tool_executor, functools.partial(contextvars.copy_context().run, _execute, function_call)
+        )
+        return success, timer, function_call
+
+
+if __name__ == "__main__":
+    import time
+
+    from agno.agent import Agent
+    from agno.tools import tool
+
+    from core.mock_model import MockChat
+    from core.model_registry import apply_model_mixins
+    from tools.shell_tools import AsyncShellTools
+
+    # One model turn with five file reads (200 ms each) and three shell commands (`sleep 0.3`),
+    # run sequentially by agno's sync loop vs. concurrently.
+    @tool
+    def read_file(file_name: str) -> str:
+        """Reads a file."""
+        time.sleep(0.2)
+        return f"contents of {file_name}"
+
+    reads = [{"name": "read_file", "arguments": {"file_name": f"Controller{i}.java"}} for i in range(5)]
+    shells = [{"name": "run_shell_command", "arguments": {"args": ["sleep", "0.3"]}} for _ in range(3)]
+
+    def script(calls: List[dict]) -> dict:
+        return {"turns": [{"content": "", "tool_calls": calls}, {"content": "Done.", "repeat": True}]}
+
+    def timed_run(model: Any, tools: List[Any], use_async: bool = False) -> Tuple[float, List[str]]:
+        agent = Agent(model=model, tools=tools)
+        started = time.perf_counter()
+        if use_async:
+            asyncio.run(agent.arun("Audit"))
+        else:
+            agent.run("Audit")
+        order = [t["tool_args"].get("file_name") or " ".join(t["tool_args"]["args"]) for t in agent.run_response.tools]
+        return time.perf_counter() - started, order
+
+    sequential, _ = timed_run(MockChat(id="mock/demo", script=script(reads)), [read_file])
+    concurrent, order = timed_run(apply_model_mixins(MockChat(id="mock/demo", script=script(reads)), ConcurrentToolCallsMixin), [read_file])
+    print(f"5 file reads, sync run:   sequential {sequential:.2f}s, concurrent {concurrent:.2f}s, results in order: {order}")
+    shell, order = timed_run(
+        apply_model_mixins(MockChat(id="mock/demo", script=script(shells + reads[:2])), ConcurrentToolCallsMixin),
+        [AsyncShellTools(), read_file],
+        use_async=True,
+    )
+    print(f"3 shell commands + 2 reads, async run: {shell:.2f}s, results in order: {order}")
@@ -0,0 +1,30 @@
+import os
+from typing import List
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Engine, create_engine
+
+from db.tables import Base
+
+
+def create_engine_for_url(db_url: str) -> Engine:
+    """
+    Engine for the auxiliary stores (session state journal, rate limits, model call metrics), which use the
+    Postgres database in deployments and a local SQLite file otherwise.
+    """
+    if not db_url.startswith("sqlite"):
+        return create_engine(db_url, pool_pre_ping=True)
+    db_file = db_url.split(":///", 1)[-1]
+    if db_file and db_file != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+    # SQLite has no `public` schema; map the tables' schema away.
+    return create_engine(db_url).execution_options(schema_translate_map={"public": None})
+
+
+def create_local_tables(engine: Engine, tables: List[Table]) -> None:
+    """
+    Creates the tables in a local SQLite file. Postgres tables are created and upgraded by the Alembic
+    revisions in db/migrations (see db/README.md), never at runtime.
+    """
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine, tables=tables)
@@ -0,0 +1,55 @@
+"""Add audit jobs
+
+Revision ID: 1016cd4d9d7f
+Revises: a58729d3f490
+Create Date: 2026-10-19 10:02:18.663140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1016cd4d9d7f'
+down_revision = 'a58729d3f490'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('audit_jobs', schema='public'):
+        # Created at runtime by earlier builds, without the columns that let API processes share the queue.
+        existing = {c['name'] for c in inspector.get_columns('audit_jobs', schema='public')}
+        if 'owner' not in existing:
+            op.add_column('audit_jobs', sa.Column('owner', sa.String(length=255), nullable=True), schema='public')
+        if 'heartbeat_at' not in existing:
+            op.add_column('audit_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True), schema='public')
+        if 'cancel_requested' not in existing:
+            op.add_column('audit_jobs', sa.Column('cancel_requested', sa.Boolean(), server_default=sa.false(), nullable=False), schema='public')
+        return
+    op.create_table('audit_jobs',
+    sa.Column('job_id', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=32), nullable=False),
+    sa.Column('owner', sa.String(length=255), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('cancel_requested', sa.Boolean(), server_default=sa.false(), nullable=False),
+    sa.Column('project_path', sa.Text(), nullable=False),
+    sa.Column('initial_message', sa.Text(), nullable=False),
+    sa.Column('model_id', sa.String(length=255), nullable=True),
+    sa.Column('team_leader_model_id', sa.String(length=255), nullable=True),
+    sa.Column('session_id', sa.String(length=255), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('job_id'),
+    schema='public'
+    )
+    op.create_index('ix_audit_jobs_status', 'audit_jobs', ['status'], unique=False, schema='public')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audit_jobs_status', table_name='audit_jobs', schema='public')
+    op.drop_table('audit_jobs', schema='public')
@@ -0,0 +1,34 @@
+"""Add model rate limit buckets
+
+Revision ID: 4d9c99c4b95d
+Revises: c546d218c032
+Create Date: 2026-10-19 09:31:07.552871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d9c99c4b95d'
+down_revision = 'c546d218c032'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Earlier builds created the table at runtime; keep it.
+    if not sa.inspect(op.get_bind()).has_table('model_rate_limit_buckets', schema='public'):
+        op.create_table('model_rate_limit_buckets',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('request_tokens', sa.Float(), nullable=False),
+        sa.Column('token_tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.Column('blocked_until', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+        schema='public'
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('model_rate_limit_buckets', schema='public')
@@ -0,0 +1,47 @@
+"""Add model calls
+
+Revision ID: a58729d3f490
+Revises: 4d9c99c4b95d
+Create Date: 2026-10-19 09:44:52.104377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a58729d3f490'
+down_revision = '4d9c99c4b95d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Earlier builds created the table at runtime; keep it.
+    if not sa.inspect(op.get_bind()).has_table('model_calls', schema='public'):
+        op.create_table('model_calls',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('run_id', sa.String(length=255), nullable=True),
+        sa.Column('session_id', sa.String(length=255), nullable=True),
+        sa.Column('stage', sa.String(length=255), nullable=True),
+        sa.Column('task', sa.Text(), nullable=True),
+        sa.Column('model_id', sa.String(length=255), nullable=False),
+        sa.Column('provider', sa.String(length=64), nullable=True),
+        sa.Column('stream', sa.Boolean(), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False),
+        sa.Column('cached_tokens', sa.Integer(), nullable=False),
+        sa.Column('tool_calls', sa.Integer(), nullable=False),
+        sa.Column('ttft_ms', sa.Float(), nullable=True),
+        sa.Column('latency_ms', sa.Float(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema='public'
+        )
+        op.create_index('ix_model_calls_run_id', 'model_calls', ['run_id'], unique=False, schema='public')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_model_calls_run_id', table_name='model_calls', schema='public')
+    op.drop_table('model_calls', schema='public')
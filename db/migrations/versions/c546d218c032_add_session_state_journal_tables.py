@@ -0,0 +1,50 @@
+"""Add session state journal tables
+
+Revision ID: c546d218c032
+Revises: 
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c546d218c032'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Earlier builds created the tables at runtime; keep those.
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('session_state_patches', schema='public'):
+        op.create_table('session_state_patches',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('session_id', sa.String(length=255), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('ops', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema='public'
+        )
+        op.create_index('ix_session_state_patches_session_seq', 'session_state_patches', ['session_id', 'seq'], unique=True, schema='public')
+    if not inspector.has_table('session_state_snapshots', schema='public'):
+        op.create_table('session_state_snapshots',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('session_id', sa.String(length=255), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('state', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema='public'
+        )
+        op.create_index('ix_session_state_snapshots_session_seq', 'session_state_snapshots', ['session_id', 'seq'], unique=True, schema='public')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_session_state_snapshots_session_seq', table_name='session_state_snapshots', schema='public')
+    op.drop_table('session_state_snapshots', schema='public')
+    op.drop_index('ix_session_state_patches_session_seq', table_name='session_state_patches', schema='public')
+    op.drop_table('session_state_patches', schema='public')
@@ -0,0 +1,130 @@
+import atexit
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, insert, select
+
+from db.engine import create_engine_for_url, create_local_tables
+from db.tables import ModelCall
+from utils.log import logger
+
+# Postgres URL in deployments; a local SQLite file otherwise. Set to an empty string to disable recording.
+MODEL_CALLS_DB_URL = os.getenv("MODEL_CALLS_DB_URL", "sqlite:////app/shared_reports/.state/model_calls.db")
+MODEL_CALLS_QUEUE_SIZE = int(os.getenv("MODEL_CALLS_QUEUE_SIZE", "10000"))
+_BATCH_SIZE = 200
+_FLUSH_INTERVAL_S = 1.0
+
+_ROLLUP_COLUMNS = {"stage": ModelCall.stage, "task": ModelCall.task, "model_id": ModelCall.model_id}
+
+
+class ModelCallStore:
+    """
+    Per-call model metrics in the `model_calls` table.
+
+    `record` only enqueues: a background thread writes batches, so model calls never wait on the database.
+    When the queue is full (database down or too slow) records are dropped with a warning rather than
+    blocking or growing without bound.
+    """
+
+    def __init__(self, db_url: str = MODEL_CALLS_DB_URL, queue_size: int = MODEL_CALLS_QUEUE_SIZE):
+        self.engine = create_engine_for_url(db_url)
+        create_local_tables(self.engine, [ModelCall.__table__])
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._dropped = 0
+        self._writer = threading.Thread(target=self._write_loop, name="model-call-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def record(self, call: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(call)
+        except queue.Full:
+            self._dropped += 1
+            if self._dropped % 1000 == 1:
+                logger.warning(f"Model call metrics queue is full; {self._dropped} records dropped so far.")
+
+    def _write_loop(self) -> None:
+        while True:
+            batch: List[Dict[str, Any]] = []
+            flush_events: List[threading.Event] = []
+            try:
+                item = self._queue.get(timeout=_FLUSH_INTERVAL_S)
+                while True:
+                    if isinstance(item, threading.Event):
+                        flush_events.append(item)
+                    else:
+                        batch.append(item)
+                    if len(batch) >= _BATCH_SIZE:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    with self.engine.begin() as conn:
+                        conn.execute(insert(ModelCall), batch)
+                except Exception as e:
+                    logger.warning(f"Could not write {len(batch)} model call metrics: {e}")
+            for event in flush_events:
+                event.set()
+
+    def flush(self, timeout_s: float = 5.0) -> None:
+        """Waits until everything recorded so far is written."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout_s)
+        except queue.Full:
+            return
+        done.wait(timeout_s)
+
+    def calls(self, run_id: str) -> List[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(*ModelCall.__table__.c).where(ModelCall.run_id == run_id).order_by(ModelCall.id))
+            return [dict(row._mapping) for row in rows]
+
+    def rollup(self, run_id: str, by: str = "stage") -> List[Dict[str, Any]]:
+        """Totals of one run per `stage`, `task` or `model_id`."""
+        column = _ROLLUP_COLUMNS[by]
+        query = (
+            select(
+                column.label(by),
+                func.count().label("calls"),
+                func.sum(ModelCall.prompt_tokens).label("prompt_tokens"),
+                func.sum(ModelCall.completion_tokens).label("completion_tokens"),
+                func.sum(ModelCall.cached_tokens).label("cached_tokens"),
+                func.sum(ModelCall.tool_calls).label("tool_calls"),
+                func.sum(ModelCall.latency_ms).label("total_latency_ms"),
+                func.avg(ModelCall.latency_ms).label("avg_latency_ms"),
+                func.max(ModelCall.latency_ms).label("max_latency_ms"),
+                func.avg(ModelCall.ttft_ms).label("avg_ttft_ms"),
+                func.sum(case((ModelCall.error.is_not(None), 1), else_=0)).label("errors"),
+            )
+            .where(ModelCall.run_id == run_id)
+            .group_by(column)
+            .order_by(func.min(ModelCall.id))
+        )
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(query)]
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "dropped": self._dropped}
+
+
+_model_call_store: Optional[ModelCallStore] = None
+_model_call_store_failed = False
+_model_call_store_lock = threading.Lock()
+
+
+def get_model_call_store() -> Optional[ModelCallStore]:
+    """Returns the process-wide store, or None if MODEL_CALLS_DB_URL is empty or the database is unusable."""
+    global _model_call_store, _model_call_store_failed
+    with _model_call_store_lock:
+        if _model_call_store is None and MODEL_CALLS_DB_URL and not _model_call_store_failed:
+            try:
+                _model_call_store = ModelCallStore()
+            except Exception as e:
+                _model_call_store_failed = True
+                logger.warning(f"Model call metrics disabled, could not open {MODEL_CALLS_DB_URL}: {e}")
+        return _model_call_store
@@ -0,0 +1,218 @@
+import atexit
+import copy
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from db.engine import create_engine_for_url, create_local_tables
+from db.tables import SessionStatePatch, SessionStateSnapshot
+from tools.session_state_tools import apply_state_patch
+from utils.log import logger
+
+# Postgres URL (e.g. db.session.db_url) in deployments; a local SQLite file otherwise.
+SESSION_STATE_DB_URL = os.getenv("SESSION_STATE_DB_URL", "sqlite:////app/shared_reports/.state/session_state.db")
+
+
+class SessionStateJournal:
+    """
+    Durable session_state as an append-only log of patches with periodic snapshots.
+
+    Every committed SessionStateStore transaction is stored as one row of JSON Patch operations, so the
+    write volume follows the size of the change rather than of the state. Every `snapshot_every` patches the
+    full state is written as a snapshot, and patches older than the oldest of the last `keep_snapshots`
+    snapshots are compacted away. Reads never touch the database: the running session keeps using its
+    in-memory dict, and the journal is only read to restore a session or to reconstruct it at a past point.
+
+    `record` only enqueues: a background thread writes in order, so the session_state tools (which run on the
+    event loop) never wait on a database commit. Reads first wait for the queued writes.
+    """
+
+    def __init__(self, db_url: str = SESSION_STATE_DB_URL, snapshot_every: int = 50, keep_snapshots: int = 3):
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = keep_snapshots
+        self.engine = create_engine_for_url(db_url)
+        self._Session = sessionmaker(bind=self.engine, autoflush=False)
+        self._lock = threading.Lock()
+        self._last_seq: Dict[str, int] = {}
+        # Patches recorded per session by this process, to decide when a snapshot is due.
+        self._recorded: Dict[str, int] = {}
+        create_local_tables(self.engine, [SessionStatePatch.__table__, SessionStateSnapshot.__table__])
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="session-state-journal-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _next_seq(self, db: Session, session_id: str) -> int:
+        if session_id not in self._last_seq:
+            last = db.scalar(select(func.max(SessionStatePatch.seq)).where(SessionStatePatch.session_id == session_id))
+            self._last_seq[session_id] = last or 0
+        self._last_seq[session_id] += 1
+        return self._last_seq[session_id]
+
+    def record(self, session_id: str, patch: List[Dict[str, Any]], state: Dict[str, Any]) -> None:
+        """
+        Queues one committed patch for writing. `state` is the state after the patch; it is snapshotted with
+        the first patch of the session in this process (the base to replay onto) and every `snapshot_every`.
+        """
+        if not patch:
+            return
+        with self._lock:
+            recorded = self._recorded[session_id] = self._recorded.get(session_id, 0) + 1
+        # Copied now: the session keeps changing its state while the write is queued.
+        snapshot = copy.deepcopy(state) if recorded == 1 or recorded % self.snapshot_every == 0 else None
+        self._queue.put((session_id, copy.deepcopy(patch), snapshot))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            session_id, patch, snapshot = item
+            try:
+                self._write(session_id, patch, snapshot)
+            except Exception as e:
+                # The in-memory state stays authoritative for the running session.
+                logger.warning(f"Could not persist session_state patch of '{session_id}': {e}")
+
+    def _write(self, session_id: str, patch: List[Dict[str, Any]], snapshot: Optional[Dict[str, Any]]) -> int:
+        with self._Session() as db:
+            seq = self._next_seq(db, session_id)
+            db.add(SessionStatePatch(session_id=session_id, seq=seq, ops=patch))
+            if snapshot is not None:
+                self._snapshot(db, session_id, seq, snapshot)
+            try:
+                db.commit()
+            except Exception:
+                self._last_seq.pop(session_id, None)
+                raise
+        return seq
+
+    def flush(self, timeout_s: float = 5.0) -> None:
+        """Waits until every patch recorded so far is written."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout_s)
+
+    def _snapshot(self, db: Session, session_id: str, seq: int, state: Dict[str, Any]) -> None:
+        db.add(SessionStateSnapshot(session_id=session_id, seq=seq, state=state))
+        kept = db.scalars(
+            select(SessionStateSnapshot.seq)
+            .where(SessionStateSnapshot.session_id == session_id, SessionStateSnapshot.seq < seq)
+            .order_by(SessionStateSnapshot.seq.desc())
+            .limit(self.keep_snapshots - 1)
+        ).all()
+        oldest_kept = min(kept + [seq])
+        db.execute(
+            delete(SessionStateSnapshot).where(
+                SessionStateSnapshot.session_id == session_id, SessionStateSnapshot.seq < oldest_kept
+            )
+        )
+        db.execute(
+            delete(SessionStatePatch).where(SessionStatePatch.session_id == session_id, SessionStatePatch.seq <= oldest_kept)
+        )
+        logger.debug(f"Session state snapshot for '{session_id}' at seq {seq}; history kept from seq {oldest_kept}.")
+
+    def state_at(
+        self, session_id: str, seq: Optional[int] = None, at: Optional[datetime] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Reconstructs the state after patch `seq` (or as of time `at`; latest if neither is given) from the
+        closest earlier snapshot. Returns None if the session is unknown or the point was compacted away.
+        """
+        self.flush()
+        with self._Session() as db:
+            if at is not None:
+                seq = db.scalar(
+                    select(func.max(SessionStatePatch.seq)).where(
+                        SessionStatePatch.session_id == session_id, SessionStatePatch.created_at <= at
+                    )
+                )
+                if seq is None:
+                    return None
+            snapshot_query = select(SessionStateSnapshot).where(SessionStateSnapshot.session_id == session_id)
+            if seq is not None:
+                snapshot_query = snapshot_query.where(SessionStateSnapshot.seq <= seq)
+            snapshot = db.scalars(snapshot_query.order_by(SessionStateSnapshot.seq.desc()).limit(1)).first()
+            if snapshot is None:
+                return None
+
+            patch_query = select(SessionStatePatch).where(
+                SessionStatePatch.session_id == session_id, SessionStatePatch.seq > snapshot.seq
+            )
+            if seq is not None:
+                patch_query = patch_query.where(SessionStatePatch.seq <= seq)
+            state = copy.deepcopy(snapshot.state)
+            for row in db.scalars(patch_query.order_by(SessionStatePatch.seq)):
+                apply_state_patch(state, row.ops)
+            return state
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the latest persisted state of a session, e.g. to restore it after a restart."""
+        return self.state_at(session_id)
+
+    def history(self, session_id: str) -> List[Dict[str, Any]]:
+        """Lists the retained patches of a session, oldest first, for debugging."""
+        self.flush()
+        with self._Session() as db:
+            rows = db.scalars(
+                select(SessionStatePatch).where(SessionStatePatch.session_id == session_id).order_by(SessionStatePatch.seq)
+            )
+            return [{"seq": r.seq, "created_at": r.created_at, "ops": r.ops} for r in rows]
+
+
+_journals: Dict[str, SessionStateJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_session_state_journal(db_url: str = SESSION_STATE_DB_URL) -> SessionStateJournal:
+    """The process-wide journal of a database: teams and jobs share its engine, connection pool and writer."""
+    with _journals_lock:
+        journal = _journals.get(db_url)
+        if journal is None:
+            journal = _journals[db_url] = SessionStateJournal(db_url)
+        return journal
+
+
+if __name__ == "__main__":
+    import json
+    import tempfile
+
+    from tools.session_state_tools import SessionStateStore
+
+    # Records 200 updates of a growing state and compares bytes written as patches vs. full snapshots.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal = SessionStateJournal(f"sqlite:///{tmp_dir}/state.db", snapshot_every=50)
+        state: Dict[str, Any] = {
+            "audit_plan_items": [
+                {"raw_task_line": f"- [ ] Task {i}", "description": f"Task {i}", "status": "pending"} for i in range(20)
+            ],
+            "current_audit_item_index": 0,
+            "aggregated_findings": "",
+        }
+        patch_bytes = snapshot_bytes = 0
+
+        def on_commit(patch: List[Dict[str, Any]], new_state: Dict[str, Any]) -> None:
+            global patch_bytes, snapshot_bytes
+            patch_bytes += len(json.dumps(patch))
+            snapshot_bytes += len(json.dumps(new_state))
+            journal.record("demo", patch, new_state)
+
+        store = SessionStateStore(state, on_commit=on_commit)
+        for i in range(200):
+            store.transaction(
+                [
+                    {"op": "set", "path": f"audit_plan_items[{i % 20}].status", "value": "completed"},
+                    {"op": "set", "path": "aggregated_findings", "value": state["aggregated_findings"] + f"\n## Task {i}\n" + "x" * 400},
+                    {"op": "increment", "path": "current_audit_item_index", "value": 1},
+                ]
+            )
+        print(f"Bytes as patches: {patch_bytes}, as full snapshots: {snapshot_bytes}")
+        print(f"Latest state restored correctly: {journal.load('demo') == state}")
+        print(f"State at seq 120: index={journal.state_at('demo', seq=120)['current_audit_item_index']}")
+        print(f"State at seq 10 (compacted): {journal.state_at('demo', seq=10)}")
@@ -1 +1,5 @@
 from db.tables.base import Base
+from db.tables.session_state import SessionStatePatch, SessionStateSnapshot
+from db.tables.rate_limit import ModelRateLimitBucket
+from db.tables.model_calls import ModelCall
+from db.tables.audit_jobs import AuditJob
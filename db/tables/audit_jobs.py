@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Boolean, DateTime, Index, String, Text, false, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.tables.base import Base
+
+
+class AuditJob(Base):
+    """A background security audit: what to audit, where it runs (session) and how it ended."""
+
+    __tablename__ = "audit_jobs"
+    __table_args__ = (Index("ix_audit_jobs_status", "status"),)
+
+    job_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # queued, running, succeeded, failed, cancelled or interrupted (the process stopped while it ran)
+    status: Mapped[str] = mapped_column(String(32), nullable=False)
+    # The API process running the job, and when it last reported that the job is alive.
+    owner: Mapped[Optional[str]] = mapped_column(String(255))
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Set by a cancel request; the owner stops the job at its next heartbeat.
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default=false())
+    project_path: Mapped[str] = mapped_column(Text, nullable=False)
+    initial_message: Mapped[str] = mapped_column(Text, nullable=False)
+    model_id: Mapped[Optional[str]] = mapped_column(String(255))
+    team_leader_model_id: Mapped[Optional[str]] = mapped_column(String(255))
+    # The team session: findings, session_state and model call metrics of the audit are recorded under it.
+    session_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    result: Mapped[Optional[str]] = mapped_column(Text)
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,17 @@
+from sqlalchemy import Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.tables.base import Base
+
+
+class ModelRateLimitBucket(Base):
+    """Shared token-bucket state of one provider/model, so limits hold across API and queue workers."""
+
+    __tablename__ = "model_rate_limit_buckets"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    token_tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
+    # Set after a 429: nobody sends to this provider/model before this time (epoch seconds).
+    blocked_until: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
@@ -0,0 +1,37 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import JSON, BigInteger, DateTime, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.tables.base import Base
+
+# JSONB on Postgres; plain JSON on SQLite (local runs without a database server).
+JsonDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
+class SessionStatePatch(Base):
+    """One committed session_state transaction, stored as a list of JSON-Patch style operations."""
+
+    __tablename__ = "session_state_patches"
+    __table_args__ = (Index("ix_session_state_patches_session_seq", "session_id", "seq", unique=True),)
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    ops: Mapped[List[Dict[str, Any]]] = mapped_column(JsonDocument, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class SessionStateSnapshot(Base):
+    """The full session_state after patch `seq` was applied; replay starts from the latest snapshot."""
+
+    __tablename__ = "session_state_snapshots"
+    __table_args__ = (Index("ix_session_state_snapshots_session_seq", "session_id", "seq", unique=True),)
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    state: Mapped[Dict[str, Any]] = mapped_column(JsonDocument, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,35 @@
+from tools.report_search_tools import ReportSearchIndex
+
+
+def test_search_ranks_best_bm25_match_first(tmp_path):
+    index = ReportSearchIndex(db_path=str(tmp_path / "reports.db"))
+    # The weak match's snippet sorts first ('aaa' < '…'), so ordering by the snippet column would rank it first.
+    index.index_document(
+        doc_key="report:weak",
+        kind="report",
+        title="DeepDiveReport_Task_1.md",
+        body="aaa: a sqlinjection note",
+    )
+    index.index_document(
+        doc_key="report:strong",
+        kind="report",
+        title="sqlinjection in mall-admin",
+        body="Order search of mall-admin. " * 5 + "sqlinjection in keyword, sqlinjection in sort, sqlinjection in page",
+    )
+
+    hits = index.search("sqlinjection")
+
+    assert [hit.doc_key for hit in hits] == ["report:strong", "report:weak"]
+    assert hits[0].score > hits[1].score
+
+
+def test_only_deep_dive_reports_get_a_task_tag(tmp_path):
+    index = ReportSearchIndex(db_path=str(tmp_path / "reports.db"))
+    tags = {"run_id": "run-1", "project": "/data/mall", "task_id": "ITEM-003"}
+    index.index_report("DeepDiveReport_Task_3.md", "sqlinjection", **tags)
+    index.index_report("AttackSurfaceInvestigationPlan_mall.md", "sqlinjection", **tags)
+
+    hits = {hit.title: hit for hit in index.search("sqlinjection", project="/data/mall")}
+
+    assert hits["DeepDiveReport_Task_3.md"].task_id == "ITEM-003"
+    assert hits["AttackSurfaceInvestigationPlan_mall.md"].task_id is None
@@ -0,0 +1,405 @@
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
+
+from agno.agent import Agent
+from agno.tools import Function, tool
+from pydantic import BaseModel, Field, ValidationError
+
+from tools.report_repository_tools import SHARED_REPORTS_DIR
+from utils.dttm import current_utc_str
+from utils.log import logger
+
+# One append-only JSONL file per audit run, plus an append-only cross-run index by severity and component.
+FINDINGS_DIR = os.path.join(SHARED_REPORTS_DIR, "findings")
+FINDINGS_INDEX_FILENAME = "index.jsonl"
+
+Severity = Literal["Critical", "High", "Medium", "Low", "Info"]
+Reachability = Literal["remote", "internal", "local_dev", "unreachable", "unknown"]
+PocClassification = Literal["remote", "internal", "local_dev", "none"]
+
+SEVERITY_ORDER: List[str] = ["Critical", "High", "Medium", "Low", "Info"]
+# SARIF only knows error / warning / note.
+_SARIF_LEVELS = {"Critical": "error", "High": "error", "Medium": "warning", "Low": "note", "Info": "note"}
+
+
+class Finding(BaseModel):
+    """A single structured finding emitted by the deep-dive stage."""
+
+    finding_id: str = Field(default_factory=lambda: uuid.uuid4().hex[:12])
+    run_id: str
+    task_id: str = Field(..., description="Plan item the finding belongs to, e.g. 'CODE-REVIEW-ITEM-003'.")
+    title: str
+    severity: Severity
+    reachability: Reachability
+    cwe: Optional[str] = Field(None, description="CWE identifier, e.g. 'CWE-89'.")
+    component: str = Field(..., description="Service or module, e.g. 'mall-admin'.")
+    file_path: Optional[str] = None
+    line: Optional[int] = None
+    poc_classification: PocClassification = "none"
+    description: str = ""
+    recorded_at: str = Field(default_factory=current_utc_str)
+
+
+class FindingsStore:
+    """
+    Append-only findings stream with a severity/component index.
+
+    Each run's findings go to `<findings_dir>/<run_id>.jsonl`. The index has one line per finding with its
+    severity, component, run and byte offset, so queries across runs read only the matching records. Both are
+    only appended to, under a thread lock and an advisory file lock, so API workers and concurrent runs
+    cannot lose or misplace each other's findings.
+    """
+
+    def __init__(self, findings_dir: str = FINDINGS_DIR):
+        self.findings_dir = findings_dir
+        self._lock = threading.Lock()
+
+    def _run_path(self, run_id: str) -> str:
+        safe_run_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in run_id)
+        return os.path.join(self.findings_dir, f"{safe_run_id}.jsonl")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.findings_dir, FINDINGS_INDEX_FILENAME)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            os.makedirs(self.findings_dir, exist_ok=True)
+            with open(f"{self._index_path()}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_index(self) -> Dict[str, Dict[str, List[List[Any]]]]:
+        index: Dict[str, Dict[str, List[List[Any]]]] = {"severity": {}, "component": {}}
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A line still being appended
+                    run_entry = [entry["run_id"], entry["offset"]]
+                    index["severity"].setdefault(entry["severity"], []).append(run_entry)
+                    index["component"].setdefault(entry["component"], []).append(run_entry)
+        except OSError:
+            pass
+        return index
+
+    def append(self, finding: Finding) -> Finding:
+        """Appends a finding to its run's stream and records it in the index."""
+        line = json.dumps(finding.model_dump(), ensure_ascii=False) + "\n"
+        with self._locked():
+            with open(self._run_path(finding.run_id), "ab") as f:
+                offset = f.tell()
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+            index_entry = {
+                "run_id": finding.run_id,
+                "offset": offset,
+                "severity": finding.severity,
+                "component": finding.component.lower(),
+            }
+            with open(self._index_path(), "a", encoding="utf-8") as f:
+                f.write(json.dumps(index_entry, ensure_ascii=False) + "\n")
+        return finding
+
+    def _read_at(self, run_id: str, offset: int) -> Finding:
+        with open(self._run_path(run_id), "rb") as f:
+            f.seek(offset)
+            return Finding.model_validate_json(f.readline())
+
+    def read_run(self, run_id: str) -> List[Finding]:
+        try:
+            with open(self._run_path(run_id), "r", encoding="utf-8") as f:
+                return [Finding.model_validate_json(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def count_run(self, run_id: str, offset: int = 0) -> Tuple[int, int]:
+        """
+        Counts the findings of a run appended after byte `offset`; returns the count and the offset to count
+        on from next time, so a growing run is not re-read.
+        """
+        try:
+            with open(self._run_path(run_id), "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return 0, offset
+        complete = data[: data.rfind(b"\n") + 1]  # Not a line still being appended
+        return sum(1 for line in complete.splitlines() if line.strip()), offset + len(complete)
+
+    def query(
+        self,
+        severity: Optional[str] = None,
+        component: Optional[str] = None,
+        run_id: Optional[str] = None,
+    ) -> List[Finding]:
+        """Returns findings matching all given filters, ordered by severity."""
+        if severity is None and component is None:
+            if run_id is not None:
+                findings = self.read_run(run_id)
+            else:
+                findings = []
+                for name in sorted(os.listdir(self.findings_dir)) if os.path.isdir(self.findings_dir) else []:
+                    if name.endswith(".jsonl"):
+                        findings.extend(self.read_run(name[: -len(".jsonl")]))
+        else:
+            index = self._load_index()
+            candidates: Optional[set] = None
+            if severity is not None:
+                candidates = {tuple(e) for e in index["severity"].get(severity, [])}
+            if component is not None:
+                by_component = {tuple(e) for e in index["component"].get(component.lower(), [])}
+                candidates = by_component if candidates is None else candidates & by_component
+            entries = sorted(e for e in candidates or set() if run_id is None or e[0] == run_id)
+            findings = [self._read_at(r, o) for r, o in entries]
+        return sorted(findings, key=lambda f: SEVERITY_ORDER.index(f.severity))
+
+    def export_sarif(self, run_id: str) -> Dict[str, Any]:
+        """Converts one run's findings into a SARIF 2.1.0 log."""
+        findings = self.read_run(run_id)
+        rules: Dict[str, Dict[str, Any]] = {}
+        results = []
+        for finding in findings:
+            rule_id = finding.cwe or f"VULNAGENT-{finding.task_id}"
+            rules.setdefault(
+                rule_id,
+                {
+                    "id": rule_id,
+                    "name": finding.title,
+                    "shortDescription": {"text": finding.title},
+                    **({"helpUri": f"https://cwe.mitre.org/data/definitions/{finding.cwe.split('-')[-1]}.html"}
+                       if finding.cwe else {}),
+                },
+            )
+            result: Dict[str, Any] = {
+                "ruleId": rule_id,
+                "level": _SARIF_LEVELS[finding.severity],
+                "message": {"text": finding.description or finding.title},
+                "properties": {
+                    "severity": finding.severity,
+                    "reachability": finding.reachability,
+                    "pocClassification": finding.poc_classification,
+                    "component": finding.component,
+                    "taskId": finding.task_id,
+                    "findingId": finding.finding_id,
+                },
+            }
+            if finding.file_path:
+                location: Dict[str, Any] = {"artifactLocation": {"uri": finding.file_path}}
+                if finding.line:
+                    location["region"] = {"startLine": finding.line}
+                result["locations"] = [{"physicalLocation": location}]
+            results.append(result)
+
+        return {
+            "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+            "version": "2.1.0",
+            "runs": [
+                {
+                    "tool": {"driver": {"name": "vulnagent8", "rules": list(rules.values())}},
+                    "automationDetails": {"id": run_id},
+                    "results": results,
+                }
+            ],
+        }
+
+    def write_sarif(self, run_id: str) -> str:
+        sarif_path = self._run_path(run_id)[: -len(".jsonl")] + ".sarif"
+        with open(sarif_path, "w", encoding="utf-8") as f:
+            json.dump(self.export_sarif(run_id), f, ensure_ascii=False, indent=2)
+        return sarif_path
+
+
+findings_store = FindingsStore()
+
+
+def _get_run_id(agent: Optional[Agent]) -> str:
+    # Team members share the team's session id, so all tasks of one audit land in the same stream.
+    if agent is not None:
+        return agent.team_session_id or agent.session_id or "default"
+    return "default"
+
+
+def _record_finding(
+    agent: Optional[Agent],
+    task_id: str,
+    title: str,
+    severity: str,
+    reachability: str,
+    component: str,
+    cwe: Optional[str],
+    file_path: Optional[str],
+    line: Optional[int],
+    poc_classification: str,
+    description: str,
+) -> str:
+    try:
+        finding = Finding(
+            run_id=_get_run_id(agent),
+            task_id=task_id,
+            title=title,
+            severity=severity,  # type: ignore[arg-type]
+            reachability=reachability,  # type: ignore[arg-type]
+            cwe=cwe,
+            component=component,
+            file_path=file_path,
+            line=line,
+            poc_classification=poc_classification,  # type: ignore[arg-type]
+            description=description,
+        )
+    except ValidationError as e:
+        return f"Error: finding not recorded, invalid fields: {e}"
+
+    try:
+        findings_store.append(finding)
+    except Exception as e:
+        logger.error(f"Error recording finding '{title}': {e}")
+        return f"Error recording finding '{title}': {str(e)}"
+    try:
+        from tools.report_search_tools import get_audit_context, report_search_index
+
+        report_search_index.index_document(
+            doc_key=f"finding:{finding.finding_id}",
+            kind="finding",
+            title=finding.title,
+            body="\n".join(
+                v for v in (finding.description, finding.component, finding.cwe, finding.file_path, finding.severity) if v
+            ),
+            run_id=finding.run_id,
+            project=get_audit_context(agent)["project"],
+            stage="deep_dive",
+            task_id=finding.task_id,
+        )
+    except Exception as e:
+        # The JSONL stream is the source of truth; the search index is best effort.
+        logger.warning(f"Could not add finding {finding.finding_id} to the search index: {e}")
+    logger.info(
+        f"Recorded {finding.severity} finding '{finding.title}' for task {finding.task_id}.",
+        extra={"finding_event": {"event": "finding_recorded", "run_id": finding.run_id, "finding_id": finding.finding_id}},
+    )
+    return f"Finding {finding.finding_id} recorded ({finding.severity}, {finding.component})."
+
+
+def get_findings_tools(use_async: bool = True) -> List[Function]:
+    """
+    Returns the findings tool matching how the agent is run: `arun` -> async, `run` -> sync.
+
+    agno binds the agent using a tool to its Function object (the `agent` argument), so every call returns a
+    new Function for one team; a shared one would record findings under whichever team bound it last.
+    """
+    if use_async:
+
+        @tool(name="record_finding")
+        async def arecord_finding(
+            agent: Agent,
+            task_id: str,
+            title: str,
+            severity: str,
+            reachability: str,
+            component: str,
+            cwe: Optional[str] = None,
+            file_path: Optional[str] = None,
+            line: Optional[int] = None,
+            poc_classification: str = "none",
+            description: str = "",
+        ) -> str:
+            """
+            Records one structured security finding for the current audit run. Call it once per finding, in
+            addition to your Markdown report.
+
+            Args:
+                task_id (str): The plan item ID of your task, e.g. 'CODE-REVIEW-ITEM-003'.
+                title (str): One-line title of the finding.
+                severity (str): One of 'Critical', 'High', 'Medium', 'Low', 'Info'.
+                reachability (str): One of 'remote', 'internal', 'local_dev', 'unreachable', 'unknown'.
+                component (str): Affected service or module, e.g. 'mall-admin'.
+                cwe (str, optional): CWE identifier, e.g. 'CWE-89'.
+                file_path (str, optional): Path of the vulnerable file.
+                line (int, optional): Line number in that file.
+                poc_classification (str): One of 'remote', 'internal', 'local_dev', 'none'.
+                description (str): Short description of the issue and its evidence.
+
+            Returns:
+                str: The finding ID, or an error message.
+            """
+            return await asyncio.to_thread(
+                _record_finding,
+                agent, task_id, title, severity, reachability, component, cwe, file_path, line, poc_classification,
+                description,
+            )
+
+        return [arecord_finding]
+
+    @tool
+    def record_finding(
+        agent: Agent,
+        task_id: str,
+        title: str,
+        severity: str,
+        reachability: str,
+        component: str,
+        cwe: Optional[str] = None,
+        file_path: Optional[str] = None,
+        line: Optional[int] = None,
+        poc_classification: str = "none",
+        description: str = "",
+    ) -> str:
+        """
+        Records one structured security finding for the current audit run. Call it once per finding, in
+        addition to your Markdown report.
+
+        Args:
+            task_id (str): The plan item ID of your task, e.g. 'CODE-REVIEW-ITEM-003'.
+            title (str): One-line title of the finding.
+            severity (str): One of 'Critical', 'High', 'Medium', 'Low', 'Info'.
+            reachability (str): One of 'remote', 'internal', 'local_dev', 'unreachable', 'unknown'.
+            component (str): Affected service or module, e.g. 'mall-admin'.
+            cwe (str, optional): CWE identifier, e.g. 'CWE-89'.
+            file_path (str, optional): Path of the vulnerable file.
+            line (int, optional): Line number in that file.
+            poc_classification (str): One of 'remote', 'internal', 'local_dev', 'none'.
+            description (str): Short description of the issue and its evidence.
+
+        Returns:
+            str: The finding ID, or an error message.
+        """
+        return _record_finding(
+            agent, task_id, title, severity, reachability, component, cwe, file_path, line, poc_classification,
+            description,
+        )
+
+    return [record_finding]
+
+
+if __name__ == "__main__":
+    store = FindingsStore(findings_dir="/tmp/findings_demo")
+    store.append(
+        Finding(
+            run_id="demo_run",
+            task_id="CODE-REVIEW-ITEM-001",
+            title="SQL injection in order search",
+            severity="High",
+            reachability="remote",
+            cwe="CWE-89",
+            component="mall-portal",
+            file_path="mall-portal/src/main/resources/dao/PortalOrderDao.xml",
+            line=42,
+            poc_classification="remote",
+            description="`${keyword}` is concatenated into the ORDER BY clause.",
+        )
+    )
+    print([f.title for f in store.query(severity="High")])
+    print(store.write_sarif("demo_run"))
@@ -0,0 +1,275 @@
+import fcntl
+import os
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from agno.team import Team
+from agno.tools import tool
+
+from tools.report_repository_tools import SHARED_REPORTS_DIR
+from tools.session_state_tools import SessionStateError, get_session_state_store
+from utils.log import logger
+
+# `- [ ] CODE-REVIEW-ITEM-001: description`; the mark is a single byte, so completing a task never shifts offsets.
+_CHECKBOX_LINE_RE = re.compile(rb"^[ \t]*[-*] \[( |x|X)\] (.*?)\r?$", re.MULTILINE)
+_TASK_ID_RE = re.compile(r"^([A-Z][A-Z0-9]*(?:-[A-Z0-9]+)*-\d+)\s*[:：]")
+
+
+@dataclass
+class PlanTask:
+    index: int  # position among the plan's checkbox lines, 0-based
+    task_id: Optional[str]
+    description: str
+    raw_task_line: str
+    line_number: int  # 1-based
+    mark_offset: int  # byte offset of the character between the brackets
+    completed: bool
+
+
+@dataclass
+class PlanProgress:
+    completed: int
+    total: int
+
+    def __str__(self) -> str:
+        return f"{self.completed}/{self.total} tasks completed"
+
+
+class PlanFileManager:
+    """
+    Marks tasks of a Markdown checkbox plan as complete without an LLM round trip.
+
+    The manager keeps a byte-offset index of the checkbox lines (rebuilt only when the file changes on disk),
+    flips `[ ]` to `[x]` at the indexed offset and atomically replaces the file. Completions are serialised
+    with a thread lock and an advisory file lock, so concurrent auditors and API workers cannot lose updates.
+    """
+
+    def __init__(self, plan_path: str):
+        self.plan_path = plan_path
+        self._lock = threading.Lock()
+        self._tasks: List[PlanTask] = []
+        self._indexed_stat: Optional[Tuple[int, int]] = None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            with open(f"{self.plan_path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _index(self, content: bytes) -> None:
+        tasks = []
+        for i, match in enumerate(_CHECKBOX_LINE_RE.finditer(content)):
+            description = match.group(2).decode("utf-8", errors="replace").strip()
+            task_id_match = _TASK_ID_RE.match(description)
+            tasks.append(
+                PlanTask(
+                    index=i,
+                    task_id=task_id_match.group(1) if task_id_match else None,
+                    description=description,
+                    raw_task_line=match.group(0).decode("utf-8", errors="replace").rstrip("\r"),
+                    line_number=content.count(b"\n", 0, match.start()) + 1,
+                    mark_offset=match.start(1),
+                    completed=match.group(1) != b" ",
+                )
+            )
+        self._tasks = tasks
+
+    def _stat_key(self) -> Tuple[int, int]:
+        stat = os.stat(self.plan_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_indexed(self) -> bytes:
+        """Reads the plan and re-indexes it if it changed since the last index."""
+        with open(self.plan_path, "rb") as f:
+            content = f.read()
+        stat_key = self._stat_key()
+        if stat_key != self._indexed_stat:
+            self._index(content)
+            self._indexed_stat = stat_key
+        return content
+
+    def _write_atomic(self, content: bytes) -> None:
+        tmp_path = f"{self.plan_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.plan_path)
+        self._indexed_stat = self._stat_key()
+
+    def _find(self, task: str) -> PlanTask:
+        """Resolves a task by ID ('CODE-REVIEW-ITEM-003'), 1-based position ('3') or exact description/line."""
+        needle = task.strip()
+        for t in self._tasks:
+            if t.task_id is not None and t.task_id == needle:
+                return t
+        if needle.isdigit() and 1 <= int(needle) <= len(self._tasks):
+            return self._tasks[int(needle) - 1]
+        for t in self._tasks:
+            if needle in (t.description, t.raw_task_line.strip()):
+                return t
+        raise KeyError(f"No checkbox task '{task}' in {os.path.basename(self.plan_path)}.")
+
+    def tasks(self) -> List[PlanTask]:
+        with self._locked():
+            self._read_indexed()
+            return list(self._tasks)
+
+    def progress(self) -> PlanProgress:
+        tasks = self.tasks()
+        return PlanProgress(completed=sum(t.completed for t in tasks), total=len(tasks))
+
+    def mark_complete(self, task: str) -> Tuple[PlanTask, PlanProgress]:
+        """Flips the task's checkbox to `[x]` (a no-op if it is already checked) and returns the new progress."""
+        with self._locked():
+            content = self._read_indexed()
+            target = self._find(task)
+            if not target.completed:
+                patched = bytearray(content)
+                patched[target.mark_offset: target.mark_offset + 1] = b"x"
+                self._write_atomic(bytes(patched))
+                target.completed = True
+                target.raw_task_line = target.raw_task_line.replace("[ ]", "[x]", 1)
+            progress = PlanProgress(completed=sum(t.completed for t in self._tasks), total=len(self._tasks))
+        return target, progress
+
+
+_plan_managers: Dict[str, PlanFileManager] = {}
+_plan_managers_lock = threading.Lock()
+
+
+def get_plan_file_manager(plan_path: str) -> PlanFileManager:
+    """Returns the process-wide manager of a plan file, so all callers share one index and lock."""
+    plan_path = os.path.abspath(plan_path)
+    with _plan_managers_lock:
+        if plan_path not in _plan_managers:
+            _plan_managers[plan_path] = PlanFileManager(plan_path)
+        return _plan_managers[plan_path]
+
+
+def _plan_items_from_tasks(tasks: List[PlanTask]) -> List[dict]:
+    return [
+        {
+            "task_id": t.task_id,
+            "raw_task_line": t.raw_task_line,
+            "description": t.description,
+            "status": "completed" if t.completed else "pending",
+        }
+        for t in tasks
+    ]
+
+
+def get_plan_tools(plan_filename: str, journal: Optional[Any] = None) -> list:
+    """
+    Returns the Team Leader's plan tools for `plan_filename` in the shared reports directory:
+    `load_audit_plan` (plan -> session_state) and `complete_audit_task` (checkbox + session_state in one call).
+    Their session_state commits are journaled to `journal` if given, as with `get_session_state_tools`.
+    """
+    plan_path = os.path.join(SHARED_REPORTS_DIR, plan_filename)
+
+    @tool
+    def load_audit_plan(team: Team) -> str:
+        """
+        Loads every checkbox task of the audit plan into session_state (`audit_plan_items`) and sets
+        `current_audit_item_index` to the first pending task. Call once after the plan has been saved.
+
+        Returns:
+            str: The tasks found with their IDs and status, or an error message.
+        """
+        try:
+            tasks = get_plan_file_manager(plan_path).tasks()
+        except OSError as e:
+            return f"Error loading audit plan '{plan_filename}': {str(e)}"
+        if not tasks:
+            return f"Error: No checkbox tasks (`- [ ] ...`) found in '{plan_filename}'."
+
+        items = _plan_items_from_tasks(tasks)
+        first_pending = next((i for i, item in enumerate(items) if item["status"] == "pending"), len(items))
+        try:
+            get_session_state_store(team, journal=journal).transaction(
+                [
+                    {"op": "set", "path": "audit_plan_items", "value": items},
+                    {"op": "set", "path": "current_audit_item_index", "value": first_pending},
+                ]
+            )
+        except SessionStateError as e:
+            return f"Error loading audit plan '{plan_filename}' into session_state: {str(e)}"
+        lines = [f"Loaded {len(items)} tasks from '{plan_filename}':"]
+        lines += [f"{i}. [{item['status']}] {item['description']}" for i, item in enumerate(items)]
+        return "\n".join(lines)
+
+    @tool
+    def complete_audit_task(task: str, team: Team) -> str:
+        """
+        Marks an audit plan task as complete: checks its box in the plan file, sets its status to 'completed'
+        in `audit_plan_items` and moves `current_audit_item_index` to the next pending task.
+
+        Args:
+            task (str): The task ID (e.g. 'CODE-REVIEW-ITEM-003'), or its 1-based position in the plan.
+
+        Returns:
+            str: Confirmation with the up-to-date progress count, or an error message.
+        """
+        manager = get_plan_file_manager(plan_path)
+        try:
+            completed_task, progress = manager.mark_complete(task)
+        except (KeyError, OSError) as e:
+            logger.error(f"Could not mark plan task '{task}' complete: {e}")
+            return f"Error marking task '{task}' complete: {str(e)}"
+
+        store = get_session_state_store(team, journal=journal)
+        i = completed_task.index
+        try:
+            with store.locked():
+                items = store.get("audit_plan_items") or []
+                if i < len(items):
+                    items[i]["status"] = "completed"
+                    operations = [
+                        {"op": "set", "path": f"audit_plan_items[{i}].status", "value": "completed"},
+                        {"op": "set", "path": f"audit_plan_items[{i}].raw_task_line", "value": completed_task.raw_task_line},
+                    ]
+                else:
+                    # Plan was not loaded into session_state yet
+                    items = _plan_items_from_tasks(manager.tasks())
+                    operations = [{"op": "set", "path": "audit_plan_items", "value": items}]
+                next_pending = next((j for j, item in enumerate(items) if item.get("status") != "completed"), len(items))
+                operations.append({"op": "set", "path": "current_audit_item_index", "value": next_pending})
+                store.transaction(operations)
+        except SessionStateError as e:
+            return f"Task checked off in the plan, but session_state could not be updated: {str(e)}"
+
+        logger.info(
+            f"Plan task {completed_task.task_id or completed_task.index + 1} marked complete ({progress}).",
+            extra={"plan_event": {"event": "task_completed", "task": task, "completed": progress.completed, "total": progress.total}},
+        )
+        return f"Task '{completed_task.description}' marked complete. Progress: {progress}."
+
+    return [load_audit_plan, complete_audit_task]
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Completes every task of the sample plan from 8 threads at once and checks that no update was lost.
+    sample_plan = os.path.join(os.path.dirname(__file__), "..", "shared_reports", "AttackSurfaceInvestigationPlan_whitebox.md")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        demo_path = os.path.join(tmp_dir, "plan.md")
+        shutil.copy(sample_plan, demo_path)
+        demo_manager = PlanFileManager(demo_path)
+        print(f"Before: {demo_manager.progress()}")
+        demo_tasks = [t.task_id or str(t.index + 1) for t in demo_manager.tasks()]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for demo_task, demo_progress in pool.map(demo_manager.mark_complete, demo_tasks):
+                print(f"{demo_task.task_id}: {demo_progress}")
+        print(f"After: {demo_manager.progress()}")
+        with open(demo_path, "r", encoding="utf-8") as f:
+            print(f"Unchecked boxes left: {f.read().count('- [ ]')}")
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+from textwrap import dedent
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from core.model_factory import DEFAULT_MODEL_ID, get_model_instance
+from tools.report_repository_tools import SHARED_REPORTS_DIR
+from utils.log import logger
+
+# Reports for which a condensed digest is generated once after saving and served by default on reads.
+DEPLOYMENT_REPORT_FILENAME = "DeploymentArchitectureReport.md"
+DIGESTED_REPORTS = {DEPLOYMENT_REPORT_FILENAME}
+
+REPORT_DIGEST_DIR_NAME = ".digests"
+# Model used by the digest stage; a fast, cheap model is sufficient for condensing.
+REPORT_DIGEST_MODEL_ID = os.getenv("REPORT_DIGEST_MODEL_ID", DEFAULT_MODEL_ID)
+
+
+class ExposedEndpoint(BaseModel):
+    service: str = Field(..., description="Service or component name, e.g. 'mall-admin', 'nginx'.")
+    host_port: Optional[str] = Field(None, description="Host/public port or listen address, e.g. '8080'.")
+    container_port: Optional[str] = Field(None, description="Container/internal port, e.g. '8080'.")
+    exposure: str = Field(..., description="'public', 'internal' or 'unknown', exactly as the report states.")
+    evidence: str = Field(..., description="Config file (and directive) the report cites for this exposure.")
+
+
+class ServiceEntry(BaseModel):
+    name: str
+    kind: str = Field(..., description="e.g. 'application', 'database', 'cache', 'proxy', 'message-queue'.")
+    technology: Optional[str] = Field(None, description="e.g. 'Spring Boot', 'MySQL 5.7', 'Nginx'.")
+    config_files: List[str] = Field(default_factory=list, description="Key config files cited for the service.")
+
+
+class UpstreamLink(BaseModel):
+    source: str = Field(..., description="Caller: proxy route, gateway or service.")
+    target: str = Field(..., description="Callee service, including host alias and port when known.")
+    via: Optional[str] = Field(None, description="Route, path prefix, link alias or protocol, e.g. '/admin/ -> proxy_pass'.")
+
+
+class DeploymentDigest(BaseModel):
+    exposures: List[ExposedEndpoint] = Field(default_factory=list)
+    services: List[ServiceEntry] = Field(default_factory=list)
+    upstreams: List[UpstreamLink] = Field(default_factory=list)
+    notes: List[str] = Field(
+        default_factory=list,
+        description="At most 5 short, factual caveats from the report (e.g. missing proxy_pass rules).",
+    )
+
+
+REPORT_DIGEST_INSTRUCTIONS = dedent("""\
+    You condense a Deployment Architecture Report into a structured digest for downstream security auditors.
+    - Copy facts only from the report. Do not add, infer or assess anything; keep the report's language.
+    - `exposures`: every port or entry point the report lists, with its exposure exactly as the report states it.
+    - `services`: every deployed component with its kind, technology and the config files cited for it.
+    - `upstreams`: every connection the report documents (proxy routes, gateway routes, links, datasources).
+    - `notes`: at most 5 short caveats the report states explicitly (e.g. missing or incomplete configuration).
+    """)
+
+
+def _get_digest_path(report_name: str) -> str:
+    return os.path.join(SHARED_REPORTS_DIR, REPORT_DIGEST_DIR_NAME, f"{report_name}.json")
+
+
+def _hash_content(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def render_digest_markdown(report_name: str, digest: DeploymentDigest) -> str:
+    """Renders a digest as compact Markdown tables suitable for agent context."""
+    lines = [f"# Digest of {report_name}", "", "## Exposure", "| Service | Host port | Container port | Exposure | Evidence |"]
+    lines.append("|---|---|---|---|---|")
+    for e in digest.exposures:
+        lines.append(f"| {e.service} | {e.host_port or '-'} | {e.container_port or '-'} | {e.exposure} | {e.evidence} |")
+    lines += ["", "## Services", "| Service | Kind | Technology | Config files |", "|---|---|---|---|"]
+    for s in digest.services:
+        lines.append(f"| {s.name} | {s.kind} | {s.technology or '-'} | {', '.join(s.config_files) or '-'} |")
+    lines += ["", "## Upstream map"]
+    for u in digest.upstreams:
+        lines.append(f"- {u.source} -> {u.target}" + (f" ({u.via})" if u.via else ""))
+    if digest.notes:
+        lines += ["", "## Notes"] + [f"- {n}" for n in digest.notes]
+    return "\n".join(lines)
+
+
+def build_deployment_digest(report_content: str, model_id: str = REPORT_DIGEST_MODEL_ID) -> DeploymentDigest:
+    """Runs the digest stage: a single structured-output model call over the full report."""
+    from agno.agent import Agent
+
+    digest_agent = Agent(
+        name="ReportDigestAgent",
+        model=get_model_instance(model_id),
+        instructions=REPORT_DIGEST_INSTRUCTIONS,
+        response_model=DeploymentDigest,
+        use_json_mode=True,
+        enable_user_memories=False,
+    )
+    response = digest_agent.run(report_content)
+    if not isinstance(response.content, DeploymentDigest):
+        raise ValueError(f"Digest stage returned unexpected content: {str(response.content)[:200]}")
+    return response.content
+
+
+def ensure_report_digest(report_name: str, report_content: Optional[str] = None) -> Optional[str]:
+    """
+    Returns the Markdown digest of a report, generating it only if the report changed since the last digest.
+
+    The digest is cached next to the reports and keyed on the SHA-256 of the source report.
+    Returns None for reports that are not digested.
+    """
+    if report_name not in DIGESTED_REPORTS:
+        return None
+    if report_content is None:
+        with open(os.path.join(SHARED_REPORTS_DIR, report_name), "r", encoding="utf-8") as f:
+            report_content = f.read()
+
+    cached = load_report_digest(report_name, report_content)
+    if cached is not None:
+        return cached
+
+    digest = build_deployment_digest(report_content)
+    digest_markdown = render_digest_markdown(report_name, digest)
+    digest_path = _get_digest_path(report_name)
+    os.makedirs(os.path.dirname(digest_path), exist_ok=True)
+    with open(digest_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "source_sha256": _hash_content(report_content),
+                "digest": digest.model_dump(),
+                "markdown": digest_markdown,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    logger.info(
+        f"Digest of report '{report_name}' saved to {digest_path}.",
+        extra={"report_event": {"event": "digest_saved", "report_name": report_name}},
+    )
+    return digest_markdown
+
+
+def load_report_digest(report_name: str, report_content: str) -> Optional[str]:
+    """Returns the cached Markdown digest if it was built from exactly this report content."""
+    try:
+        with open(_get_digest_path(report_name), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get("source_sha256") != _hash_content(report_content):
+        return None
+    return stored.get("markdown")
+
+
+def estimate_digest_token_savings(report_name: str = DEPLOYMENT_REPORT_FILENAME, num_tasks: int = 15) -> dict:
+    """
+    Estimates input tokens saved on one audit run in which the planner and `num_tasks` auditor tasks each
+    read the report once, comparing the full report against its cached digest.
+    """
+    import tiktoken
+
+    with open(os.path.join(SHARED_REPORTS_DIR, report_name), "r", encoding="utf-8") as f:
+        report_content = f.read()
+    digest_markdown = load_report_digest(report_name, report_content)
+    if digest_markdown is None:
+        raise ValueError(f"No up-to-date digest for '{report_name}'. Save the report or run ensure_report_digest first.")
+
+    encoding = tiktoken.get_encoding("o200k_base")
+    full_tokens = len(encoding.encode(report_content))
+    digest_tokens = len(encoding.encode(digest_markdown))
+    reads = num_tasks + 1  # planner + auditor tasks
+    return {
+        "full_report_tokens": full_tokens,
+        "digest_tokens": digest_tokens,
+        "reads_per_run": reads,
+        "tokens_full_per_run": full_tokens * reads,
+        "tokens_digest_per_run": digest_tokens * reads,
+        "tokens_saved_per_run": (full_tokens - digest_tokens) * reads,
+    }
+
+
+if __name__ == "__main__":
+    # Generates (or reuses) the digest of the current deployment report and prints the savings for a 15-task run.
+    # Requires the model provider key for REPORT_DIGEST_MODEL_ID when the digest is not cached yet.
+    print(ensure_report_digest(DEPLOYMENT_REPORT_FILENAME))
+    print(json.dumps(estimate_digest_token_savings(num_tasks=15), indent=2))
@@ -1,74 +1,557 @@
+import asyncio
+import json
+import logging
 import os
-from agno.tools import tool
+import re
+import threading
+import weakref
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from agno.agent import Agent
+from agno.tools import Function, tool
+
+from utils.log import logger
 
 # Define a shared directory within the container for reports
 # Ensure this path is accessible and writable by the agent's execution environment.
 SHARED_REPORTS_DIR = "/app/shared_reports" 
 
+# Heading outlines are parsed once at save time and stored next to the reports,
+# so reads can return a single section instead of the whole file.
+REPORT_OUTLINE_DIR_NAME = ".outlines"
+SECTION_PATH_SEPARATOR = " > "
+
+_ATX_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+# Reports produced by the agents frequently use bold lines (`**I. Overview:**`) or
+# bold-only bullets (`*   **Port Mappings:**`) instead of ATX headings.
+_BOLD_HEADING_RE = re.compile(r"^\*\*(.+?)\*\*:?\s*$")
+_BOLD_BULLET_HEADING_RE = re.compile(r"^( *)[*\-+]\s+\*\*(.+?)\*\*:?\s*$")
+# Plan items (`- [ ] CODE-REVIEW-ITEM-001: ...`) are addressable sections as well.
+_CHECKBOX_HEADING_RE = re.compile(r"^( *)[*\-+]\s+\[[ xX]\]\s+(.+?)\s*$")
+
+
+@dataclass
+class ReportSection:
+    """A heading in a report together with the byte range of its section."""
+
+    level: int
+    depth: int
+    title: str
+    path: str
+    start: int
+    end: int
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+def _clean_heading_title(title: str) -> str:
+    return title.strip().strip("*").strip().rstrip(":").strip()
+
+
+def parse_report_outline(report_content: str) -> List[ReportSection]:
+    """
+    Parses a Markdown report into a flat, document-ordered list of sections.
+
+    ATX headings (`#`..`######`) map to their own level. A bold-only line counts as a level 2
+    heading; bold-only bullets and checkbox items count as level 3 plus one level per four spaces
+    of indentation.
+    Byte offsets refer to the UTF-8 encoded content; a section runs until the next heading
+    of the same or a higher level.
+    """
+    sections: List[ReportSection] = []
+    stack: List[ReportSection] = []
+    offset = 0
+    in_code_block = False
+
+    for line in report_content.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line.encode("utf-8"))
+        stripped = line.rstrip("\r\n")
+        if stripped.lstrip().startswith("```"):
+            in_code_block = not in_code_block
+            continue
+        if in_code_block:
+            continue
+
+        level: Optional[int] = None
+        title = ""
+        if match := _ATX_HEADING_RE.match(stripped):
+            level, title = len(match.group(1)), match.group(2)
+        elif match := _BOLD_HEADING_RE.match(stripped):
+            level, title = 2, match.group(1)
+        elif match := _BOLD_BULLET_HEADING_RE.match(stripped) or _CHECKBOX_HEADING_RE.match(stripped):
+            level, title = 3 + len(match.group(1)) // 4, match.group(2)
+        if level is None:
+            continue
+        title = _clean_heading_title(title)
+        if not title:
+            continue
+
+        while stack and stack[-1].level >= level:
+            stack.pop().end = line_start
+        path = SECTION_PATH_SEPARATOR.join([s.title for s in stack] + [title])
+        section = ReportSection(level=level, depth=len(stack), title=title, path=path, start=line_start, end=-1)
+        sections.append(section)
+        stack.append(section)
+
+    for section in stack:
+        section.end = offset
+    return sections
+
+
+def _get_outline_path(report_name: str) -> str:
+    return os.path.join(SHARED_REPORTS_DIR, REPORT_OUTLINE_DIR_NAME, f"{report_name}.json")
+
+
+def _write_report_outline(report_name: str, report_content: str) -> List[ReportSection]:
+    sections = parse_report_outline(report_content)
+    outline_path = _get_outline_path(report_name)
+    os.makedirs(os.path.dirname(outline_path), exist_ok=True)
+    report_stat = os.stat(os.path.join(SHARED_REPORTS_DIR, report_name))
+    with open(outline_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "report_mtime_ns": report_stat.st_mtime_ns,
+                "report_size": report_stat.st_size,
+                "sections": [asdict(s) for s in sections],
+            },
+            f,
+            ensure_ascii=False,
+        )
+    return sections
+
+
+def _load_report_outline(report_name: str) -> List[ReportSection]:
+    """Returns the stored outline, re-parsing the report if it changed since the outline was written."""
+    file_path = os.path.join(SHARED_REPORTS_DIR, report_name)
+    report_stat = os.stat(file_path)
+    try:
+        with open(_get_outline_path(report_name), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored["report_mtime_ns"] == report_stat.st_mtime_ns and stored["report_size"] == report_stat.st_size:
+            return [ReportSection(**s) for s in stored["sections"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        return _write_report_outline(report_name, f.read())
+
+
+def find_report_sections(sections: List[ReportSection], query: str) -> List[ReportSection]:
+    """
+    Finds sections by path or heading query (case-insensitive).
+
+    A query containing '>' is a path: every segment must be a substring of a heading on the section's
+    path, in order, and the last segment must match the section itself. Otherwise the query is matched
+    as a substring of any heading title. Exact title matches are returned first.
+    """
+    query = query.strip()
+    if SECTION_PATH_SEPARATOR.strip() in query:
+        wanted = [q.strip().lower() for q in query.split(SECTION_PATH_SEPARATOR.strip()) if q.strip()]
+        matches = []
+        for section in sections:
+            parts = [p.lower() for p in section.path.split(SECTION_PATH_SEPARATOR)]
+            if not wanted or wanted[-1] not in parts[-1]:
+                continue
+            remaining = iter(parts[:-1])
+            if all(any(w in p for p in remaining) for w in wanted[:-1]):
+                matches.append(section)
+        return matches
+
+    lowered = query.lower()
+    exact = [s for s in sections if s.title.lower() == lowered]
+    partial = [s for s in sections if lowered in s.title.lower() and s not in exact]
+    return exact + partial
+
+
+def format_report_outline(report_name: str, sections: List[ReportSection], total_size: int) -> str:
+    lines = [
+        f"Outline of '{report_name}' ({total_size} bytes). "
+        "Pass a heading or a path such as 'Parent > Child' as `section` to read one part:"
+    ]
+    if not sections:
+        lines.append("(no headings found - read the report without `section`)")
+    for section in sections:
+        lines.append(f"{'  ' * section.depth}- {section.title} ({section.size} bytes)")
+    return "\n".join(lines)
+
+def _log_report_event(level: int, message: str, **fields) -> None:
+    """Emits a structured log record; the fields are attached under `report_event` for log processors."""
+    logger.log(level, message, extra={"report_event": fields})
+
+
+def _write_report_file(report_name: str, report_content: str, fsync: bool) -> str:
+    """Atomically replaces the report file. Without `fsync`, the caller is responsible for syncing it."""
+    if not os.path.exists(SHARED_REPORTS_DIR):
+        os.makedirs(SHARED_REPORTS_DIR, exist_ok=True)
+        _log_report_event(logging.INFO, f"Created directory: {SHARED_REPORTS_DIR}", event="dir_created")
+
+    file_path = os.path.join(SHARED_REPORTS_DIR, report_name)
+    tmp_path = f"{file_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(report_content)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+    if fsync:
+        _fsync_paths([file_path])
+    return file_path
+
+
+def _fsync_paths(paths: List[str]) -> None:
+    """fsyncs the given files and, once per directory, their parent directories (to persist the renames)."""
+    directories = set()
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        directories.add(os.path.dirname(path))
+    for directory in directories:
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            continue  # Directories cannot be opened on every platform
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def _index_saved_report(report_name: str, report_content: str, agent: Optional[Agent] = None) -> None:
+    """Builds the outline, the search index entry and, for digested reports, the digest of a freshly saved report."""
+    try:
+        _write_report_outline(report_name, report_content)
+    except Exception as e:
+        # The report itself is saved; reads fall back to re-parsing it.
+        _log_report_event(
+            logging.WARNING,
+            f"Could not index outline of report '{report_name}': {str(e)}",
+            event="outline_failed",
+            report_name=report_name,
+        )
+
+    from tools.report_search_tools import get_audit_context, report_search_index
+
+    try:
+        report_search_index.index_report(report_name, report_content, **get_audit_context(agent))
+    except Exception as e:
+        _log_report_event(
+            logging.WARNING,
+            f"Could not add report '{report_name}' to the search index: {str(e)}",
+            event="search_index_failed",
+            report_name=report_name,
+        )
+
+    # Digest stage: condensed summaries are built once per report version for downstream agents.
+    from tools.report_digest import DIGESTED_REPORTS, ensure_report_digest
+
+    if report_name in DIGESTED_REPORTS:
+        try:
+            ensure_report_digest(report_name, report_content)
+        except Exception as e:
+            # Reads serve the full report until a digest for this version exists.
+            _log_report_event(
+                logging.WARNING,
+                f"Could not build digest of report '{report_name}': {str(e)}",
+                event="digest_failed",
+                report_name=report_name,
+            )
+
+
+def _read_report(report_name: str, section: Optional[str], outline: bool, full: bool) -> str:
+    file_path = os.path.join(SHARED_REPORTS_DIR, report_name)
+
+    if not os.path.exists(file_path):
+        not_found_message = f"Report '{report_name}' not found in repository at {file_path}."
+        _log_report_event(logging.WARNING, not_found_message, event="report_not_found", report_name=report_name)
+        return not_found_message
+
+    if outline or section:
+        sections = _load_report_outline(report_name)
+        if outline:
+            _log_report_event(
+                logging.INFO,
+                f"Successfully read outline of report '{report_name}' from repository.",
+                event="outline_read",
+                report_name=report_name,
+                sections=len(sections),
+            )
+            return format_report_outline(report_name, sections, os.path.getsize(file_path))
+
+        matches = find_report_sections(sections, section)
+        if not matches:
+            _log_report_event(
+                logging.WARNING,
+                f"Section '{section}' not found in report '{report_name}'.",
+                event="section_not_found",
+                report_name=report_name,
+                section=section,
+            )
+            return (
+                f"Section '{section}' not found in report '{report_name}'.\n\n"
+                + format_report_outline(report_name, sections, os.path.getsize(file_path))
+            )
+
+        with open(file_path, "rb") as f:
+            report_bytes = f.read()
+        # Drop matches nested inside an earlier match so no text is returned twice.
+        selected: List[ReportSection] = []
+        for match in sorted(matches, key=lambda s: s.start):
+            if not any(s.start <= match.start and match.end <= s.end for s in selected):
+                selected.append(match)
+        parts = [report_bytes[s.start:s.end].decode("utf-8").rstrip() for s in selected]
+        _log_report_event(
+            logging.INFO,
+            f"Successfully read {len(parts)} section(s) matching '{section}' from report '{report_name}'.",
+            event="section_read",
+            report_name=report_name,
+            section=section,
+            bytes=sum(s.size for s in selected),
+        )
+        return "\n\n".join(parts)
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        report_content = f.read()
+
+    if not full:
+        from tools.report_digest import load_report_digest
+
+        digest_markdown = load_report_digest(report_name, report_content)
+        if digest_markdown is not None:
+            _log_report_event(
+                logging.INFO,
+                f"Successfully read digest of report '{report_name}' from repository.",
+                event="digest_read",
+                report_name=report_name,
+                bytes=len(digest_markdown.encode("utf-8")),
+            )
+            return (
+                f"{digest_markdown}\n\n"
+                f"(Digest of '{report_name}'. For verbatim details use `section` or `outline=True`, "
+                "or `full=True` for the whole report.)"
+            )
+
+    _log_report_event(
+        logging.INFO,
+        f"Successfully read report '{report_name}' from repository.",
+        event="report_read",
+        report_name=report_name,
+        bytes=len(report_content.encode("utf-8")),
+    )
+    return report_content
+
+
+class _FsyncBatcher:
+    """
+    Group-commits fsyncs for one event loop: writers arriving within `window_s` of each other share a single
+    fsync pass executed in a worker thread, and each writer resumes once its file is durable.
+    """
+
+    def __init__(self, window_s: float = 0.02):
+        self.window_s = window_s
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def sync(self, path: str) -> None:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.setdefault(path, []).append(future)
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_after_window())
+        await future
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window_s)
+        pending, self._pending = self._pending, {}
+        # Writers arriving while this batch syncs start the next batch.
+        self._flush_task = None
+        try:
+            await asyncio.to_thread(_fsync_paths, list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+        else:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(None)
+
+
+_fsync_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _FsyncBatcher]" = weakref.WeakKeyDictionary()
+
+
+def _get_fsync_batcher() -> _FsyncBatcher:
+    loop = asyncio.get_running_loop()
+    batcher = _fsync_batchers.get(loop)
+    if batcher is None:
+        batcher = _fsync_batchers[loop] = _FsyncBatcher()
+    return batcher
+
+
 @tool
-def save_report_to_repository(report_content: str, report_name: str = "environment_analysis_report.md") -> str:
+def read_report_from_repository(
+    report_name: str = "environment_analysis_report.md",
+    section: Optional[str] = None,
+    outline: bool = False,
+    full: bool = False,
+) -> str:
     """
-    Saves the provided report content to a shared repository (file system).
+    Reads a report from the shared repository (file system).
+    Reports with a precomputed digest (e.g. 'DeploymentArchitectureReport.md') return the digest by default.
+    Use `outline=True` to list headings, `section` to read a part verbatim, or `full=True` for the whole report.
 
     Args:
-        report_content (str): The content of the report to be saved.
-        report_name (str): The name of the file to save the report as (e.g., 'environment_analysis_report.md').
+        report_name (str): The name of the report file to read (e.g., 'environment_analysis_report.md').
                            Defaults to 'environment_analysis_report.md'.
+        section (str, optional): A heading path such as 'III. Reverse Proxy > Nginx Configuration Analysis'
+                                 or a heading query such as 'nginx'. Only the matching section(s) are returned.
+        outline (bool): If True, return only the heading outline with the byte size of each section.
+        full (bool): If True, return the full report even if a digest is available.
 
     Returns:
-        str: A message indicating success or failure.
+        str: The content of the report (or of the requested section, or its outline),
+             or an error message if the report is not found or an error occurs.
     """
     try:
-        if not os.path.exists(SHARED_REPORTS_DIR):
-            os.makedirs(SHARED_REPORTS_DIR)
-            print(f"Created directory: {SHARED_REPORTS_DIR}")
-
-        file_path = os.path.join(SHARED_REPORTS_DIR, report_name)
-        
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(report_content)
-        
-        success_message = f"Report '{report_name}' successfully saved to repository at {file_path}."
-        print(success_message)
-        return success_message
+        return _read_report(report_name, section, outline, full)
     except Exception as e:
-        error_message = f"Error saving report '{report_name}' to repository: {str(e)}"
-        print(error_message)
+        error_message = f"Error reading report '{report_name}' from repository: {str(e)}"
+        _log_report_event(logging.ERROR, error_message, event="report_read_failed", report_name=report_name)
         return error_message
 
-@tool
-def read_report_from_repository(report_name: str = "environment_analysis_report.md") -> str:
+# Async-native variants for agents run with `arun` (FastAPI, Streamlit). They keep the tool names of the
+# sync variants so the agent instructions apply unchanged, and never block the event loop on file I/O.
+# The save tools are created per team by `get_report_repository_tools`.
+
+@tool(name="read_report_from_repository")
+async def aread_report_from_repository(
+    report_name: str = "environment_analysis_report.md",
+    section: Optional[str] = None,
+    outline: bool = False,
+    full: bool = False,
+) -> str:
     """
     Reads a report from the shared repository (file system).
+    Reports with a precomputed digest (e.g. 'DeploymentArchitectureReport.md') return the digest by default.
+    Use `outline=True` to list headings, `section` to read a part verbatim, or `full=True` for the whole report.
 
     Args:
         report_name (str): The name of the report file to read (e.g., 'environment_analysis_report.md').
                            Defaults to 'environment_analysis_report.md'.
+        section (str, optional): A heading path such as 'III. Reverse Proxy > Nginx Configuration Analysis'
+                                 or a heading query such as 'nginx'. Only the matching section(s) are returned.
+        outline (bool): If True, return only the heading outline with the byte size of each section.
+        full (bool): If True, return the full report even if a digest is available.
 
     Returns:
-        str: The content of the report, or an error message if the report is not found or an error occurs.
+        str: The content of the report (or of the requested section, or its outline),
+             or an error message if the report is not found or an error occurs.
     """
     try:
-        file_path = os.path.join(SHARED_REPORTS_DIR, report_name)
-        
-        if not os.path.exists(file_path):
-            not_found_message = f"Report '{report_name}' not found in repository at {file_path}."
-            print(not_found_message)
-            return not_found_message
-            
-        with open(file_path, "r", encoding="utf-8") as f:
-            report_content = f.read()
-        
-        print(f"Successfully read report '{report_name}' from repository.")
-        return report_content
+        return await asyncio.to_thread(_read_report, report_name, section, outline, full)
     except Exception as e:
         error_message = f"Error reading report '{report_name}' from repository: {str(e)}"
-        print(error_message)
+        await asyncio.to_thread(
+            _log_report_event, logging.ERROR, error_message, event="report_read_failed", report_name=report_name
+        )
         return error_message
 
+
+def get_report_repository_tools(use_async: bool = True) -> List[Function]:
+    """
+    Returns the (save, read) report tools matching how the agent is run: `arun` -> async, `run` -> sync.
+
+    The save tool tags a report in the search index with the run of the agent saving it. agno binds that agent
+    to the Function object, so every call returns a new save tool for one team (see `get_findings_tools`).
+    """
+    if use_async:
+
+        @tool(name="save_report_to_repository")
+        async def asave_report_to_repository(
+            report_content: str, report_name: str = "environment_analysis_report.md", agent: Optional[Agent] = None
+        ) -> str:
+            """
+            Saves the provided report content to a shared repository (file system).
+
+            Args:
+                report_content (str): The content of the report to be saved.
+                report_name (str): The name of the file to save the report as (e.g., 'environment_analysis_report.md').
+                                   Defaults to 'environment_analysis_report.md'.
+
+            Returns:
+                str: A message indicating success or failure.
+            """
+            try:
+                file_path = await asyncio.to_thread(_write_report_file, report_name, report_content, False)
+                await _get_fsync_batcher().sync(file_path)
+                await asyncio.to_thread(_index_saved_report, report_name, report_content, agent)
+
+                success_message = f"Report '{report_name}' successfully saved to repository at {file_path}."
+                # Log handlers write to the console synchronously, so they run off the loop as well.
+                await asyncio.to_thread(
+                    _log_report_event,
+                    logging.INFO,
+                    success_message,
+                    event="report_saved",
+                    report_name=report_name,
+                    bytes=len(report_content),
+                )
+                return success_message
+            except Exception as e:
+                error_message = f"Error saving report '{report_name}' to repository: {str(e)}"
+                await asyncio.to_thread(
+                    _log_report_event, logging.ERROR, error_message, event="report_save_failed", report_name=report_name
+                )
+                return error_message
+
+        return [asave_report_to_repository, aread_report_from_repository]
+
+    @tool
+    def save_report_to_repository(
+        report_content: str, report_name: str = "environment_analysis_report.md", agent: Optional[Agent] = None
+    ) -> str:
+        """
+        Saves the provided report content to a shared repository (file system).
+
+        Args:
+            report_content (str): The content of the report to be saved.
+            report_name (str): The name of the file to save the report as (e.g., 'environment_analysis_report.md').
+                               Defaults to 'environment_analysis_report.md'.
+
+        Returns:
+            str: A message indicating success or failure.
+        """
+        try:
+            file_path = _write_report_file(report_name, report_content, fsync=True)
+            _index_saved_report(report_name, report_content, agent)
+
+            success_message = f"Report '{report_name}' successfully saved to repository at {file_path}."
+            _log_report_event(
+                logging.INFO, success_message, event="report_saved", report_name=report_name, bytes=len(report_content)
+            )
+            return success_message
+        except Exception as e:
+            error_message = f"Error saving report '{report_name}' to repository: {str(e)}"
+            _log_report_event(logging.ERROR, error_message, event="report_save_failed", report_name=report_name)
+            return error_message
+
+    return [save_report_to_repository, read_report_from_repository]
+
 if __name__ == '__main__':
     # Example Usage (for testing the tools directly)
     print("Testing repository tools...")
+    save_report_to_repository, _ = get_report_repository_tools(use_async=False)
+    asave_report_to_repository, _ = get_report_repository_tools(use_async=True)
     
     # Test save
     test_content = "# Test Report\n\nThis is a test report content.\nHello World!"
@@ -80,6 +563,11 @@ if __name__ == '__main__':
         read_result_success = read_report_from_repository(report_name="test_report.md")
         print(f"Read test (success) result content:\n{read_result_success[:100]}...") # Print first 100 chars
 
+    # Test outline and section reads
+    if "successfully saved" in save_result:
+        print(read_report_from_repository(report_name="test_report.md", outline=True))
+        print(read_report_from_repository(report_name="test_report.md", section="Test Report"))
+
     # Test read (file not found)
     read_result_not_found = read_report_from_repository(report_name="non_existent_report.md")
     print(f"Read test (not found) result: {read_result_not_found}")
@@ -88,4 +576,33 @@ if __name__ == '__main__':
     test_file_path = os.path.join(SHARED_REPORTS_DIR, "test_report.md")
     if os.path.exists(test_file_path):
         os.remove(test_file_path)
-        print(f"Cleaned up {test_file_path}") 
\ No newline at end of file
+        print(f"Cleaned up {test_file_path}")
+    test_outline_path = _get_outline_path("test_report.md")
+    if os.path.exists(test_outline_path):
+        os.remove(test_outline_path) 
+
+    # Event-loop lag under concurrent streams: sync tools called on the loop vs. the async variants
+    from utils.loop_lag import EventLoopLagMonitor
+
+    async def _measure_loop_lag(use_async: bool, streams: int = 20) -> float:
+        big_report = "\n".join(f"## Section {i}\n" + "x" * 4000 for i in range(100))
+
+        async def one_stream(i: int) -> None:
+            name = f"lag_test_{i}.md"
+            if use_async:
+                await asave_report_to_repository.entrypoint(big_report, name)
+                await aread_report_from_repository.entrypoint(name, section="Section 42")
+            else:
+                save_report_to_repository.entrypoint(big_report, name)
+                read_report_from_repository.entrypoint(name, section="Section 42")
+
+        async with EventLoopLagMonitor() as monitor:
+            await asyncio.gather(*(one_stream(i) for i in range(streams)))
+        for i in range(streams):
+            for path in (os.path.join(SHARED_REPORTS_DIR, f"lag_test_{i}.md"), _get_outline_path(f"lag_test_{i}.md")):
+                if os.path.exists(path):
+                    os.remove(path)
+        return monitor.max_lag_ms
+
+    print(f"Max event-loop lag, sync tools:  {asyncio.run(_measure_loop_lag(use_async=False)):.1f} ms")
+    print(f"Max event-loop lag, async tools: {asyncio.run(_measure_loop_lag(use_async=True)):.1f} ms")
@@ -0,0 +1,339 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from agno.agent import Agent
+from agno.tools import Function, tool
+from pydantic import BaseModel
+
+from tools.report_repository_tools import SHARED_REPORTS_DIR
+from utils.dttm import current_utc_str
+from utils.log import logger
+
+# Local full-text index over every saved report and finding, shared by all runs.
+REPORT_SEARCH_DB_PATH = os.getenv("REPORT_SEARCH_DB_PATH", os.path.join(SHARED_REPORTS_DIR, ".search", "reports.db"))
+
+# Stage tags derived from the report filenames used by the security audit team.
+_STAGE_BY_REPORT_PREFIX = [
+    ("DeploymentArchitectureReport", "environment"),
+    ("environment_analysis_report", "environment"),
+    ("AttackSurfaceInvestigationPlan", "planning"),
+    ("DeepDiveReport_Task", "deep_dive"),
+    ("DeepDiveAuditFindings_Aggregated", "aggregation"),
+]
+
+# The trigram tokenizer matches substrings, which works for Chinese text without word segmentation,
+# but it needs at least three characters; shorter terms fall back to LIKE.
+_MIN_TRIGRAM_TERM_LENGTH = 3
+_SNIPPET_TOKENS = 48
+
+
+class SearchHit(BaseModel):
+    doc_key: str
+    kind: str
+    title: str
+    run_id: Optional[str] = None
+    project: Optional[str] = None
+    stage: Optional[str] = None
+    task_id: Optional[str] = None
+    snippet: str
+    score: float
+    updated_at: str
+
+
+def infer_report_stage(report_name: str) -> Optional[str]:
+    for prefix, stage in _STAGE_BY_REPORT_PREFIX:
+        if report_name.startswith(prefix):
+            return stage
+    return None
+
+
+class ReportSearchIndex:
+    """
+    SQLite FTS5 index over audit reports and findings.
+
+    Documents are keyed by `doc_key` (e.g. 'report:<name>' or 'finding:<id>') and re-indexed only when their
+    content hash changes, so indexing after every save is cheap.
+    """
+
+    def __init__(self, db_path: str = REPORT_SEARCH_DB_PATH):
+        self.db_path = db_path
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if not self._schema_ready:
+                with self._schema_lock:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                doc_key UNINDEXED, kind UNINDEXED, run_id UNINDEXED, project UNINDEXED,
+                stage UNINDEXED, task_id UNINDEXED, updated_at UNINDEXED, title, body,
+                tokenize='trigram'
+            )
+            """
+        )
+
+    def index_document(
+        self,
+        doc_key: str,
+        kind: str,
+        title: str,
+        body: str,
+        run_id: Optional[str] = None,
+        project: Optional[str] = None,
+        stage: Optional[str] = None,
+        task_id: Optional[str] = None,
+    ) -> bool:
+        """Adds or replaces a document. Returns False if it is already indexed with the same content."""
+        content_hash = hashlib.sha256(f"{title}\0{body}\0{run_id}\0{project}\0{stage}\0{task_id}".encode()).hexdigest()
+        updated_at = current_utc_str()
+        with self._connect() as conn:
+            row = conn.execute("SELECT content_hash FROM documents WHERE doc_key = ?", (doc_key,)).fetchone()
+            if row is not None and row[0] == content_hash:
+                return False
+            conn.execute("DELETE FROM documents_fts WHERE doc_key = ?", (doc_key,))
+            conn.execute(
+                "INSERT INTO documents_fts (doc_key, kind, run_id, project, stage, task_id, updated_at, title, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_key, kind, run_id, project, stage, task_id, updated_at, title, body),
+            )
+            conn.execute(
+                "INSERT INTO documents (doc_key, content_hash, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(doc_key) DO UPDATE SET content_hash = excluded.content_hash, updated_at = excluded.updated_at",
+                (doc_key, content_hash, updated_at),
+            )
+        return True
+
+    def index_report(
+        self,
+        report_name: str,
+        report_content: str,
+        run_id: Optional[str] = None,
+        project: Optional[str] = None,
+        task_id: Optional[str] = None,
+    ) -> bool:
+        # Report names are reused across runs, so the run is part of the key when known.
+        doc_key = f"report:{run_id}:{report_name}" if run_id else f"report:{report_name}"
+        stage = infer_report_stage(report_name)
+        return self.index_document(
+            doc_key=doc_key,
+            kind="report",
+            title=report_name,
+            body=report_content,
+            run_id=run_id,
+            project=project,
+            stage=stage,
+            # Only deep-dive reports belong to one plan task; the others are written before or after the tasks.
+            task_id=task_id if stage == "deep_dive" else None,
+        )
+
+    def index_existing_reports(self, reports_dir: str = SHARED_REPORTS_DIR) -> int:
+        """Backfills the index from the Markdown reports already on disk. Returns the number of (re)indexed reports."""
+        indexed = 0
+        for name in sorted(os.listdir(reports_dir)) if os.path.isdir(reports_dir) else []:
+            if not name.endswith(".md"):
+                continue
+            with open(os.path.join(reports_dir, name), "r", encoding="utf-8") as f:
+                indexed += self.index_report(name, f.read())
+        return indexed
+
+    def search(
+        self,
+        query: str,
+        kind: Optional[str] = None,
+        run_id: Optional[str] = None,
+        project: Optional[str] = None,
+        stage: Optional[str] = None,
+        task_id: Optional[str] = None,
+        limit: int = 10,
+    ) -> List[SearchHit]:
+        """
+        Returns documents containing every whitespace-separated term of `query`, best BM25 matches first,
+        each with a highlighted snippet.
+        """
+        terms = [t.replace('"', "") for t in query.split()]
+        terms = [t for t in terms if t]
+        if not terms:
+            return []
+        long_terms = [t for t in terms if len(t) >= _MIN_TRIGRAM_TERM_LENGTH]
+        short_terms = [t for t in terms if len(t) < _MIN_TRIGRAM_TERM_LENGTH]
+
+        where: List[str] = []
+        params: List[object] = []
+        if long_terms:
+            where.append("documents_fts MATCH ?")
+            params.append(" AND ".join(f'"{t}"' for t in long_terms))
+        for term in short_terms:
+            where.append("(title LIKE ? OR body LIKE ?)")
+            params += [f"%{term}%", f"%{term}%"]
+        for column, value in (("kind", kind), ("run_id", run_id), ("project", project), ("stage", stage), ("task_id", task_id)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+
+        if long_terms:
+            # Aliased: FTS5 tables have a hidden `rank` column, and positional ORDER BY is easy to get wrong.
+            select = (
+                f"snippet(documents_fts, 8, '[', ']', '…', {_SNIPPET_TOKENS}), bm25(documents_fts, 5.0, 1.0) AS score"
+            )
+            order = "ORDER BY score ASC"
+        else:
+            select = "body, 0.0 AS score"
+            order = "ORDER BY updated_at DESC"
+        sql = (
+            f"SELECT doc_key, kind, title, run_id, project, stage, task_id, updated_at, {select} "
+            f"FROM documents_fts WHERE {' AND '.join(where)} {order} LIMIT ?"
+        )
+        params.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        hits = []
+        for doc_key, doc_kind, title, doc_run_id, doc_project, doc_stage, doc_task_id, updated_at, snippet, score in rows:
+            if not long_terms:
+                snippet = _snippet_around(snippet, short_terms[0])
+            hits.append(
+                SearchHit(
+                    doc_key=doc_key,
+                    kind=doc_kind,
+                    title=title,
+                    run_id=doc_run_id,
+                    project=doc_project,
+                    stage=doc_stage,
+                    task_id=doc_task_id,
+                    snippet=snippet,
+                    # bm25() is lower-is-better; expose higher-is-better scores
+                    score=-float(score),
+                    updated_at=updated_at,
+                )
+            )
+        return hits
+
+
+def _snippet_around(body: str, term: str, width: int = 80) -> str:
+    position = body.find(term)
+    if position < 0:
+        return body[:width]
+    start = max(0, position - width // 2)
+    end = position + len(term) + width // 2
+    return ("…" if start > 0 else "") + body[start:position] + f"[{term}]" + body[position + len(term):end] + (
+        "…" if end < len(body) else ""
+    )
+
+
+report_search_index = ReportSearchIndex()
+
+
+def get_audit_context(agent: Optional[Agent]) -> dict:
+    """
+    Returns the run/project/task tags of the audit an agent belongs to: the team session, and the `project`
+    and current plan item in the team's session_state (see SecurityAuditTeam.stream_team_audit).
+    """
+    if agent is None:
+        return {"run_id": None, "project": None, "task_id": None}
+    state = agent.team_session_state or agent.session_state or {}
+    items = state.get("audit_plan_items") or []
+    index = state.get("current_audit_item_index")
+    item = items[index] if isinstance(index, int) and 0 <= index < len(items) else None
+    return {
+        "run_id": agent.team_session_id or agent.session_id or state.get("current_session_id"),
+        "project": state.get("project"),
+        "task_id": item.get("task_id") if isinstance(item, dict) else None,
+    }
+
+
+def _format_hits(query: str, hits: List[SearchHit], elapsed_ms: float) -> str:
+    if not hits:
+        return f"No earlier reports or findings match '{query}'."
+    lines = [f"{len(hits)} result(s) for '{query}' ({elapsed_ms:.1f} ms):"]
+    for hit in hits:
+        tags = ", ".join(f"{k}={v}" for k, v in (("run", hit.run_id), ("stage", hit.stage), ("task", hit.task_id)) if v)
+        lines.append(f"- [{hit.kind}] {hit.title} ({tags}): {hit.snippet}")
+    return "\n".join(lines)
+
+
+def _search_audit_history(query: str, stage: Optional[str], limit: int) -> str:
+    started = time.perf_counter()
+    try:
+        hits = report_search_index.search(query, stage=stage, limit=limit)
+    except sqlite3.Error as e:
+        logger.error(f"Audit history search for '{query}' failed: {e}")
+        return f"Error searching audit history for '{query}': {str(e)}"
+    return _format_hits(query, hits, (time.perf_counter() - started) * 1000)
+
+
+@tool
+def search_audit_history(query: str, stage: Optional[str] = None, limit: int = 5) -> str:
+    """
+    Searches all earlier audit reports and findings (all runs) and returns ranked snippets.
+    Use it to check whether an issue or component was analysed before, then read the report if relevant.
+
+    Args:
+        query (str): Search terms, e.g. 'UmsAdminController SQL注入' or 'jwt secret'. All terms must match.
+        stage (str, optional): Restrict to 'environment', 'planning', 'deep_dive' or 'aggregation'.
+        limit (int): Maximum number of results. Defaults to 5.
+
+    Returns:
+        str: Ranked results with report names, run/task tags and highlighted snippets.
+    """
+    return _search_audit_history(query, stage, limit)
+
+
+@tool(name="search_audit_history")
+async def asearch_audit_history(query: str, stage: Optional[str] = None, limit: int = 5) -> str:
+    """
+    Searches all earlier audit reports and findings (all runs) and returns ranked snippets.
+    Use it to check whether an issue or component was analysed before, then read the report if relevant.
+
+    Args:
+        query (str): Search terms, e.g. 'UmsAdminController SQL注入' or 'jwt secret'. All terms must match.
+        stage (str, optional): Restrict to 'environment', 'planning', 'deep_dive' or 'aggregation'.
+        limit (int): Maximum number of results. Defaults to 5.
+
+    Returns:
+        str: Ranked results with report names, run/task tags and highlighted snippets.
+    """
+    return await asyncio.to_thread(_search_audit_history, query, stage, limit)
+
+
+def get_report_search_tools(use_async: bool = True) -> List[Function]:
+    """Returns the history search tool matching how the agent is run: `arun` -> async, `run` -> sync."""
+    return [asearch_audit_history] if use_async else [search_audit_history]
+
+
+if __name__ == "__main__":
+    index = ReportSearchIndex(db_path="/tmp/report_search_demo.db")
+    print(f"Indexed {index.index_existing_reports(os.path.join(os.path.dirname(__file__), '..', 'shared_reports'))} report(s).")
+    for demo_query in ["mall-admin", "SQL注入", "nginx proxy_pass", "越权"]:
+        started = time.perf_counter()
+        results = index.search(demo_query, limit=3)
+        print(_format_hits(demo_query, results, (time.perf_counter() - started) * 1000))
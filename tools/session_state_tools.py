@@ -1,121 +1,409 @@
-from typing import Any, Dict, Optional
-from agno.agent import Agent # Assuming Agent is the type passed when tool is bound
+import copy
+import json
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Type, Union
 
-class ReadSessionStateTool:
-    """Tool to read a value from the team's session_state."""
-    name: str = "ReadSessionStateTool"
-    description: str = "Reads a value from the team's shared session_state. Args: key (str)."
+from agno.team import Team
+from agno.tools import Function, tool
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
-    def __init__(self, agent: Optional[Agent] = None):
-        self.agent = agent
+from utils.log import logger
 
-    def __call__(self, key: str) -> Any:
-        if self.agent is None or not hasattr(self.agent, 'team_session_state'):
-            return "Error: Tool not properly bound to an agent with team_session_state or agent is None."
-        
+PathPart = Union[str, int]
+
+# `audit_plan_items[3].status`, `audit_plan_items.3.status` and `audit_plan_items.[3].status` are equivalent.
+_PATH_TOKEN_RE = re.compile(r"\[(-?\d+)\]|([^.\[\]]+)")
+
+
+class SessionStateError(Exception):
+    """Raised when a session state operation cannot be applied. Transactions leave the state unchanged."""
+
+
+class CompareAndSwapFailed(SessionStateError):
+    """Raised when a compare_and_swap finds a value other than the expected one."""
+
+
+class AuditPlanItem(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    task_id: Optional[str] = None
+    raw_task_line: str
+    description: str
+    status: Literal["pending", "in_progress", "completed", "failed"] = "pending"
+
+
+class AuditSessionState(BaseModel):
+    """Schema of the Security Audit Team's session_state. Unknown keys are allowed and not validated."""
+
+    model_config = ConfigDict(extra="allow")
+
+    audit_plan_items: List[AuditPlanItem] = Field(default_factory=list)
+    current_audit_item_index: int = Field(0, ge=0)
+    aggregated_findings: str = ""
+
+
+def parse_state_path(path: str) -> List[PathPart]:
+    """Splits a path like `audit_plan_items[3].status` into `['audit_plan_items', 3, 'status']`."""
+    parts: List[PathPart] = []
+    for index, name in _PATH_TOKEN_RE.findall(path.strip()):
+        if index:
+            parts.append(int(index))
+        elif name.lstrip("-").isdigit():
+            parts.append(int(name))
+        else:
+            parts.append(name)
+    if not parts or not isinstance(parts[0], str):
+        raise SessionStateError(f"Invalid session state path '{path}': it must start with a key.")
+    return parts
+
+
+_MISSING = object()
+
+
+def _get_at(root: Any, parts: List[PathPart], path: str) -> Any:
+    node = root
+    for part in parts:
         try:
-            value = self.agent.team_session_state.get(key)
-            if value is None:
-                # To differentiate between a key existing with value None vs key not existing
-                if key not in self.agent.team_session_state:
-                    return f"Error: Key '{key}' not found in session_state."
-            return value
-        except Exception as e:
-            return f"Error reading session_state key '{key}': {str(e)}"
-
-class UpdateSessionStateTool:
-    """Tool to update a value in the team's session_state."""
-    name: str = "UpdateSessionStateTool"
-    description: str = (
-        "Updates a value in the team's shared session_state. "
-        "Args: key (str), value (any), action (str, optional: 'set', 'append', 'increment'). Default action is 'set'."
-    )
+            node = node[part]
+        except (KeyError, IndexError, TypeError):
+            return _MISSING
+    return node
+
+
+def _parent_of(root: Dict[str, Any], parts: List[PathPart], path: str, create: bool) -> Any:
+    node: Any = root
+    for part in parts[:-1]:
+        try:
+            node = node[part]
+        except KeyError:
+            if not create:
+                raise SessionStateError(f"Path '{path}' does not exist.")
+            node[part] = {}
+            node = node[part]
+        except (IndexError, TypeError):
+            raise SessionStateError(f"Path '{path}' does not exist.")
+    return node
+
+
+def _json_pointer(parts: List[PathPart]) -> str:
+    return "".join("/" + str(p).replace("~", "~0").replace("/", "~1") for p in parts)
+
+
+def _patch_for(op: str, parts: List[PathPart], current: Any, new_value: Any, appended: Any = None) -> Dict[str, Any]:
+    """The JSON Patch (RFC 6902) operation recording one change, sized by the change rather than the value."""
+    pointer = _json_pointer(parts)
+    if op == "delete":
+        return {"op": "remove", "path": pointer}
+    if op == "append" and current is not _MISSING:
+        return {"op": "add", "path": f"{pointer}/-", "value": appended}
+    if isinstance(current, str) and isinstance(new_value, str) and current and new_value.startswith(current):
+        # Non-standard: growing strings such as `aggregated_findings` only store the added text.
+        return {"op": "append_text", "path": pointer, "value": new_value[len(current):]}
+    return {"op": "add" if current is _MISSING else "replace", "path": pointer, "value": new_value}
+
+
+def apply_state_patch(state: Dict[str, Any], patch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Applies patch operations produced by SessionStateStore to `state` in place and returns it."""
+    for operation in patch:
+        parts: List[PathPart] = [
+            int(p) if p.lstrip("-").isdigit() else p.replace("~1", "/").replace("~0", "~")
+            for p in operation["path"].split("/")[1:]
+        ]
+        if parts[-1] == "-":
+            _get_at(state, parts[:-1], operation["path"]).append(operation["value"])
+            continue
+        parent = _parent_of(state, parts, operation["path"], create=True)
+        if operation["op"] == "remove":
+            del parent[parts[-1]]
+        elif operation["op"] == "append_text":
+            parent[parts[-1]] += operation["value"]
+        elif isinstance(parent, list) and operation["op"] == "add" and parts[-1] == len(parent):
+            parent.append(operation["value"])
+        else:
+            parent[parts[-1]] = operation["value"]
+    return state
+
+
+class SessionStateStore:
+    """
+    Typed, transactional access to a session_state dict.
+
+    Values are addressed by path (`audit_plan_items[3].status`), so a single item can be updated without
+    rewriting its list. `transaction` applies several operations all-or-nothing: they run on a copy of the
+    touched keys, the result is validated against the schema, and only then written back. All stores share one
+    process-wide lock, because Team members hold references to the same state dict.
+
+    Operations (also the `op` field of transaction steps):
+        set(path, value), append(path, value), increment(path, value=1), delete(path),
+        compare_and_swap(path, expected, value) - sets only if the current value equals `expected`.
+    """
+
+    _lock = threading.RLock()
+
+    def __init__(
+        self,
+        state: Dict[str, Any],
+        schema: Optional[Type[BaseModel]] = AuditSessionState,
+        on_commit: Optional[Callable[[List[Dict[str, Any]], Dict[str, Any]], None]] = None,
+    ):
+        self.state = state
+        self.schema = schema
+        # Called under the lock with the committed patch and the new state, e.g. to persist the patch.
+        self.on_commit = on_commit
+
+    @contextmanager
+    def locked(self) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            yield self.state
+
+    def get(self, path: str, default: Any = None) -> Any:
+        with self._lock:
+            value = _get_at(self.state, parse_state_path(path), path)
+            return default if value is _MISSING else copy.deepcopy(value)
 
-    def __init__(self, agent: Optional[Agent] = None):
-        self.agent = agent
+    def set(self, path: str, value: Any) -> Any:
+        return self.transaction([{"op": "set", "path": path, "value": value}])[0]
 
-    def __call__(self, key: str, value: Any, action: str = "set") -> str:
-        if self.agent is None or not hasattr(self.agent, 'team_session_state'):
-            return "Error: Tool not properly bound to an agent with team_session_state or agent is None."
+    def append(self, path: str, value: Any) -> Any:
+        return self.transaction([{"op": "append", "path": path, "value": value}])[0]
 
-        state = self.agent.team_session_state
+    def increment(self, path: str, value: Union[int, float] = 1) -> Any:
+        return self.transaction([{"op": "increment", "path": path, "value": value}])[0]
 
+    def delete(self, path: str) -> Any:
+        return self.transaction([{"op": "delete", "path": path}])[0]
+
+    def compare_and_swap(self, path: str, expected: Any, value: Any) -> bool:
+        """Sets `path` to `value` if it currently equals `expected`. Returns False (and changes nothing) otherwise."""
+        try:
+            self.transaction([{"op": "compare_and_swap", "path": path, "expected": expected, "value": value}])
+        except CompareAndSwapFailed:
+            return False
+        return True
+
+    def transaction(self, operations: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Applies all operations atomically and returns the new value at each operation's path.
+        Raises SessionStateError (leaving the state untouched) if any operation or the schema validation fails.
+        """
+        with self._lock:
+            parsed = []
+            for step in operations:
+                if "path" not in step or "op" not in step:
+                    raise SessionStateError(f"Each operation needs 'op' and 'path', got {step}.")
+                parsed.append((step, parse_state_path(step["path"])))
+
+            touched = {parts[0] for _, parts in parsed}
+            draft = {key: copy.deepcopy(self.state[key]) for key in touched if key in self.state}
+            patch: List[Dict[str, Any]] = []
+            results = [self._apply(draft, step, parts, patch) for step, parts in parsed]
+            self._validate({**self.state, **draft}, touched)
+
+            for key in touched:
+                if key in draft:
+                    self.state[key] = draft[key]
+                else:
+                    self.state.pop(key, None)
+            if self.on_commit is not None:
+                try:
+                    self.on_commit(patch, self.state)
+                except Exception as e:
+                    # The in-memory state stays authoritative for the running session.
+                    logger.warning(f"Could not persist session_state patch: {e}")
+            return results
+
+    @staticmethod
+    def _apply(draft: Dict[str, Any], step: Dict[str, Any], parts: List[PathPart], patch: List[Dict[str, Any]]) -> Any:
+        op, path, value = step["op"], step["path"], step.get("value")
+        if op == "delete":
+            parent = _parent_of(draft, parts, path, create=False)
+            try:
+                del parent[parts[-1]]
+            except (KeyError, IndexError, TypeError):
+                raise SessionStateError(f"Path '{path}' does not exist.")
+            patch.append(_patch_for(op, parts, None, None))
+            return None
+
+        parent = _parent_of(draft, parts, path, create=True)
+        current = original = _get_at(parent, parts[-1:], path)
+        if op == "set":
+            new_value = value
+        elif op == "append":
+            if current is _MISSING:
+                current = []
+            if not isinstance(current, list):
+                raise SessionStateError(f"Cannot append: '{path}' is not a list (type: {type(current).__name__}).")
+            new_value = current + [value]
+        elif op == "increment":
+            value = 1 if value is None else value
+            current = 0 if current is _MISSING else current
+            if not isinstance(current, (int, float)) or isinstance(current, bool):
+                raise SessionStateError(f"Cannot increment: '{path}' is not a number (value: {current!r}).")
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise SessionStateError(f"Cannot increment '{path}' by non-number {value!r}.")
+            new_value = current + value
+        elif op == "compare_and_swap":
+            current = None if current is _MISSING else current
+            if current != step.get("expected"):
+                raise CompareAndSwapFailed(
+                    f"compare_and_swap failed on '{path}': expected {step.get('expected')!r}, found {current!r}."
+                )
+            new_value = value
+        else:
+            raise SessionStateError(
+                f"Unknown operation '{op}'. Valid operations: set, append, increment, delete, compare_and_swap."
+            )
+
+        try:
+            parent[parts[-1]] = new_value
+        except (IndexError, TypeError):
+            raise SessionStateError(f"Path '{path}' does not exist.")
+        patch.append(_patch_for(op, parts, original, new_value, appended=value))
+        return copy.deepcopy(new_value)
+
+    def _validate(self, candidate: Dict[str, Any], touched: set) -> None:
+        if self.schema is None:
+            return
+        try:
+            self.schema.model_validate(candidate)
+        except ValidationError as e:
+            errors = [err for err in e.errors() if err["loc"] and err["loc"][0] in touched] or e.errors()
+            details = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in errors)
+            raise SessionStateError(f"Session state validation failed: {details}")
+
+
+def get_session_state_store(
+    agent: Any, schema: Optional[Type[BaseModel]] = AuditSessionState, journal: Optional[Any] = None
+) -> SessionStateStore:
+    """
+    Returns a store over the state an agent or team shares: a member's `team_session_state`, else `session_state`.
+    Every commit is passed to `journal.record(session_id, patch, state)` if a journal is given.
+    """
+    state = getattr(agent, "team_session_state", None)
+    if state is None:
+        if agent.session_state is None:
+            agent.session_state = {}
+        state = agent.session_state
+
+    on_commit: Optional[Callable[[List[Dict[str, Any]], Dict[str, Any]], None]] = None
+    # A team run with an explicit session_id keeps it only in its state, not in `session_id`.
+    session_id = getattr(agent, "team_session_id", None) or agent.session_id or state.get("current_session_id")
+    if journal is not None and session_id:
+
+        def record(patch: List[Dict[str, Any]], new_state: Dict[str, Any]) -> None:
+            journal.record(session_id, patch, new_state)
+
+        on_commit = record
+    return SessionStateStore(state, schema=schema, on_commit=on_commit)
+
+
+def _format_state_value(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def get_session_state_tools(journal: Optional[Any] = None) -> List[Function]:
+    """
+    Returns the path-addressed, transactional session_state tools of one team, journaling its commits to
+    `journal` (e.g. a SessionStateJournal) if given.
+
+    agno binds the team using a tool to its Function object (the `team` argument), so every call returns new
+    Functions, as `get_plan_tools` does; shared ones would act on the state of whichever team bound them last.
+    """
+
+    @tool
+    def read_session_state(path: str, team: Team) -> str:
+        """
+        Reads a value from the team's shared session_state.
+
+        Args:
+            path (str): A key or a path into it, e.g. 'current_audit_item_index' or 'audit_plan_items[3].status'.
+
+        Returns:
+            str: The value as JSON, or an error message.
+        """
+        try:
+            value = get_session_state_store(team).get(path, _MISSING)
+        except SessionStateError as e:
+            return f"Error: {str(e)}"
+        if value is _MISSING:
+            return f"Error: Path '{path}' not found in session_state."
+        return _format_state_value(value)
+
+    @tool
+    def update_session_state(
+        path: str, team: Team, value: Any = None, action: str = "set", expected: Any = None
+    ) -> str:
+        """
+        Updates one value in the team's shared session_state. Address single list items and fields directly,
+        e.g. path='audit_plan_items[3].status', value='completed' - never rewrite a whole list to change one item.
+
+        Args:
+            path (str): A key or a path into it, e.g. 'aggregated_findings' or 'audit_plan_items[3].status'.
+            value (Any): The new value, the item to append, or the amount to increment by.
+            action (str): 'set' (default), 'append', 'increment', 'delete' or 'compare_and_swap'.
+            expected (Any): For 'compare_and_swap' only: the value the path must currently hold.
+
+        Returns:
+            str: The new value, or an error message (the state is then unchanged).
+        """
+        step: Dict[str, Any] = {"op": action, "path": path, "value": value}
+        if action == "compare_and_swap":
+            step["expected"] = expected
+        try:
+            new_value = get_session_state_store(team, journal=journal).transaction([step])[0]
+        except SessionStateError as e:
+            return f"Error: {str(e)}"
+        return f"Session state '{path}' updated ({action}). New value: {_format_state_value(new_value)}"
+
+    @tool
+    def session_state_transaction(operations: List[Dict[str, Any]], team: Team) -> str:
+        """
+        Applies several session_state updates all-or-nothing: if any operation fails, none is applied.
+
+        Args:
+            operations (List[Dict[str, Any]]): Steps like {"op": "set", "path": "audit_plan_items[3].status",
+                "value": "completed"}. `op` is 'set', 'append', 'increment', 'delete' or 'compare_and_swap'
+                (which also needs "expected").
+
+        Returns:
+            str: The new value at each path, or an error message (the state is then unchanged).
+        """
         try:
-            if action == "set":
-                state[key] = value
-                return f"Session state key '{key}' set successfully."
-            elif action == "append":
-                if key not in state:
-                    state[key] = [] # Initialize as list if key doesn't exist
-                if not isinstance(state[key], list):
-                    return f"Error: Cannot append. Key '{key}' in session_state is not a list (current type: {type(state[key])})."
-                state[key].append(value)
-                return f"Value appended to session_state key '{key}' successfully."
-            elif action == "increment":
-                if key not in state:
-                    # Initialize to 0 if key doesn't exist, then increment
-                    state[key] = 0
-                
-                current_val = state.get(key, 0) # Default to 0 if somehow still not there, or if value is None
-                if not isinstance(current_val, (int, float)):
-                    return f"Error: Cannot increment. Key '{key}' in session_state is not a number (current value: {current_val}, type: {type(current_val)})."
-                if not isinstance(value, (int, float)):
-                    return f"Error: Cannot increment. Provided value '{value}' is not a number (type: {type(value)})."
-                
-                state[key] = current_val + value
-                return f"Session state key '{key}' incremented by {value} successfully. New value: {state[key]}."
-            else:
-                return f"Error: Unknown action '{action}'. Valid actions are 'set', 'append', 'increment'."
-        except Exception as e:
-            return f"Error updating session_state key '{key}' with action '{action}': {str(e)}"
-
-# Example Usage (conceptual, not runnable directly here)
+            results = get_session_state_store(team, journal=journal).transaction(operations)
+        except SessionStateError as e:
+            return f"Error: Transaction rolled back: {str(e)}"
+        lines = [f"Transaction committed ({len(results)} operations):"]
+        lines += [
+            f"- {step.get('op')} {step.get('path')} -> {_format_state_value(r)}" for step, r in zip(operations, results)
+        ]
+        return "\n".join(lines)
+
+    return [read_session_state, update_session_state, session_state_transaction]
+
+
 if __name__ == "__main__":
-    # This is how Agno might bind the agent when the tool is part of an Agent's tool list
-    # and the agent (here, the Team Leader) calls it.
-    
-    class MockAgent:
-        def __init__(self):
-            self.team_session_state: Dict[str, Any] = {
-                "existing_list": [1, 2],
-                "existing_number": 10,
-                "name": "Test Session"
-            }
-
-    mock_leader_agent = MockAgent()
-
-    # Tool Instantiation (Agno does this internally when Agent is initialized with tools)
-    # In our workflow, we do: update_state_tool = UpdateSessionStateTool()
-    # Agno then likely does something like: update_state_tool.agent = leader_agent_instance
-
-    read_tool = ReadSessionStateTool(agent=mock_leader_agent)
-    update_tool = UpdateSessionStateTool(agent=mock_leader_agent)
-
-    print("--- Read Operations ---")
-    print(f"Reading 'name': {read_tool(key='name')}")
-    print(f"Reading 'non_existent_key': {read_tool(key='non_existent_key')}")
-    print(f"Reading 'existing_list': {read_tool(key='existing_list')}")
-    
-    print("\n--- Update Operations ---")
-    # Set
-    print(update_tool(key="new_key", value="new_value", action="set"))
-    print(f"State for 'new_key': {read_tool('new_key')}")
-    print(update_tool(key="name", value="Updated Test Session", action="set"))
-    print(f"State for 'name': {read_tool('name')}")
-
-    # Append
-    print(update_tool(key="existing_list", value=3, action="append"))
-    print(f"State for 'existing_list': {read_tool('existing_list')}")
-    print(update_tool(key="another_list", value="a", action="append")) # Creates new list
-    print(f"State for 'another_list': {read_tool('another_list')}")
-    print(update_tool(key="name", value="x", action="append")) # Error: name is not a list
-
-    # Increment
-    print(update_tool(key="existing_number", value=5, action="increment"))
-    print(f"State for 'existing_number': {read_tool('existing_number')}")
-    print(update_tool(key="new_counter", value=1, action="increment")) # Creates new counter
-    print(f"State for 'new_counter': {read_tool('new_counter')}")
-    print(update_tool(key="existing_list", value=1, action="increment")) # Error: existing_list is not a number
-    print(update_tool(key="existing_number", value="test", action="increment")) # Error: value "test" is not a number
-
-    print("\nFinal session state:", mock_leader_agent.team_session_state) 
\ No newline at end of file
+    store = SessionStateStore(
+        {
+            "audit_plan_items": [
+                {"raw_task_line": "- [ ] A", "description": "A", "status": "pending"},
+                {"raw_task_line": "- [ ] B", "description": "B", "status": "pending"},
+            ],
+            "current_audit_item_index": 0,
+            "aggregated_findings": "",
+        }
+    )
+    print(store.set("audit_plan_items[1].status", "completed"))
+    print(store.compare_and_swap("current_audit_item_index", expected=0, value=1))
+    print(store.compare_and_swap("current_audit_item_index", expected=0, value=2))  # stale: False
+    try:
+        store.transaction(
+            [
+                {"op": "set", "path": "audit_plan_items[0].status", "value": "completed"},
+                {"op": "set", "path": "current_audit_item_index", "value": -1},  # rejected by the schema
+            ]
+        )
+    except SessionStateError as e:
+        print(f"Rolled back: {e}")
+    print("Store state:", store.state)
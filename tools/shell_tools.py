@@ -0,0 +1,73 @@
+import asyncio
+import os
+import weakref
+from typing import List
+
+from agno.tools import Toolkit
+from agno.tools.shell import ShellTools
+
+from utils.log import logger
+
+# Shell commands that may run at the same time per event loop, across all agents; further commands queue.
+SHELL_SUBPROCESS_POOL_SIZE = int(os.getenv("SHELL_SUBPROCESS_POOL_SIZE", "8"))
+SHELL_COMMAND_TIMEOUT_S = float(os.getenv("SHELL_COMMAND_TIMEOUT_S", "120"))
+
+_subprocess_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_subprocess_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _subprocess_slots.get(loop)
+    if slots is None:
+        slots = _subprocess_slots[loop] = asyncio.Semaphore(SHELL_SUBPROCESS_POOL_SIZE)
+    return slots
+
+
+class AsyncShellTools(Toolkit):
+    """
+    ShellTools for agents run with `arun`: commands run as asyncio subprocesses instead of blocking a thread
+    each, bounded by SHELL_SUBPROCESS_POOL_SIZE, so the shell commands of one model turn run concurrently.
+    Same tool name, arguments and output as agno's ShellTools, so agent instructions apply unchanged.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(name="shell_tools", **kwargs)
+        self.register(self.run_shell_command)
+
+    async def run_shell_command(self, args: List[str], tail: int = 100) -> str:
+        """Runs a shell command and returns the output or error.
+
+        Args:
+            args (List[str]): The command to run as a list of strings.
+            tail (int): The number of lines to return from the output.
+        Returns:
+            str: The output of the command.
+        """
+        try:
+            logger.info(f"Running shell command: {args}")
+            async with _get_subprocess_slots():
+                process = await asyncio.create_subprocess_exec(
+                    *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=SHELL_COMMAND_TIMEOUT_S)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    return f"Error: command timed out after {SHELL_COMMAND_TIMEOUT_S:.0f}s"
+                except asyncio.CancelledError:
+                    # The run was cancelled: do not leave the command running.
+                    process.kill()
+                    raise
+            if process.returncode != 0:
+                return f"Error: {stderr.decode('utf-8', errors='replace')}"
+            # return only the last n lines of the output
+            return "\n".join(stdout.decode("utf-8", errors="replace").split("\n")[-tail:])
+        except Exception as e:
+            logger.warning(f"Failed to run shell command: {e}")
+            return f"Error: {e}"
+
+
+def get_shell_tools(use_async: bool = True) -> Toolkit:
+    """Returns the shell toolkit matching how the agent is run: `arun` -> async, `run` -> sync."""
+    return AsyncShellTools() if use_async else ShellTools()
@@ -90,13 +90,13 @@ def get_agent_name_from_id(agent_id: str) -> str:
     if DEEP_DIVE_SECURITY_AUDITOR_AGENT_ID in agent_id: return "Deep Dive Security Auditor Agent"
     return agent_id # Fallback to raw ID
 
-async def generate_team_workflow_output_stream(team_instance: SecurityAuditTeam, initial_message: str, images: Optional[List[Image]] = None):
+async def generate_team_workflow_output_stream(team_instance: SecurityAuditTeam, initial_message: str, images: Optional[List[Image]] = None, project: Optional[str] = None):
     st.session_state.team_workflow_running = True
     st.session_state.team_workflow_content = "" # Reset content for new run
     accumulated_text_for_placeholder = ""
     
     try:
-        async for response_chunk in team_instance.stream_team_audit(initial_user_query=initial_message, images=images): # Pass images if team supports
+        async for response_chunk in team_instance.stream_team_audit(initial_user_query=initial_message, images=images, project=project): # Pass images if team supports
             chunk_to_display = ""
             agent_name = "Unknown Agent/Team"
             if response_chunk and hasattr(response_chunk, 'run_id') and response_chunk.run_id:
@@ -210,7 +210,7 @@ if st.button("Run Security Audit Team Workflow", key="run_audit_team_workflow"):
             initial_message_to_team += " Please also consider any provided images in your analysis for the initial environment perception stage."
         
         async def run_and_update_team_ui():
-            async for _ in generate_team_workflow_output_stream(team, initial_message_to_team, agno_images):
+            async for _ in generate_team_workflow_output_stream(team, initial_message_to_team, agno_images, project=project_path):
                 pass 
             # The st.rerun() in the finally block of the generator will handle updating the page
 
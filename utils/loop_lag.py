@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import List, Optional
+
+
+class EventLoopLagMonitor:
+    """
+    Measures event-loop lag: how late a periodic `asyncio.sleep(interval_s)` wakes up.
+    Any synchronous work on the loop (blocking file I/O, CPU-bound parsing) shows up as lag.
+
+    Usage:
+        async with EventLoopLagMonitor() as monitor:
+            ...
+        print(monitor.max_lag_ms, monitor.p99_lag_ms)
+    """
+
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.lags_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._expected_wakeup: Optional[float] = None
+
+    async def _probe(self) -> None:
+        while True:
+            self._expected_wakeup = time.perf_counter() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self.lags_ms.append(max(0.0, (time.perf_counter() - self._expected_wakeup) * 1000))
+            self._expected_wakeup = None
+
+    async def __aenter__(self) -> "EventLoopLagMonitor":
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        # Let the probe arm its first timer before the measured code runs.
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        # A probe still waiting past its deadline means the loop was blocked until now.
+        if self._expected_wakeup is not None:
+            self.lags_ms.append(max(0.0, (time.perf_counter() - self._expected_wakeup) * 1000))
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def max_lag_ms(self) -> float:
+        return max(self.lags_ms, default=0.0)
+
+    @property
+    def p99_lag_ms(self) -> float:
+        if not self.lags_ms:
+            return 0.0
+        ordered = sorted(self.lags_ms)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
@@ -0,0 +1,40 @@
+import asyncio
+import itertools
+import os
+import threading
+from typing import List
+
+# Event loop threads for workflows and teams started by the API.
+AGENT_LOOP_POOL_SIZE = int(os.getenv("AGENT_LOOP_POOL_SIZE", "2"))
+
+
+class EventLoopPool:
+    """
+    Event loops on dedicated threads for long-running agent work (audits), separate from the API's loop.
+
+    agno does synchronous work between awaits — tool schema generation for every run, debug logging, storage —
+    which on the API loop would stall every other request on the worker for as long as it takes. On a pool
+    loop it only delays the audits sharing that loop. Work is assigned to the loops round-robin.
+    """
+
+    def __init__(self, size: int = 2, name: str = "agent-loop"):
+        self.size = size
+        self.name = name
+        self._loops: List[asyncio.AbstractEventLoop] = []
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def _start(self) -> None:
+        for i in range(self.size):
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name=f"{self.name}-{i}", daemon=True).start()
+            self._loops.append(loop)
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if not self._loops:
+                self._start()
+            return self._loops[next(self._next) % self.size]
+
+
+agent_loop_pool = EventLoopPool(size=AGENT_LOOP_POOL_SIZE)
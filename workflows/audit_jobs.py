@@ -0,0 +1,402 @@
+import asyncio
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy import func, insert, or_, select, update
+
+from core.run_events import RunEventLog, SpilledRunEventLog, run_event_logs
+from core.stream_events import dumps, stream_events
+from db.engine import create_engine_for_url, create_local_tables
+from db.tables import AuditJob
+from tools.findings_tools import findings_store
+from tools.report_repository_tools import SHARED_REPORTS_DIR
+from utils.log import logger
+
+# Postgres URL in deployments; a local SQLite file otherwise.
+AUDIT_JOBS_DB_URL = os.getenv("AUDIT_JOBS_DB_URL", "sqlite:////app/shared_reports/.state/audit_jobs.db")
+# Audits that run at the same time, across all API processes: audits share the reports directory and plan
+# file, so more than one is only safe once they write to separate directories. Each process starts this many
+# workers; a worker only claims a job while fewer are running.
+AUDIT_JOB_WORKERS = int(os.getenv("AUDIT_JOB_WORKERS", "1"))
+# How often idle workers look for jobs queued by other API processes.
+AUDIT_JOB_POLL_S = float(os.getenv("AUDIT_JOB_POLL_S", "2"))
+# How often a process records that its jobs are alive and looks for cancel requests sent to other processes.
+AUDIT_JOB_HEARTBEAT_S = float(os.getenv("AUDIT_JOB_HEARTBEAT_S", "5"))
+# A running job without a heartbeat for this long is marked `interrupted`: the process running it is gone.
+AUDIT_JOB_STALE_S = float(os.getenv("AUDIT_JOB_STALE_S", "60"))
+# Postgres advisory lock that serializes job claims.
+_CLAIM_LOCK_KEY = 0x617564697421
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class _RunningJob:
+    def __init__(self, job_id: str, loop: asyncio.AbstractEventLoop):
+        self.job_id = job_id
+        self.loop = loop
+        self.team: Any = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_requested = False
+        # Findings counted so far, and the offset of the findings stream to count on from.
+        self.findings = 0
+        self.findings_offset = 0
+        self.findings_lock = threading.Lock()
+
+
+class AuditJobManager:
+    """
+    Runs security audits as background jobs, decoupled from the HTTP requests that start and watch them.
+
+    Jobs are persisted in the `audit_jobs` table and executed by worker threads, each with its own event loop.
+    At most `workers` jobs run at a time across all API processes — the number of open connections plays no
+    part. Clients poll status, progress and per-task results, or attach to the job's
+    numbered event stream and resume it after a disconnect with `Last-Event-ID`; the audit keeps running
+    either way.
+
+    The table is the queue, shared by all API processes: a worker claims a queued job with a conditional
+    update, so exactly one runs it, and its process then records a heartbeat for it. Cancel requests are
+    flags in the table that the owning process picks up. Running jobs whose heartbeat stopped (their process
+    is gone) are marked `interrupted` and can be resumed, which continues the team session from its
+    journaled session_state.
+    """
+
+    def __init__(self, db_url: str = AUDIT_JOBS_DB_URL, workers: int = AUDIT_JOB_WORKERS):
+        self.engine = create_engine_for_url(db_url)
+        create_local_tables(self.engine, [AuditJob.__table__])
+        self.workers = workers
+        # Identifies this process in the `owner` column of the jobs it runs.
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Wakes an idle worker when this process queues a job; jobs queued elsewhere are found by polling.
+        self._wakeup: "queue.Queue[None]" = queue.Queue()
+        self._running: Dict[str, _RunningJob] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        interrupted = self._interrupt_stale()
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"audit-job-worker-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat_loop, name="audit-job-heartbeat", daemon=True).start()
+        logger.info(
+            f"Audit job manager {self.worker_id} started with {self.workers} workers; {interrupted} jobs interrupted."
+        )
+
+    # --- Job records ---
+
+    def _set(self, job_id: str, **values: Any) -> None:
+        """Updates a job of this process; no-op once another process took it over (it was interrupted and resumed)."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(AuditJob).where(AuditJob.job_id == job_id, AuditJob.owner == self.worker_id).values(**values)
+            )
+
+    def _transition(self, job_id: str, from_statuses: tuple, **values: Any) -> bool:
+        """Updates the job only if its status is one of `from_statuses`; False if another request got there first."""
+        with self.engine.begin() as conn:
+            return conn.execute(
+                update(AuditJob).where(AuditJob.job_id == job_id, AuditJob.status.in_(from_statuses)).values(**values)
+            ).rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(select(*AuditJob.__table__.c).where(AuditJob.job_id == job_id)).first()
+        return dict(row._mapping) if row is not None else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = select(*AuditJob.__table__.c).order_by(AuditJob.created_at.desc()).limit(limit)
+        if status is not None:
+            query = query.where(AuditJob.status == status)
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(query)]
+
+    def submit(
+        self, project_path: str, model_id: Optional[str] = None, team_leader_model_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            conn.execute(
+                insert(AuditJob).values(
+                    job_id=job_id,
+                    status="queued",
+                    project_path=project_path,
+                    initial_message=f"Please perform a security audit of the project at: {project_path}",
+                    model_id=model_id,
+                    team_leader_model_id=team_leader_model_id,
+                    session_id=f"audit-job-{job_id}",
+                    created_at=_utcnow(),
+                )
+            )
+        self._wakeup.put(None)
+        return self.get(job_id)
+
+    def resume(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Queues an interrupted or failed job again; it continues in the same team session."""
+        requeued = self._transition(
+            job_id,
+            ("interrupted", "failed"),
+            status="queued",
+            error=None,
+            finished_at=None,
+            owner=None,
+            cancel_requested=False,
+        )
+        if requeued:
+            self._wakeup.put(None)
+        return self.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not self._transition(job_id, ("queued",), status="cancelled", finished_at=_utcnow()):
+            self._transition(job_id, ("running",), cancel_requested=True)
+            # A job of this process stops at once; one of another process at that process's next heartbeat.
+            self._cancel_local(job_id)
+        return self.get(job_id)
+
+    def _cancel_local(self, job_id: str) -> None:
+        with self._lock:
+            running = self._running.get(job_id)
+        if running is None or running.cancel_requested:
+            return
+        running.cancel_requested = True
+        if running.task is not None:
+            running.loop.call_soon_threadsafe(running.task.cancel)
+
+    # --- Progress and results ---
+
+    def _session_state(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            running = self._running.get(job["job_id"])
+        if running is not None and running.team is not None:
+            return dict(running.team.session_state or {})
+        from db.session_state_journal import get_session_state_journal
+
+        try:
+            return get_session_state_journal().load(job["session_id"]) or {}
+        except Exception as e:
+            logger.warning(f"Could not load session_state of job {job['job_id']}: {e}")
+            return {}
+
+    def progress(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        state = self._session_state(job)
+        items = state.get("audit_plan_items") or []
+        index = state.get("current_audit_item_index") or 0
+        completed = sum(1 for item in items if item.get("status") == "completed")
+        return {
+            "tasks_total": len(items),
+            "tasks_completed": completed,
+            "current_task": items[index].get("description") if index < len(items) else None,
+            "findings": self._count_findings(job),
+        }
+
+    def _count_findings(self, job: Dict[str, Any]) -> int:
+        with self._lock:
+            running = self._running.get(job["job_id"])
+        if running is None:
+            return findings_store.count_run(job["session_id"])[0]
+        # Progress of a running job is taken after every tool call: only the new findings are read.
+        with running.findings_lock:
+            new, running.findings_offset = findings_store.count_run(job["session_id"], running.findings_offset)
+            running.findings += new
+            return running.findings
+
+    def results(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Every plan task with its status and the findings recorded for it."""
+        findings = findings_store.read_run(job["session_id"])
+        tasks = []
+        for item in self._session_state(job).get("audit_plan_items") or []:
+            task_findings = [f.model_dump() for f in findings if item.get("task_id") and f.task_id == item["task_id"]]
+            tasks.append(
+                {
+                    "task_id": item.get("task_id"),
+                    "description": item.get("description"),
+                    "status": item.get("status"),
+                    "findings": task_findings,
+                }
+            )
+        planned = {t["task_id"] for t in tasks}
+        unplanned = [f.model_dump() for f in findings if f.task_id not in planned]
+        if unplanned:
+            tasks.append({"task_id": None, "description": "Findings of tasks not in the plan", "status": None, "findings": unplanned})
+        return tasks
+
+    # --- Live events ---
+
+    @staticmethod
+    def _events_run_id(job_id: str) -> str:
+        return f"audit-job-{job_id}"
+
+    def event_log(self, job_id: str) -> Optional[Union[RunEventLog, SpilledRunEventLog]]:
+        """
+        The numbered events of the job's current or last attempt, from the process that runs or ran it (read
+        from its spill file if that is another process); None while the job is queued or once they expired.
+        """
+        return run_event_logs.get_readable(self._events_run_id(job_id))
+
+    def _publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        log = run_event_logs.get(self._events_run_id(job_id))
+        if log is not None and not log.closed:
+            log.append(dumps(event))
+
+    def _finish_events(self, job_id: str, final_event: Dict[str, Any]) -> None:
+        self._publish(job_id, {**final_event, "final": True})
+        log = run_event_logs.get(self._events_run_id(job_id))
+        if log is not None:
+            log.close()
+
+    # --- Workers ---
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Takes the oldest queued job, unless `workers` jobs are running already. The update only applies while
+        the job is still queued, so of several workers (of any process) claiming it, exactly one gets it.
+        """
+        running = select(func.count()).select_from(AuditJob).where(AuditJob.status == "running").scalar_subquery()
+        while True:
+            with self.engine.begin() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    # Concurrent claims of different jobs would not see each other's running rows; serialize them.
+                    conn.execute(select(func.pg_advisory_xact_lock(_CLAIM_LOCK_KEY)))
+                if conn.execute(select(running)).scalar() >= self.workers:
+                    return None
+                job_id = conn.execute(
+                    select(AuditJob.job_id).where(AuditJob.status == "queued").order_by(AuditJob.created_at).limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+                now = _utcnow()
+                claimed = conn.execute(
+                    update(AuditJob)
+                    .where(AuditJob.job_id == job_id, AuditJob.status == "queued", running < self.workers)
+                    .values(status="running", owner=self.worker_id, heartbeat_at=now, started_at=now)
+                ).rowcount
+            if claimed:
+                return self.get(job_id)
+
+    def _worker(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.warning(f"Could not claim an audit job: {e}")
+                job = None
+            if job is None:
+                try:
+                    self._wakeup.get(timeout=AUDIT_JOB_POLL_S)
+                except queue.Empty:
+                    pass
+                continue
+            try:
+                loop.run_until_complete(self._run(job, loop))
+            except Exception as e:
+                logger.error(f"Audit job {job['job_id']} crashed its worker: {e}")
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            time.sleep(AUDIT_JOB_HEARTBEAT_S)
+            try:
+                self._heartbeat()
+            except Exception as e:
+                logger.warning(f"Audit job heartbeat failed: {e}")
+
+    def _heartbeat(self) -> None:
+        with self._lock:
+            job_ids = list(self._running)
+        if job_ids:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    update(AuditJob)
+                    .where(AuditJob.job_id.in_(job_ids), AuditJob.owner == self.worker_id)
+                    .values(heartbeat_at=_utcnow())
+                )
+                cancelled = conn.execute(
+                    select(AuditJob.job_id).where(AuditJob.job_id.in_(job_ids), AuditJob.cancel_requested.is_(True))
+                ).scalars().all()
+            for job_id in cancelled:
+                self._cancel_local(job_id)
+        self._interrupt_stale()
+
+    def _interrupt_stale(self) -> int:
+        """Marks running jobs whose process stopped sending heartbeats `interrupted`; returns how many."""
+        cutoff = _utcnow() - timedelta(seconds=AUDIT_JOB_STALE_S)
+        stale = or_(AuditJob.heartbeat_at.is_(None), AuditJob.heartbeat_at < cutoff)
+        with self.engine.begin() as conn:
+            return conn.execute(
+                update(AuditJob)
+                .where(AuditJob.status == "running", stale)
+                .values(status="interrupted", error="The server stopped while the job was running.", finished_at=_utcnow())
+            ).rowcount
+
+    async def _run(self, job: Dict[str, Any], loop: asyncio.AbstractEventLoop) -> None:
+        from workflows.security_audit_team import SecurityAuditTeam
+
+        job_id = job["job_id"]
+        running = _RunningJob(job_id, loop)
+        with self._lock:
+            self._running[job_id] = running
+        # Each attempt of a job gets a fresh event log.
+        run_event_logs.create(self._events_run_id(job_id))
+        self._publish(job_id, {"type": "status", "status": "running"})
+        status, result, error = "failed", None, None
+        try:
+            team_kwargs = {"db_path": os.path.join(SHARED_REPORTS_DIR, ".state", f"team_memory_{job_id}.sqlite")}
+            if job["model_id"]:
+                team_kwargs["model_id"] = job["model_id"]
+            if job["team_leader_model_id"]:
+                team_kwargs["team_leader_model_id"] = job["team_leader_model_id"]
+            os.makedirs(os.path.dirname(team_kwargs["db_path"]), exist_ok=True)
+            running.team = SecurityAuditTeam(**team_kwargs)
+            running.task = asyncio.current_task()
+            if running.cancel_requested:
+                raise asyncio.CancelledError
+            chunks = running.team.stream_team_audit(
+                job["initial_message"],
+                run_id=job["session_id"],
+                session_id=job["session_id"],
+                project=job["project_path"],
+            )
+            async for event in stream_events(chunks, progress=lambda: self.progress(job)):
+                self._publish(job_id, event)
+            status, result = "succeeded", running.team.run_response.content if running.team.run_response else None
+        except asyncio.CancelledError:
+            status = "cancelled"
+        except Exception as e:
+            logger.error(f"Audit job {job_id} failed: {e}")
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._set(
+                job_id,
+                status=status,
+                result=result if isinstance(result, (str, type(None))) else str(result),
+                error=error,
+                finished_at=_utcnow(),
+            )
+            self._finish_events(job_id, {"type": "status", "status": status, **({"error": error} if error else {})})
+
+
+_audit_job_manager: Optional[AuditJobManager] = None
+_audit_job_manager_lock = threading.Lock()
+
+
+def get_audit_job_manager() -> AuditJobManager:
+    """Returns the process-wide manager, started: jobs queued before a restart are picked up again."""
+    global _audit_job_manager
+    with _audit_job_manager_lock:
+        if _audit_job_manager is None:
+            _audit_job_manager = AuditJobManager()
+            _audit_job_manager.start()
+        return _audit_job_manager
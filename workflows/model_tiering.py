@@ -0,0 +1,308 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from textwrap import dedent
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from agno.agent import Agent
+from agno.models.base import Model
+from agno.run.response import RunResponse
+
+from core.model_call_metrics import model_call_scope
+from utils.log import logger
+
+# USD per million input/output tokens, e.g. '{"google/gemini-2.5-flash-preview-05-20": [0.15, 0.6]}'.
+# Tiers of models without a price report tokens and latency only.
+MODEL_PRICES_PER_MTOK: Dict[str, List[float]] = json.loads(os.getenv("MODEL_PRICES_PER_MTOK", "{}"))
+
+CASCADE_CONFIDENCE_RE = re.compile(r"CASCADE-CONFIDENCE:\s*(high|medium|low)", re.IGNORECASE)
+# Severity / impact statements of the deep-dive report template, e.g. "**Potential Impact (Contextualized):** High - ..."
+_HIGH_SEVERITY_RE = re.compile(
+    r"(severity|potential impact)[^\n:]*:\**\s*[\"'(]*\s*(critical|high)\b", re.IGNORECASE
+)
+
+CASCADE_DRAFT_INSTRUCTIONS = dedent("""\
+    **Cascade Draft:** You are producing a first-pass analysis that may be escalated to a stronger model.
+    End your response with exactly one line `CASCADE-CONFIDENCE: high`, `CASCADE-CONFIDENCE: medium` or
+    `CASCADE-CONFIDENCE: low`, rating how confident you are that your conclusion (vulnerable or not) is correct
+    and sufficiently evidenced. Use `low` whenever you could not verify a key code path or configuration.
+    """)
+
+
+def _model_key(model: Model) -> str:
+    return getattr(model, "id", None) or type(model).__name__
+
+
+class TierUsage:
+    """Accumulates runs, tokens, latency and (when priced) cost per role/tier, e.g. 'auditor/draft'."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, tier: str, model_id: str, run_response: Optional[RunResponse], latency_s: float) -> None:
+        metrics = (run_response.metrics if run_response is not None else None) or {}
+        input_tokens = sum(v for v in metrics.get("input_tokens", []) if isinstance(v, (int, float)))
+        output_tokens = sum(v for v in metrics.get("output_tokens", []) if isinstance(v, (int, float)))
+        price = MODEL_PRICES_PER_MTOK.get(model_id) or MODEL_PRICES_PER_MTOK.get(model_id.split("/", 1)[-1])
+        with self._lock:
+            entry = self._tiers.setdefault(
+                tier,
+                {"model_id": model_id, "runs": 0, "input_tokens": 0, "output_tokens": 0, "latency_s": 0.0, "cost_usd": None},
+            )
+            entry["runs"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["latency_s"] += latency_s
+            if price is not None:
+                cost = (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+                entry["cost_usd"] = (entry["cost_usd"] or 0.0) + cost
+
+    def increment(self, tier: str, counter: str) -> None:
+        with self._lock:
+            entry = self._tiers.setdefault(tier, {"runs": 0})
+            entry[counter] = entry.get(counter, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for tier, entry in self._tiers.items():
+                entry = dict(entry)
+                if entry.get("runs"):
+                    entry["avg_latency_s"] = round(entry.get("latency_s", 0.0) / entry["runs"], 3)
+                result[tier] = entry
+            return result
+
+    def format_summary(self) -> str:
+        lines = ["Model usage per tier:"]
+        for tier, entry in sorted(self.summary().items()):
+            cost = f"${entry['cost_usd']:.4f}" if entry.get("cost_usd") is not None else "n/a"
+            extra = "".join(f", {k}={entry[k]}" for k in ("escalations",) if k in entry)
+            lines.append(
+                f"- {tier} ({entry.get('model_id', '?')}): {entry.get('runs', 0)} runs, "
+                f"{entry.get('input_tokens', 0)} in / {entry.get('output_tokens', 0)} out tokens, "
+                f"avg {entry.get('avg_latency_s', 0)} s, cost {cost}{extra}"
+            )
+        return "\n".join(lines)
+
+
+class TieredAgent(Agent):
+    """
+    An Agent that reports the tokens, latency and cost of each of its runs under its `tier` label, and
+    attributes its model calls to that stage (and to the task returned by `task_label`, if given).
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        tier: str,
+        tier_usage: TierUsage,
+        task_label: Optional[Callable[[Agent], Optional[str]]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.tier = tier
+        self.tier_usage = tier_usage
+        self.task_label = task_label
+
+    def _call_scope(self, tier: str):
+        return model_call_scope(stage=tier, task=self.task_label(self) if self.task_label else None)
+
+    def run(self, *args: Any, stream: Optional[bool] = None, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        if not stream:
+            with self._call_scope(self.tier):
+                response = super().run(*args, stream=False, **kwargs)
+            self.tier_usage.record(self.tier, _model_key(self.model), self.run_response, time.perf_counter() - started)
+            return response
+        return self._recorded_stream(super().run(*args, stream=True, **kwargs), self.tier, started)
+
+    async def arun(self, *args: Any, stream: Optional[bool] = None, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        if not stream:
+            with self._call_scope(self.tier):
+                response = await super().arun(*args, stream=False, **kwargs)
+            self.tier_usage.record(self.tier, _model_key(self.model), self.run_response, time.perf_counter() - started)
+            return response
+        return self._arecorded_stream(await super().arun(*args, stream=True, **kwargs), self.tier, started)
+
+    def _recorded_stream(self, stream: Iterator[RunResponse], tier: str, started: float) -> Iterator[RunResponse]:
+        with self._call_scope(tier):
+            yield from stream
+        self.tier_usage.record(tier, _model_key(self.model), self.run_response, time.perf_counter() - started)
+
+    async def _arecorded_stream(self, stream: AsyncIterator[RunResponse], tier: str, started: float) -> AsyncIterator[RunResponse]:
+        with self._call_scope(tier):
+            async for chunk in stream:
+                yield chunk
+        self.tier_usage.record(tier, _model_key(self.model), self.run_response, time.perf_counter() - started)
+
+
+def should_escalate(run_response: Optional[RunResponse]) -> Tuple[bool, str]:
+    """Decides whether a draft deep-dive result needs the strong model. Returns (escalate, reason)."""
+    if run_response is None or not isinstance(run_response.content, str) or not run_response.content.strip():
+        return True, "empty draft"
+    content = run_response.content
+    confidence = CASCADE_CONFIDENCE_RE.findall(content)
+    if not confidence:
+        return True, "no confidence reported"
+    if confidence[-1].lower() == "low":
+        return True, "low confidence"
+    for tool_call in run_response.tools or []:
+        arguments = tool_call.get("tool_args") or {}
+        if tool_call.get("tool_name") == "record_finding" and arguments.get("severity") in ("Critical", "High"):
+            return True, f"{arguments['severity']}-severity finding recorded"
+    if _HIGH_SEVERITY_RE.search(content):
+        return True, "High-severity candidate"
+    return False, f"{confidence[-1].lower()} confidence"
+
+
+def _escalation_message(task_message: Any, draft: RunResponse, reason: str) -> str:
+    recorded = [
+        f"- {(c.get('tool_args') or {}).get('severity')}: {(c.get('tool_args') or {}).get('title')}"
+        for c in draft.tools or []
+        if c.get("tool_name") == "record_finding"
+    ]
+    message = (
+        f"{task_message}\n\n"
+        f"A faster model produced the draft analysis below, which was escalated for review ({reason}). "
+        "Verify it independently against the code and the deployment report, correct anything wrong, "
+        "and produce the final report for this task.\n\n"
+        f"<draft_analysis>\n{draft.content}\n</draft_analysis>"
+    )
+    if recorded:
+        message += (
+            "\n\nFindings already recorded by the draft (do not record them again; record only new or corrected ones):\n"
+            + "\n".join(recorded)
+        )
+    return message
+
+
+class CascadingAgent(TieredAgent):
+    """
+    Runs each task on a fast `draft_model` first and re-runs it on the strong `model` only when the draft's
+    self-reported confidence is low or it reports a High/Critical-severity candidate.
+
+    The draft runs without streaming (its result has to be inspected); an escalated run streams as usual.
+    Usage is reported under '<tier>/draft' and '<tier>/escalated'.
+    """
+
+    def __init__(self, *args: Any, draft_model: Model, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.draft_model = draft_model
+        self.strong_model = self.model
+        self._cascade_lock = threading.Lock()
+        self._acascade_lock = asyncio.Lock()
+
+    def _draft_instructions(self) -> List[str]:
+        base = self.instructions if isinstance(self.instructions, list) else [self.instructions] if self.instructions else []
+        return base + [CASCADE_DRAFT_INSTRUCTIONS]
+
+    def _swap(self, model: Model, instructions: Any) -> Tuple[Model, Any]:
+        previous = (self.model, self.instructions)
+        self.model, self.instructions = model, instructions
+        return previous
+
+    @contextmanager
+    def _non_streaming(self) -> Iterator[None]:
+        # agno keeps `self.stream` set after a streamed run (`self.stream = self.stream or stream`) and a
+        # non-streamed arun then never yields its response; force it off for the runs that must not stream.
+        previous, self.stream = self.stream, False
+        try:
+            yield
+        finally:
+            self.stream = previous
+
+    def _decide(self, draft: RunResponse) -> Tuple[bool, str]:
+        escalate, reason = should_escalate(draft)
+        if escalate:
+            self.tier_usage.increment(f"{self.tier}/draft", "escalations")
+        logger.info(f"{self.name}: draft {'escalated' if escalate else 'accepted'} ({reason}).")
+        return escalate, reason
+
+    def _draft(self, message: Any, *args: Any, **kwargs: Any) -> RunResponse:
+        started = time.perf_counter()
+        previous = self._swap(self.draft_model, self._draft_instructions())
+        try:
+            with self._call_scope(f"{self.tier}/draft"), self._non_streaming():
+                draft = Agent.run(self, message, *args, stream=False, **kwargs)
+        finally:
+            self._swap(*previous)
+        self.tier_usage.record(f"{self.tier}/draft", _model_key(self.draft_model), draft, time.perf_counter() - started)
+        return draft
+
+    def run(self, message: Any = None, *args: Any, stream: Optional[bool] = None, **kwargs: Any) -> Any:
+        if stream:
+            return self._run_stream(message, *args, **kwargs)
+        with self._cascade_lock:
+            draft = self._draft(message, *args, **kwargs)
+            escalate, reason = self._decide(draft)
+            if not escalate:
+                return draft
+            started = time.perf_counter()
+            escalation = _escalation_message(message, draft, reason)
+            with self._call_scope(f"{self.tier}/escalated"), self._non_streaming():
+                response = Agent.run(self, escalation, *args, stream=False, **kwargs)
+            self.tier_usage.record(f"{self.tier}/escalated", _model_key(self.model), response, time.perf_counter() - started)
+            return response
+
+    def _run_stream(self, message: Any, *args: Any, **kwargs: Any) -> Iterator[RunResponse]:
+        # The lock is held until the escalated run has streamed, since it runs on `self.model` throughout.
+        with self._cascade_lock:
+            draft = self._draft(message, *args, **kwargs)
+            escalate, reason = self._decide(draft)
+            if not escalate:
+                yield draft
+                return
+            started = time.perf_counter()
+            escalation = _escalation_message(message, draft, reason)
+            # `_recorded_stream` runs the escalated stream, which agno starts lazily, in the escalated call scope.
+            yield from self._recorded_stream(
+                Agent.run(self, escalation, *args, stream=True, **kwargs), f"{self.tier}/escalated", started
+            )
+
+    async def _adraft(self, message: Any, *args: Any, **kwargs: Any) -> RunResponse:
+        started = time.perf_counter()
+        previous = self._swap(self.draft_model, self._draft_instructions())
+        try:
+            with self._call_scope(f"{self.tier}/draft"), self._non_streaming():
+                draft = await Agent.arun(self, message, *args, stream=False, **kwargs)
+        finally:
+            self._swap(*previous)
+        self.tier_usage.record(f"{self.tier}/draft", _model_key(self.draft_model), draft, time.perf_counter() - started)
+        return draft
+
+    async def arun(self, message: Any = None, *args: Any, stream: Optional[bool] = None, **kwargs: Any) -> Any:
+        if stream:
+            return self._arun_stream(message, *args, **kwargs)
+        # Like the lock of `run`: overlapping runs (e.g. concurrent delegations to this member) would swap the
+        # model and instructions under each other.
+        async with self._acascade_lock:
+            draft = await self._adraft(message, *args, **kwargs)
+            escalate, reason = self._decide(draft)
+            if not escalate:
+                return draft
+            started = time.perf_counter()
+            escalation = _escalation_message(message, draft, reason)
+            with self._call_scope(f"{self.tier}/escalated"), self._non_streaming():
+                response = await Agent.arun(self, escalation, *args, stream=False, **kwargs)
+            self.tier_usage.record(f"{self.tier}/escalated", _model_key(self.model), response, time.perf_counter() - started)
+            return response
+
+    async def _arun_stream(self, message: Any, *args: Any, **kwargs: Any) -> AsyncIterator[RunResponse]:
+        # The lock is held until the escalated run has streamed, since it runs on `self.model` throughout.
+        async with self._acascade_lock:
+            draft = await self._adraft(message, *args, **kwargs)
+            escalate, reason = self._decide(draft)
+            if not escalate:
+                yield draft
+                return
+            started = time.perf_counter()
+            escalation = _escalation_message(message, draft, reason)
+            escalated = await Agent.arun(self, escalation, *args, stream=True, **kwargs)
+            async for chunk in self._arecorded_stream(escalated, f"{self.tier}/escalated", started):
+                yield chunk
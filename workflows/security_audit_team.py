@@ -1,5 +1,6 @@
 import asyncio
 import os
+import time
 import uuid
 from textwrap import dedent
 from typing import AsyncIterator, List, Optional, Dict, Any
@@ -10,10 +11,12 @@ from agno.memory.v2.db.sqlite import SqliteMemoryDb
 from agno.memory.v2.memory import Memory
 from agno.team import Team
 from agno.tools.file import FileTools
-from agno.tools.shell import ShellTools
 from agno.media import Image
 
 from core.model_factory import get_model_instance, DEFAULT_MODEL_ID
+from core.model_call_metrics import model_call_scope
+from core.model_rate_limiter import rate_limit_scope
+from workflows.model_tiering import CascadingAgent, TierUsage, TieredAgent
 from agents.environment_perception_agent import (
     DEPLOYMENT_ARCHITECTURE_REPORTER_AGENT_CONFIG,
     DEPLOYMENT_ARCHITECTURE_REPORTER_AGENT_ID
@@ -27,11 +30,15 @@ from agents.deep_dive_security_auditor_agent import (
     DEEP_DIVE_SECURITY_AUDITOR_AGENT_ID
 )
 from tools.report_repository_tools import (
-    save_report_to_repository,
-    read_report_from_repository,
+    get_report_repository_tools,
     SHARED_REPORTS_DIR
 )
-from tools.session_state_tools import UpdateSessionStateTool, ReadSessionStateTool
+from tools.findings_tools import get_findings_tools
+from tools.plan_file_tools import get_plan_tools
+from tools.report_search_tools import get_report_search_tools
+from tools.session_state_tools import get_session_state_tools
+from tools.shell_tools import get_shell_tools
+from db.session_state_journal import SESSION_STATE_DB_URL, get_session_state_journal
 
 # --- Report Filenames Constants ---
 DEPLOYMENT_REPORT_FILENAME = "DeploymentArchitectureReport.md"
@@ -63,12 +70,15 @@ Ensure all agents use this path correctly.
 - Your final aggregated report of all deep dive findings: `{AGGREGATED_DEEP_DIVE_FILENAME_PREFIX}_[timestamp].md`
 
 **Your Tools:**
-- `FileTools`: To read the `{PLAN_FILENAME}`, modify it by checking off completed tasks, and save the final aggregated report.
-- `UpdateSessionStateTool`: To modify values in the team\'s session_state. Args: `key` (str), `value` (any), `action` (str, optional, e.g., "set", "append", "increment"). Default action is "set".
-- `ReadSessionStateTool`: To read values from the team\'s session_state. Args: `key` (str).
+- `FileTools`: To read the `{PLAN_FILENAME}` and save the final aggregated report.
+- `load_audit_plan`: Loads the tasks of `{PLAN_FILENAME}` into session_state. No arguments.
+- `complete_audit_task`: Checks off a task in `{PLAN_FILENAME}` and updates its session_state status and the task index. Args: `task` (str, the task ID).
+- `update_session_state`: To modify one value in the team\'s session_state. Args: `path` (str, a key or a path such as `audit_plan_items[3].status`), `value` (any), `action` (str, optional: "set", "append", "increment", "delete", "compare_and_swap"; default "set"), `expected` (only for "compare_and_swap"). Update single items by path; never rewrite a whole list to change one item.
+- `read_session_state`: To read a value from the team\'s session_state. Args: `path` (str, a key or a path such as `audit_plan_items[3]`).
+- `session_state_transaction`: To apply several updates all-or-nothing. Args: `operations` (list of `{{"op": ..., "path": ..., "value": ...}}`).
 
 **Session State Variables You Will Manage (accessed via tools):**
-- `audit_plan_items`: A list of dictionaries. Example: `[{{\"raw_task_line\": \"- [ ] Task 1 description\", \"description\": \"Task 1 description\", \"status\": \"pending\"}} , ...]`
+- `audit_plan_items`: A list of dictionaries. Example: `[{{\"task_id\": \"CODE-REVIEW-ITEM-001\", \"raw_task_line\": \"- [ ] CODE-REVIEW-ITEM-001: Task 1 description\", \"description\": \"CODE-REVIEW-ITEM-001: Task 1 description\", \"status\": \"pending\"}} , ...]`. Maintained by `load_audit_plan` and `complete_audit_task`.
 - `current_audit_item_index`: An integer. Initialized to 0.
 - `aggregated_findings`: A string. Initialized to an empty string.
 
@@ -76,7 +86,7 @@ Ensure all agents use this path correctly.
 
 **Phase 0: Initial Setup**
 - You will receive an initial user query.
-- `session_state` is pre-initialized with `audit_plan_items = []`, `current_audit_item_index = 0`, `aggregated_findings = ""`. You can verify this using `ReadSessionStateTool` if needed.
+- `session_state` is pre-initialized with `audit_plan_items = []`, `current_audit_item_index = 0`, `aggregated_findings = ""`. You can verify this using `read_session_state` if needed.
 
 **Phase 1: Environment Perception**
 1.  Invoke the `{DEPLOYMENT_ARCHITECTURE_REPORTER_AGENT_ID}`.
@@ -89,60 +99,84 @@ Ensure all agents use this path correctly.
 2.  Its task is to read `{DEPLOYMENT_REPORT_FILENAME}`, consider the user query, and create `{PLAN_FILENAME}` with Markdown checkbox tasks.
 3.  Ensure it saves this plan to `{SHARED_REPORTS_DIR}/{PLAN_FILENAME}`.
 4.  Confirm the plan is saved. If not, report error and stop.
-5.  **Plan Ingestion into Session State:**
-    a. Use `FileTools.read_file` to get the content of `{SHARED_REPORTS_DIR}/{PLAN_FILENAME}`.
-    b. Parse the content line by line. For each line starting with `- [ ]`:
-        i.  Extract the full task description.
-        ii. Create a dictionary: `{{\"raw_task_line\": \"ORIGINAL_LINE_TEXT\", \"description\": \"EXTRACTED_DESCRIPTION\", \"status\": \"pending\"}}}}`.
-        iii. **CRITICAL:** Explicitly call `UpdateSessionStateTool` with `key='audit_plan_items'`, `value=THE_DICTIONARY_ABOVE`, `action='append'`. You MUST state the tool call and its parameters clearly.
-    c. After parsing ALL tasks and appending them, **CRITICAL:** Explicitly call `UpdateSessionStateTool` with `key='current_audit_item_index'`, `value=0`, `action='set'`. You MUST state this tool call and its parameters clearly.
-    d. After these updates, verify `audit_plan_items` is populated and `current_audit_item_index` is 0 using `ReadSessionStateTool`. If `audit_plan_items` is empty or `current_audit_item_index` is not 0, report error and stop.
+5.  **Plan Ingestion into Session State:** Call `load_audit_plan`. It parses every `- [ ]` task of `{PLAN_FILENAME}` into `audit_plan_items` (each item has `task_id`, `raw_task_line`, `description`, `status`) and sets `current_audit_item_index` to the first pending task. If it returns an error, report it and stop.
 
 **Phase 3: Iterative Deep-Dive Auditing & Reporting (Using Session State Tools)**
 1.  **Loop Start:**
-    a. Use `ReadSessionStateTool(key='current_audit_item_index')` to get the `current_task_index`.
-    b. Use `ReadSessionStateTool(key='audit_plan_items')` to get the `tasks_list`.
-    c. **Check for Completion:** If `current_task_index` is greater than or equal to `len(tasks_list)`: Proceed to Phase 4. (If `tasks_list` was empty from Phase 2, this condition will also pass, but you should have errored out in Phase 2c).
+    a. Use `read_session_state(path='current_audit_item_index')` to get the `current_task_index`.
+    b. Use `read_session_state(path='audit_plan_items')` to get the `tasks_list`.
+    c. **Check for Completion:** If `current_task_index` is greater than or equal to `len(tasks_list)`: Proceed to Phase 4. (If `tasks_list` was empty from Phase 2, this condition will also pass, but you should have errored out in Phase 2, step 5).
     d. **Process Current Task:**
         i.  Get `current_task_data = tasks_list[current_task_index]`.
-        ii. Extract `task_description = current_task_data['description']` and `raw_task_line = current_task_data['raw_task_line']`.
+        ii. Extract `task_description = current_task_data['description']` and `task_id = current_task_data['task_id']`.
         iii. Invoke `{DEEP_DIVE_SECURITY_AUDITOR_AGENT_ID}` with `task_description` and the original user query.
         iv. Collect the agent's Markdown report.
-        v.  Use `ReadSessionStateTool(key='aggregated_findings')` to get current findings, append the new report (with separator), then use `UpdateSessionStateTool` with `key='aggregated_findings'`, `value=NEW_AGGREGATED_STRING`, `action='set'`.
-        vi. **Mark Task Complete in Plan File:** Use `FileTools.edit_file` to change `raw_task_line` to its completed form in `{SHARED_REPORTS_DIR}/{PLAN_FILENAME}`.
-        vii. **Update Session State for Task Status (CRITICAL - Use Read-Modify-Write):**
-            1. Read the entire `audit_plan_items` list using `ReadSessionStateTool(key='audit_plan_items')`.
-            2. In your internal reasoning (do not show this as a separate step to the user), modify the item at `current_task_index` in the retrieved list to set its `status` to `"completed"`.
-            3. Use `UpdateSessionStateTool` with `key='audit_plan_items'`, `value=THE_ENTIRE_MODIFIED_LIST`, `action='set'` to save the updated list back to session state.
-        viii. **Increment Task Index in Session State:** Use `UpdateSessionStateTool` with `key='current_audit_item_index'`, `value=1`, `action='increment'`.
-        ix. Go back to **Loop Start** (Phase 3, Step 1a).
+        v.  Use `read_session_state(path='aggregated_findings')` to get current findings, append the new report (with separator), then use `update_session_state` with `path='aggregated_findings'`, `value=NEW_AGGREGATED_STRING`, `action='set'`.
+        vi. **Mark Task Complete:** Call `complete_audit_task` with the item's `task_id` (or its 1-based position if it has no ID). This single call checks the box in `{PLAN_FILENAME}`, sets the item's `status` to `"completed"` and advances `current_audit_item_index`, and returns the progress count. Do NOT edit the plan file or these session_state keys yourself.
+        vii. Go back to **Loop Start** (Phase 3, Step 1a).
 
 **Phase 4: Final Aggregation and Output**
-1.  Use `ReadSessionStateTool(key='aggregated_findings')` to get `final_report_content`.
+1.  Use `read_session_state(path='aggregated_findings')` to get `final_report_content`.
 2.  Generate a timestamp string (e.g., YYYYMMDDHHMMSS). If you cannot, use a fixed name like `AggregatedReport_Latest.md`.
 3.  Construct final report filename: `{SHARED_REPORTS_DIR}/{AGGREGATED_DEEP_DIVE_FILENAME_PREFIX}_[timestamp_or_fixed_name].md`.
 4.  Use `FileTools.edit_file` to save `final_report_content`.
 5.  Output a completion message pointing to reports.
 
 Be methodical. If tool calls fail or agents fail, report clearly. Explicitly state the tool calls you are making with their parameters.
-If `UpdateSessionStateTool` for path `audit_plan_items.[current_task_index].status` is problematic, an alternative for step vii is: 1. Read `audit_plan_items`. 2. Modify the specific item in the retrieved list. 3. Use `UpdateSessionStateTool` to set the entire `audit_plan_items` key to this modified list.
 ''')
 
 
+def _current_audit_task(agent: Agent) -> Optional[str]:
+    """The plan task the deep-dive auditor is working on, from the team's session_state."""
+    state = getattr(agent, "team_session_state", None) or {}
+    items = state.get("audit_plan_items") or []
+    index = state.get("current_audit_item_index", 0)
+    if isinstance(index, int) and 0 <= index < len(items) and isinstance(items[index], dict):
+        return items[index].get("description") or items[index].get("raw_task_line")
+    return None
+
+
 class SecurityAuditTeam(Team):
-    def __init__(self, model_id: str = DEFAULT_MODEL_ID, team_leader_model_id: Optional[str] = None, db_path: str = "team_memory.sqlite"):
+    def __init__(
+        self,
+        model_id: str = DEFAULT_MODEL_ID,
+        team_leader_model_id: Optional[str] = None,
+        db_path: str = "team_memory.sqlite",
+        use_async_tools: bool = True,
+        session_state_db_url: Optional[str] = SESSION_STATE_DB_URL,
+        env_reporter_model_id: Optional[str] = None,
+        planner_model_id: Optional[str] = None,
+        auditor_model_id: Optional[str] = None,
+        cascade_draft_model_id: Optional[str] = None,
+    ):
         self.model_id = model_id
         self.team_leader_model_id = team_leader_model_id if team_leader_model_id else model_id
+        # Per-role models; each role falls back to `model_id`.
+        self.env_reporter_model_id = env_reporter_model_id or model_id
+        self.planner_model_id = planner_model_id or model_id
+        self.auditor_model_id = auditor_model_id or model_id
+        # Cascade mode: a fast model drafts every deep-dive task, the auditor model only re-runs escalated ones.
+        self.cascade_draft_model_id = cascade_draft_model_id
+        self.tier_usage = TierUsage()
         self.db_path = db_path
+        # session_state changes made through this team's state/plan tools are journaled as patches, so a run
+        # can be resumed after a restart and inspected at any earlier point. Pass None to keep state in memory
+        # only. Teams on the same database share one journal (engine and writer thread).
+        self.session_state_journal = get_session_state_journal(session_state_db_url) if session_state_db_url else None
+        # The team is streamed with `arun` (API, playground, Streamlit), so report I/O runs off the event loop.
+        # Pass use_async_tools=False when driving the team with the synchronous `run`.
+        save_report_to_repository, read_report_from_repository = get_report_repository_tools(use_async=use_async_tools)
         
         # Get model instances
         team_leader_model = get_model_instance(self.team_leader_model_id)
-        env_reporter_model = get_model_instance(self.model_id)
-        planner_model = get_model_instance(self.model_id)
-        auditor_model = get_model_instance(self.model_id)
+        env_reporter_model = get_model_instance(self.env_reporter_model_id)
+        planner_model = get_model_instance(self.planner_model_id)
+        auditor_model = get_model_instance(self.auditor_model_id)
 
         # 1. Environment Reporter Agent
-        env_perception_agent = Agent(
+        env_perception_agent = TieredAgent(
+            tier="env_reporter",
+            tier_usage=self.tier_usage,
             name=DEPLOYMENT_ARCHITECTURE_REPORTER_AGENT_CONFIG.name,
             description=DEPLOYMENT_ARCHITECTURE_REPORTER_AGENT_CONFIG.description,
             instructions=DEPLOYMENT_ARCHITECTURE_REPORTER_AGENT_CONFIG.instructions,
@@ -151,7 +185,9 @@ class SecurityAuditTeam(Team):
         )
 
         # 2. Attack Surface Planning Agent
-        attack_planning_agent = Agent(
+        attack_planning_agent = TieredAgent(
+            tier="planner",
+            tier_usage=self.tier_usage,
             name=ATTACK_SURFACE_PLANNING_AGENT_CONFIG.name,
             description=ATTACK_SURFACE_PLANNING_AGENT_CONFIG.description,
             instructions=ATTACK_SURFACE_PLANNING_AGENT_CONFIG.instructions,
@@ -161,19 +197,28 @@ class SecurityAuditTeam(Team):
 
         # 3. Deep Dive Security Auditor Agent
         auditor_file_tools = FileTools()
-        auditor_shell_tools = ShellTools()
-        deep_dive_auditor = Agent(
+        # Async subprocesses, so the shell commands of one turn run concurrently
+        auditor_shell_tools = get_shell_tools(use_async=use_async_tools)
+        auditor_config = dict(
             name=DEEP_DIVE_SECURITY_AUDITOR_AGENT_CONFIG.name,
             description=DEEP_DIVE_SECURITY_AUDITOR_AGENT_CONFIG.description,
             instructions=DEEP_DIVE_SECURITY_AUDITOR_AGENT_CONFIG.instructions_template,
-            tools=[auditor_file_tools, auditor_shell_tools, read_report_from_repository],
+            tools=[auditor_file_tools, auditor_shell_tools, read_report_from_repository]
+            + get_findings_tools(use_async=use_async_tools)
+            + get_report_search_tools(use_async=use_async_tools),
             model=auditor_model,
+            tier_usage=self.tier_usage,
+            task_label=_current_audit_task,
         )
+        if self.cascade_draft_model_id:
+            deep_dive_auditor = CascadingAgent(
+                tier="auditor", draft_model=get_model_instance(self.cascade_draft_model_id), **auditor_config
+            )
+        else:
+            deep_dive_auditor = TieredAgent(tier="auditor", **auditor_config)
 
         # Team Leader tools
         team_leader_file_tools = FileTools()
-        update_state_tool = UpdateSessionStateTool()
-        read_state_tool = ReadSessionStateTool()
         
         # Memory setup
         if os.path.exists(self.db_path):
@@ -190,7 +235,9 @@ class SecurityAuditTeam(Team):
             model=team_leader_model,
             instructions=TEAM_LEADER_INSTRUCTIONS,
             members=[env_perception_agent, attack_planning_agent, deep_dive_auditor],
-            tools=[team_leader_file_tools, update_state_tool, read_state_tool],
+            tools=[team_leader_file_tools]
+            + get_session_state_tools(self.session_state_journal)
+            + get_plan_tools(PLAN_FILENAME, self.session_state_journal),
             mode="coordinate",
             memory=team_main_memory,
             session_state={'audit_plan_items': [], 'current_audit_item_index': 0, 'aggregated_findings': ""},
@@ -209,6 +256,7 @@ class SecurityAuditTeam(Team):
         run_id: Optional[str] = None,
         session_id: Optional[str] = None,
         images: Optional[List[Image]] = None,
+        project: Optional[str] = None,
     ) -> AsyncIterator[RunResponse]:
         if not run_id:
             run_id = f"run_{uuid.uuid4()}"
@@ -219,16 +267,35 @@ class SecurityAuditTeam(Team):
         print(f"Initial User Query: {initial_user_query}")
         print(f"Reports will be saved in: {SHARED_REPORTS_DIR}")
         os.makedirs(SHARED_REPORTS_DIR, exist_ok=True)
-
-        async for response_chunk in await self.arun(
-            message=initial_user_query,
-            run_id=run_id,
-            session_id=session_id,
-            images=images,
-            stream=True,
-        ):
-            yield response_chunk
+        if self.session_state_journal is not None:
+            persisted_state = await asyncio.to_thread(self.session_state_journal.load, session_id)
+            if persisted_state:
+                print(f"Restoring persisted session_state for Session ID: {session_id}")
+                self.session_state.update(persisted_state)
+        if project:
+            # Tags the reports and findings of this run in the search index (see get_audit_context).
+            self.session_state["project"] = project
+
+        # Leader usage covers the whole run (wall clock) but only the leader's own model calls (tokens).
+        started = time.perf_counter()
+        # Model calls of this run share the rate limits round-robin with concurrent runs, and are recorded
+        # under the run (members override the stage, the auditor also sets the plan task).
+        with rate_limit_scope(run_id), model_call_scope(run_id=run_id, session_id=session_id, stage="leader"):
+            async for response_chunk in await self.arun(
+                message=initial_user_query,
+                run_id=run_id,
+                session_id=session_id,
+                images=images,
+                stream=True,
+                # Tool call events too, for the tool_start / tool_end events of the API streams.
+                stream_intermediate_steps=True,
+            ):
+                yield response_chunk
+        self.tier_usage.record(
+            "leader", self.team_leader_model_id, self.run_response, time.perf_counter() - started
+        )
         print(f"Team Audit Run ID {run_id} completed.")
+        print(self.tier_usage.format_summary())
 
 async def main():
     # Example of how to run the team
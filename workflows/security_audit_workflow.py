@@ -1,3 +1,5 @@
+import os
+
 from agno.workflow import Workflow
 from agno.agent import Agent
 from agno.run.response import RunResponse
@@ -9,16 +11,21 @@ from agno.media import Image
 
 # Import the utility function from its new location
 from core.model_factory import get_model_instance 
+from core.model_call_metrics import model_call_scope
 
 from agents.environment_perception_agent import DEPLOYMENT_ARCHITECTURE_REPORTER_AGENT_CONFIG
 # MODIFIED: Import the new AttackSurfacePlanningAgentForWhiteBox config
 from agents.attack_surface_identification_agent import ATTACK_SURFACE_PLANNING_AGENT_CONFIG # This should now refer to the _v2_whitebox config
 
 # Import the new repository tools
-from tools.report_repository_tools import save_report_to_repository, read_report_from_repository
+from tools.report_repository_tools import get_report_repository_tools
 
 # MODIFIED: Update workflow ID to reflect white-box focus if desired, e.g., v4
 SECURITY_AUDIT_WORKFLOW_ID = "security_audit_workflow_v4_whitebox_planning"
+# Model for both agents; e.g. SECURITY_AUDIT_WORKFLOW_MODEL_ID=mock/echo benchmarks the workflow and API offline.
+SECURITY_AUDIT_WORKFLOW_MODEL_ID = os.getenv(
+    "SECURITY_AUDIT_WORKFLOW_MODEL_ID", "openrouter/google/gemini-2.5-flash-preview-05-20"
+)
 
 class SecurityAuditWorkflow(Workflow):
     """
@@ -40,13 +47,22 @@ class SecurityAuditWorkflow(Workflow):
     attack_planning_agent: Agent
     # shared_memory: Memory # No longer using shared memory in this way
 
-    def __init__(self, session_id: str, **kwargs):
+    def __init__(
+        self,
+        session_id: str,
+        use_async_tools: bool = True,
+        model_id: str = SECURITY_AUDIT_WORKFLOW_MODEL_ID,
+        **kwargs,
+    ):
         super().__init__(session_id=session_id, **kwargs)
 
+        # stream_audit drives both agents with `arun`, so the async report tools keep file I/O off the event loop.
+        save_report_to_repository, read_report_from_repository = get_report_repository_tools(use_async=use_async_tools)
+
         # Define the new OpenRouter model ID
         # User confirmed model ID: google/gemini-flash-1.5-preview-0514
         # If another ID like google/gemini-2.5-flash-preview-05-20 is preferred, update this string.
-        open_router_model_string = "openrouter/google/gemini-2.5-flash-preview-05-20"
+        open_router_model_string = model_id
 
         # Memory related setup is removed as enable_user_memories will be False for both agents
         # memory_db = SqliteMemoryDb(table_name=f"workflow_memory_{session_id.replace('-', '_')}", db_file=":memory:") 
@@ -114,13 +130,15 @@ class SecurityAuditWorkflow(Workflow):
         env_perception_stream: AsyncIterator[RunResponse] = await self.env_perception_agent.arun(
             initial_message,
             stream=True,
+            stream_intermediate_steps=True,
             images=images
         )
 
         env_stream_had_content = False
-        async for chunk in env_perception_stream:
-            env_stream_had_content = True
-            yield chunk
+        with model_call_scope(run_id=self.session_id, session_id=self.session_id, stage=self.env_perception_agent.name):
+            async for chunk in env_perception_stream:
+                env_stream_had_content = True
+                yield chunk
         
         if env_stream_had_content:
             print(f"[{self.name} - {self.session_id}] {self.env_perception_agent.name} (STREAMING) complete. Agent should have saved its report as its final action.")
@@ -164,13 +182,15 @@ class SecurityAuditWorkflow(Workflow):
         
         attack_planning_stream: AsyncIterator[RunResponse] = await self.attack_planning_agent.arun(
             planning_agent_initial_message, 
-            stream=True
+            stream=True,
+            stream_intermediate_steps=True
         )
         
         stream_had_content = False
-        async for chunk in attack_planning_stream:
-            stream_had_content = True
-            yield chunk
+        with model_call_scope(run_id=self.session_id, session_id=self.session_id, stage=self.attack_planning_agent.name):
+            async for chunk in attack_planning_stream:
+                stream_had_content = True
+                yield chunk
 
         if not stream_had_content:
             print(f"Warning: [{self.name} - {self.session_id}] {self.attack_planning_agent.name} stream produced no content.")